@@ -0,0 +1,66 @@
+import asyncio
+from typing import Optional, Sequence, Tuple
+
+# Upper bound for a single adb invocation. A wedged adb server should not hang a task forever.
+ADB_TIMEOUT = 15
+
+
+async def adb(*args: str, serial: Optional[str] = None, timeout: float = ADB_TIMEOUT) -> str:
+    """
+    Runs `adb [-s serial] <args>` without blocking the event loop and returns stdout.
+    The child process is killed if the caller is cancelled or the timeout expires,
+    so cancelling a task really aborts the in-flight ADB call.
+    """
+    out = await adb_bytes(*args, serial=serial, timeout=timeout)
+    return out.decode(errors="ignore").strip()
+
+
+async def adb_bytes(*args: str, serial: Optional[str] = None, timeout: float = ADB_TIMEOUT) -> bytes:
+    """Like adb() but returns raw stdout, for binary output such as `exec-out screencap -p`."""
+    _, out, _ = await _run(args, serial, timeout)
+    return out
+
+
+async def adb_run(*args: str, serial: Optional[str] = None, timeout: float = ADB_TIMEOUT) -> Tuple[int, str, str]:
+    """
+    Like adb() but returns (exit code, stdout, stderr), for commands whose failure has to be detected.
+    `adb shell` passes the device command's exit code through (shell protocol v2, adb 1.0.36+).
+    """
+    code, out, err = await _run(args, serial, timeout)
+    return code, out.decode(errors="ignore").strip(), err.decode(errors="ignore").strip()
+
+
+async def _run(args: Sequence[str], serial: Optional[str], timeout: float) -> Tuple[int, bytes, bytes]:
+    cmd = ["adb"]
+    if serial:
+        cmd += ["-s", serial]
+    cmd += list(args)
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        out, err = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        return proc.returncode, out, err
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        if proc.returncode is None:
+            proc.kill()
+        raise
+
+
+async def adb_shell(*args: str, serial: Optional[str] = None, timeout: float = ADB_TIMEOUT) -> str:
+    return await adb("shell", *args, serial=serial, timeout=timeout)
+
+
+async def adb_shell_run(*args: str, serial: Optional[str] = None, timeout: float = ADB_TIMEOUT) -> Tuple[int, str, str]:
+    return await adb_run("shell", *args, serial=serial, timeout=timeout)
+
+
+async def return_to_home(serial: Optional[str] = None):
+    """Best effort: leave the phone on the launcher so the next task starts clean."""
+    try:
+        await adb_shell("input", "keyevent", "3", serial=serial, timeout=5)
+    except Exception as e:
+        print(f"[ADB] Could not return device to home: {e}")
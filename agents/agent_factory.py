@@ -8,14 +8,6 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # --- Imports ---
-try:
-    from mobilerun import MobileRunClient
-except ImportError:
-    try:
-        from mobile_use import MobileRunClient
-    except ImportError:
-        MobileRunClient = None
-
 try:
     from droidrun.agent.droid import DroidAgent
     from droidrun.agent.utils.llm_picker import load_llm
@@ -31,64 +23,87 @@ except ImportError:
     ExecutorConfig = None
     TelemetryConfig = None
 
+from agents.app_index import APPS
+from agents.backend_router import ROUTER, skipped, succeeded
+from agents.device_primitives import UNIVERSAL, run_primitive, spoken_app
+from agents.device_registry import APP_MAPPING, DEVICES
+from agents.droid_runner import run_droid_agent
+from agents.llm_limiter import limited_llm
+from agents.tracing import span
+from agents.cloud_client import BREAKER, get_client, run_cloud_job
+
 # CONFIGURATION
 # Set this to FALSE if cloud credits run out during the demo!
 USE_CLOUD = os.getenv("USE_MOBILE_RUN", "False").lower() == "true"
 
 class AgentFactory:
     
-    APP_MAPPING = {
-        "Uber": "com.ubercab",
-        "MakeMyTrip": "com.makemytrip",
-        "Booking.com": "com.booking",
-        "Amazon": "com.amazon.mShop.android.shopping",
-        "Flipkart": "com.flipkart.android",
-        "Zomato": "com.application.zomato",
-        "Swiggy": "in.swiggy.android", 
-        "WhatsApp": "com.whatsapp",
-        "PharmEasy": "com.pharmeasy.app",
-        "Apollo 24|7": "com.apollo.patientapp",
-        "Tata 1mg": "com.aranoah.healthkart.plus",
-        "Ola": "com.olacabs.customer",
-        "System": "com.android.settings"
-    }
+    APP_MAPPING = APP_MAPPING
 
     @staticmethod
-    async def run_task(app_identifier, instruction, provider="gemini", model="models/gemini-2.5-flash"):
+    async def run_task(app_identifier, instruction, provider="gemini", model="models/gemini-2.5-flash", hedge=False):
         """
         Smart Router: Decides whether to use Local Phone or Cloud Fleet
         app_identifier: Can be App Name (e.g. "Uber") or Package ID.
+        Backends are tried in the order ROUTER ranks them (best expected completion time first).
+        hedge: start the runner-up backend in parallel if the first one is slow, keep whichever succeeds first.
         """
-        # Resolve App ID
-        app_package = AgentFactory.APP_MAPPING.get(app_identifier, app_identifier)
-
-        if USE_CLOUD and MobileRunClient:
-            try:
-                print(f"☁️ Cloud: Dispatching '{instruction[:50]}...' to MobileRun...")
-                api_key = os.getenv("MOBILERUN_API_KEY")
-                if not api_key:
-                    raise ValueError("MOBILERUN_API_KEY not set")
-                    
-                client = MobileRunClient(api_key=api_key)
-                
-                job = await client.submit_job(
-                    app_id=app_package,
-                    instruction=instruction,
-                    device="pixel_8_pro",
-                    stream=True
-                )
-                result = await job.result()
-                
-                if result.status == "COMPLETED":
-                    return AgentFactory._parse_output(result.output)
-                else:
-                    print(f"⚠️ Cloud Job Status: {result.status}")
-                    # Fallthrough
-                
-            except Exception as e:
-                print(f"⚠️ Cloud Failed: {e}. Falling back to Local DroidRun.")
-                # Fallthrough to local execution
-                
+        # Resolve App ID: known names first, then any installed app by (fuzzy) name.
+        # Universal tasks only name their app in the instruction ("Open Spotify and play ...")
+        app_package = AgentFactory.APP_MAPPING.get(app_identifier)
+        if not app_package:
+            name = spoken_app(instruction) if app_identifier == UNIVERSAL else app_identifier
+            app_package = (await APPS.resolve(name) if name else None) or app_identifier
+
+        # "Open WhatsApp", "Turn on Wi-Fi", "Press Home": one ADB call instead of an agent loop
+        if await ROUTER.local_devices():
+            result = await run_primitive(app_identifier, app_package, instruction)
+            if result:
+                return result
+
+        # An open breaker sends everything straight to local until its cooldown expires
+        order = await ROUTER.plan(cloud_enabled=bool(USE_CLOUD and get_client() and BREAKER.available()))
+        # Cloud devices have their own app set; only the local phone can be ruled out up front
+        if "local" in order and await DEVICES.is_installed(app_package) is False:
+            DEVICES.skip(app_identifier)
+            order = [b for b in order if b != "local"]
+            if not order:
+                return {"status": "failed", "error": f"{app_identifier} is not installed on the device"}
+        print(f"🧭 Router: {' -> '.join(order)}")
+
+        async def execute(backend):
+            if backend == "cloud":
+                return await AgentFactory._run_cloud(app_package, instruction)
+            return await AgentFactory._run_local(instruction, provider, model)
+
+        if hedge and len(order) > 1:
+            result = await ROUTER.run_hedged(order[0], order[1], execute)
+            return result if result and not skipped(result) else {"status": "failed", "error": "All execution backends failed"}
+
+        result = None
+        for backend in order:
+            outcome = await ROUTER.run(backend, execute)
+            if succeeded(outcome):
+                return outcome
+            if not skipped(outcome):
+                result = outcome
+
+        return result or {"status": "failed", "error": "No execution backend available"}
+
+    @staticmethod
+    async def _run_cloud(app_package, instruction):
+        """Returns the parsed output, or None so the caller can fall back."""
+        print(f"☁️ Cloud: Dispatching '{instruction[:50]}...' to MobileRun...")
+        output = await run_cloud_job(app_package, instruction)
+        if skipped(output):
+            return output
+        if output is None:
+            print("⚠️ Cloud unavailable or failed. Falling back to Local DroidRun.")
+            return None
+        return AgentFactory._parse_output(output)
+
+    @staticmethod
+    async def _run_local(instruction, provider, model):
         # LOCAL EXECUTION (DroidRun)
         print(f"📱 Local: Executing '{instruction[:50]}...' on USB Device...")
         
@@ -96,18 +111,19 @@ class AgentFactory:
         gemini_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         provider_name = "GoogleGenAI" if provider == "gemini" else provider
         
-        llm = load_llm(provider_name=provider_name, model=model, api_key=gemini_key)
-        
-        manager_config = ManagerConfig(vision=True)
-        executor_config = ExecutorConfig(vision=True)
-        agent_config = AgentConfig(reasoning=False, manager=manager_config, executor=executor_config)
-        telemetry_config = TelemetryConfig(enabled=False)
-        config = DroidrunConfig(agent=agent_config, telemetry=telemetry_config)
-
-        agent = DroidAgent(goal=instruction, llms=llm, config=config)
-        
         try:
-            result = await agent.run()
+            with span("load_llm"):
+                llm = limited_llm(load_llm(provider_name=provider_name, model=model, api_key=gemini_key), gemini_key, model)
+            
+            manager_config = ManagerConfig(vision=True)
+            executor_config = ExecutorConfig(vision=True)
+            agent_config = AgentConfig(reasoning=False, manager=manager_config, executor=executor_config)
+            telemetry_config = TelemetryConfig(enabled=False)
+            config = DroidrunConfig(agent=agent_config, telemetry=telemetry_config)
+
+            agent = DroidAgent(goal=instruction, llms=llm, config=config)
+            
+            result = await run_droid_agent(agent, "AgentFactory")
             raw_text = str(result.reason) if hasattr(result, 'reason') else str(result)
             return AgentFactory._parse_output(raw_text)
         except Exception as e:
@@ -0,0 +1,223 @@
+import os
+import re
+import time
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from agents.device_registry import APP_MAPPING, DEVICES
+
+# Fuzzy matches below this score are not trusted
+APP_MATCH_THRESHOLD = float(os.getenv("APP_MATCH_THRESHOLD", "0.8"))
+# A miss triggers a forced package re-list (the app may have just been installed), at most this often
+MISS_REFRESH_INTERVAL = 30.0
+
+# Launcher labels and common spoken names for popular packages. The shell has no way to read an app's label
+# (`dumpsys package`/`query-activities` only show resource ids; that needs aapt on the device), so this table
+# stands in for them, and anything not listed is named from its package id ("...apps.youtube.music" -> "youtube music").
+KNOWN_LABELS = {
+    "net.one97.paytm": ["Paytm"],
+    "com.phonepe.app": ["PhonePe", "phone pe"],
+    "com.google.android.apps.nbu.paisa.user": ["Google Pay", "GPay", "G Pay"],
+    "com.google.android.youtube": ["YouTube"],
+    "com.google.android.apps.youtube.music": ["YouTube Music", "YT Music"],
+    "com.google.android.gm": ["Gmail"],
+    "com.google.android.apps.maps": ["Maps", "Google Maps"],
+    "com.android.chrome": ["Chrome", "Google Chrome"],
+    "com.google.android.apps.photos": ["Photos", "Google Photos"],
+    "com.google.android.dialer": ["Phone", "Dialer"],
+    "com.google.android.apps.messaging": ["Messages", "SMS"],
+    "com.google.android.calendar": ["Calendar"],
+    "com.google.android.deskclock": ["Clock", "Alarm"],
+    "com.android.vending": ["Play Store", "Google Play"],
+    "com.instagram.android": ["Instagram", "Insta"],
+    "com.facebook.katana": ["Facebook", "FB"],
+    "com.twitter.android": ["X", "Twitter"],
+    "com.spotify.music": ["Spotify"],
+    "com.netflix.mediaclient": ["Netflix"],
+    "in.startv.hotstar": ["Hotstar", "Disney+ Hotstar", "JioHotstar"],
+    "com.snapchat.android": ["Snapchat"],
+    "org.telegram.messenger": ["Telegram"],
+    "com.whatsapp.w4b": ["WhatsApp Business"],
+    "in.org.npci.upiapp": ["BHIM"],
+    "com.rapido.passenger": ["Rapido"],
+    "com.grofers.customerapp": ["Blinkit"],
+    "com.zeptoconsumerapp": ["Zepto"],
+    "com.bigbasket.mobileapp": ["BigBasket"],
+    "com.myntra.android": ["Myntra"],
+    "com.irctc.rail.connect": ["IRCTC", "IRCTC Rail Connect"],
+}
+
+# Package segments that never name the app
+_GENERIC = {"com", "in", "org", "net", "co", "io", "android", "app", "apps", "google", "mobile", "client",
+            "customer", "user", "main", "lite", "release", "prod", "mobileapp", "androidapp"}
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+# Where a name comes from; when two packages claim one, the lower rank wins, then the lower package id
+RANK_MAPPING, RANK_KNOWN, RANK_DERIVED = 0, 1, 2
+
+
+def normalize(name: str) -> str:
+    name = _NON_ALNUM.sub(" ", name.lower()).strip()
+    return re.sub(r"\s+app$", "", name)
+
+
+def package_name(package: str) -> str:
+    """Spoken-ish name from a package id, e.g. 'com.google.android.apps.youtube.music' -> 'youtube music'."""
+    parts = [p for p in package.lower().split(".") if p not in _GENERIC and not any(c.isdigit() for c in p)]
+    return " ".join(parts) or package.split(".")[-1]
+
+
+class AppIndex:
+    """
+    Launchable app name -> package index for the attached phone. Only packages with a launcher activity are
+    indexed, so providers and services ("com.android.providers.settings") never answer for a spoken name.
+    Names come from APP_MAPPING, KNOWN_LABELS and the package id itself, in that priority; lookups try the exact
+    name, then fuzzy-match the candidates that share a token or prefix with the query. Rebuilt incrementally
+    from the registry's package list, so an install or removal only touches the packages that changed.
+    """
+
+    def __init__(self):
+        self.names: Dict[str, str] = {}
+        self.labels: Dict[str, str] = {}
+        self.tokens: Dict[str, Set[str]] = {}
+        self.packages: Set[str] = set()
+        # name -> {package: rank} for every package claiming it; names[key] is the best of these
+        self.claims: Dict[str, Dict[str, int]] = {}
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.updates = 0
+        self._forced_at = 0.0
+        # App names we resolve even before a device has been seen
+        for name, package in sorted(APP_MAPPING.items()):
+            self._add_name(name, package, RANK_MAPPING)
+            self.labels.setdefault(package, name)
+
+    def _add_name(self, name: str, package: str, rank: int):
+        key = normalize(name)
+        if not key:
+            return
+        claims = self.claims.setdefault(key, {})
+        claims[package] = min(rank, claims.get(package, rank))
+        self._settle(key)
+        for token in key.split():
+            self.tokens.setdefault(token, set()).add(package)
+
+    def _settle(self, key: str):
+        claims = self.claims.get(key)
+        if claims:
+            self.names[key] = min(claims, key=lambda p: (claims[p], p))
+        else:
+            self.claims.pop(key, None)
+            self.names.pop(key, None)
+
+    def _names_for(self, package: str) -> List[Tuple[str, int]]:
+        names = [(n, RANK_MAPPING) for n, p in sorted(APP_MAPPING.items()) if p == package]
+        names += [(n, RANK_KNOWN) for n in KNOWN_LABELS.get(package, [])]
+        names.append((package_name(package), RANK_DERIVED))
+        last = package.lower().split(".")[-1]
+        if last not in _GENERIC and all(last != n for n, _ in names):
+            names.append((last, RANK_DERIVED))
+        return names
+
+    def _add(self, package: str):
+        names = self._names_for(package)
+        for name, rank in names:
+            self._add_name(name, package, rank)
+        # Names from APP_MAPPING/KNOWN_LABELS are cased already; ones derived from the package id are not
+        name, rank = names[0]
+        self.labels.setdefault(package, name if rank < RANK_DERIVED else names[-1][0].title())
+        self.packages.add(package)
+
+    def _remove(self, package: str):
+        self.packages.discard(package)
+        # Names from APP_MAPPING stay resolvable for the cloud path
+        if package in APP_MAPPING.values():
+            return
+        for key in [k for k, claims in self.claims.items() if package in claims]:
+            del self.claims[key][package]
+            self._settle(key)
+        for packages in self.tokens.values():
+            packages.discard(package)
+        self.labels.pop(package, None)
+
+    def update(self, launchable: Set[str]):
+        """Applies the difference between the indexed and the launchable package sets."""
+        added, removed = launchable - self.packages, self.packages - launchable
+        if not added and not removed:
+            return
+        for package in sorted(removed):
+            self._remove(package)
+        for package in sorted(added):
+            self._add(package)
+        self.updates += 1
+        if self.updates > 1:
+            print(f"[AppIndex] +{len(added)} / -{len(removed)} packages")
+
+    async def refresh(self, serial: Optional[str] = None, force: bool = False):
+        if force:
+            DEVICES.invalidate(serial)
+        profile = await DEVICES.profile(serial)
+        if profile and profile.launchable:
+            self.update(profile.launchable)
+
+    def lookup(self, name: str) -> Optional[Tuple[str, str, float]]:
+        """(package, label, score) against the current index, or None. No device I/O."""
+        query = normalize(name or "")
+        if not query:
+            return None
+        if "." in (name or "") and name in self.packages:
+            return name, self.labels.get(name, name), 1.0
+        if query in self.names:
+            package = self.names[query]
+            return package, self.labels.get(package, name), 1.0
+
+        candidates: Set[str] = set()
+        for token in query.split():
+            candidates |= self.tokens.get(token, set())
+        if not candidates:
+            # Typos and run-together names ("youtubemusic", "phonpe"): fall back to a shared prefix
+            candidates = {p for key, p in self.names.items() if key[:3] == query[:3]}
+
+        best: Optional[Tuple[str, str, float]] = None
+        for key, package in self.names.items():
+            if package not in candidates:
+                continue
+            score = SequenceMatcher(None, query, key).ratio()
+            if best is None or score > best[2]:
+                best = (package, self.labels.get(package, key), score)
+        if best and best[2] >= APP_MATCH_THRESHOLD:
+            return best[0], best[1], round(best[2], 3)
+        return None
+
+    async def resolve(self, name: str, serial: Optional[str] = None) -> Optional[str]:
+        """Package for a spoken app name. Re-lists packages once on a miss in case the app was just installed."""
+        await self.refresh(serial)
+        found = self.lookup(name)
+        if found is None and time.monotonic() - self._forced_at > MISS_REFRESH_INTERVAL:
+            self._forced_at = time.monotonic()
+            await self.refresh(serial, force=True)
+            found = self.lookup(name)
+
+        if found is None:
+            self.misses += 1
+            return None
+        if found[2] < 1.0:
+            self.fuzzy_hits += 1
+            print(f"🔎 [AppIndex] '{name}' -> {found[1]} ({found[0]}, score {found[2]})")
+        else:
+            self.hits += 1
+        return found[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "packages": len(self.packages),
+            "names": len(self.names),
+            "exact_hits": self.hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "incremental_updates": self.updates,
+        }
+
+
+APPS = AppIndex()
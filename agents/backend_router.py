@@ -0,0 +1,252 @@
+import asyncio
+import contextvars
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from agents.adb_utils import adb
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = float(os.getenv("ROUTER_EWMA_ALPHA", "0.3"))
+# Cloud jobs run on separate devices, so several can progress at once
+CLOUD_CONCURRENCY = int(os.getenv("CLOUD_CONCURRENCY", "4"))
+# How long an `adb devices` answer is trusted
+DEVICE_CHECK_TTL = 10.0
+# Hedged mode: launch the second backend once the first is slower than this percentile of its history
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.9"))
+# Delay used until a backend has enough samples for a percentile
+HEDGE_DEFAULT_DELAY = float(os.getenv("HEDGE_DEFAULT_DELAY", "20"))
+HEDGE_MIN_SAMPLES = 5
+
+# Set inside a hedged run: backends call report_progress() on every step/event they produce
+_PROGRESS: contextvars.ContextVar[Optional[Callable[[], None]]] = contextvars.ContextVar("router_progress", default=None)
+
+
+def report_progress():
+    """A running backend produced a step or event; resets the hedge timer of the run it belongs to, if any."""
+    callback = _PROGRESS.get()
+    if callback:
+        callback()
+
+
+def skipped(result: Optional[dict]) -> bool:
+    """The backend declined to run (e.g. cloud breaker open), so there is no latency or outcome to learn from."""
+    return isinstance(result, dict) and result.get("status") == "skipped"
+
+
+def succeeded(result: Optional[dict]) -> bool:
+    return result is not None and result.get("status") not in ("failed", "skipped")
+
+
+class BackendStats:
+    def __init__(self, name: str, prior_latency: float, capacity: int):
+        self.name = name
+        self.capacity = capacity
+        self.ewma_latency = prior_latency
+        self.success_rate = 1.0
+        self.inflight = 0
+        self.runs = 0
+        self.failures = 0
+        self.samples = deque(maxlen=100)
+
+    def record(self, latency: float, success: bool):
+        self.runs += 1
+        if success:
+            self.samples.append(latency)
+        else:
+            self.failures += 1
+        # Failed runs still tell us how long the backend makes callers wait
+        self.ewma_latency = EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma_latency
+        self.success_rate = EWMA_ALPHA * (1.0 if success else 0.0) + (1 - EWMA_ALPHA) * self.success_rate
+
+    def expected_completion(self) -> float:
+        """Queueing delay plus service time, inflated by the chance of having to run again elsewhere."""
+        waves = 1 + self.inflight // self.capacity
+        return waves * self.ewma_latency / max(self.success_rate, 0.05)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        p90 = self.percentile(0.9)
+        return {
+            "ewma_latency_seconds": round(self.ewma_latency, 2),
+            "p90_latency_seconds": round(p90, 2) if p90 is not None else None,
+            "success_rate": round(self.success_rate, 3),
+            "inflight": self.inflight,
+            "runs": self.runs,
+            "failures": self.failures,
+            "expected_completion_seconds": round(self.expected_completion(), 2),
+        }
+
+
+class BackendRouter:
+    """
+    Picks MobileRun cloud or local DroidRun per task by expected completion time.
+    Tracks EWMA latency, success rate and in-flight count per backend, plus whether a USB device is attached.
+    """
+
+    def __init__(self):
+        self.backends = {
+            "cloud": BackendStats("cloud", prior_latency=60.0, capacity=CLOUD_CONCURRENCY),
+            "local": BackendStats("local", prior_latency=45.0, capacity=1),
+        }
+        self.decisions = deque(maxlen=50)
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+        self.hedged_runs = 0
+        self.latency_saved = 0.0
+        self._devices = 0
+        self._devices_checked_at = 0.0
+
+    async def local_devices(self) -> int:
+        if time.monotonic() - self._devices_checked_at > DEVICE_CHECK_TTL:
+            try:
+                out = await adb("devices", timeout=5)
+                self._devices = sum(1 for line in out.splitlines()[1:] if line.strip().endswith("device"))
+            except Exception as e:
+                print(f"[Router] adb devices failed: {e}")
+                self._devices = 0
+            self._devices_checked_at = time.monotonic()
+        return self._devices
+
+    async def plan(self, cloud_enabled: bool) -> List[str]:
+        """Returns the backends to try, best first. The rest are fallbacks."""
+        candidates = {}
+        if cloud_enabled:
+            candidates["cloud"] = self.backends["cloud"].expected_completion()
+        if await self.local_devices() > 0:
+            candidates["local"] = self.backends["local"].expected_completion()
+
+        order = sorted(candidates, key=candidates.get)
+        if not order:
+            # Nothing looks available; let local try anyway so the caller gets a real error
+            order = ["local"]
+
+        self.decisions.append({
+            "at": time.strftime("%H:%M:%S"),
+            "order": order,
+            "expected_seconds": {k: round(v, 2) for k, v in candidates.items()},
+            "local_devices": self._devices,
+        })
+        return order
+
+    def start(self, backend: str) -> float:
+        self.backends[backend].inflight += 1
+        return time.monotonic()
+
+    def finish(self, backend: str, started_at: float, success: bool):
+        stats = self.backends[backend]
+        stats.inflight = max(0, stats.inflight - 1)
+        stats.record(time.monotonic() - started_at, success)
+
+    async def run(self, backend: str, execute: Callable[[str], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        """Runs execute(backend) and feeds its latency/outcome back into the stats."""
+        started = self.start(backend)
+        # Stays None when cancelled or skipped: neither says anything about the backend's health
+        success = None
+        try:
+            result = await execute(backend)
+            if not skipped(result):
+                success = succeeded(result)
+            return result
+        except Exception:
+            success = False
+            raise
+        finally:
+            if success is None:
+                self.backends[backend].inflight = max(0, self.backends[backend].inflight - 1)
+            else:
+                self.finish(backend, started, success)
+
+    def hedge_delay(self, backend: str) -> float:
+        p = self.backends[backend].percentile(HEDGE_PERCENTILE)
+        return p if p is not None else HEDGE_DEFAULT_DELAY
+
+    async def _run_reporting(self, backend: str, execute: Callable[[str], Awaitable[Optional[dict]]],
+                             on_progress: Callable[[], None]) -> Optional[dict]:
+        # Runs in its own task, so the progress callback only reaches this backend's run
+        _PROGRESS.set(on_progress)
+        return await self.run(backend, execute)
+
+    async def run_hedged(self, primary: str, secondary: str,
+                         execute: Callable[[str], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        """
+        Starts `primary`. If it produces no progress (cloud event, agent step) for its hedge delay, starts
+        `secondary` alongside it. The first successful result wins and the other run is cancelled.
+        """
+        self.hedged_runs += 1
+        delay = self.hedge_delay(primary)
+        started = time.monotonic()
+        last_progress = [started]
+
+        def progressed():
+            last_progress[0] = time.monotonic()
+
+        first = asyncio.create_task(self._run_reporting(primary, execute, progressed))
+        tasks = {first: primary}
+
+        try:
+            done = set()
+            while not done:
+                remaining = last_progress[0] + delay - time.monotonic()
+                if remaining <= 0:
+                    break
+                done, _ = await asyncio.wait({first}, timeout=remaining)
+            if done:
+                result = first.result()
+                if succeeded(result):
+                    return result
+                # Primary failed fast: plain fallback, nothing to race against
+                return await self.run(secondary, execute)
+
+            print(f"[Router] ⏱️ {primary} silent for {delay:.1f}s, hedging with {secondary}")
+            self.hedges_fired += 1
+            tasks[asyncio.create_task(self.run(secondary, execute))] = secondary
+
+            result = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        continue
+                    if succeeded(task.result()):
+                        if tasks[task] == secondary:
+                            self.hedge_wins += 1
+                            self._saved(primary, time.monotonic() - started)
+                        return task.result()
+                    if not skipped(task.result()):
+                        result = task.result()
+            return result
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _saved(self, primary: str, elapsed: float):
+        """Estimate for a hedge win: the primary's typical (p50) latency minus how long the winner took."""
+        stats = self.backends[primary]
+        typical = stats.percentile(0.5)
+        self.latency_saved += max(0.0, (typical if typical is not None else stats.ewma_latency) - elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backends": {name: b.to_dict() for name, b in self.backends.items()},
+            "hedging": {
+                "hedged_runs": self.hedged_runs,
+                "hedges_fired": self.hedges_fired,
+                "hedge_wins": self.hedge_wins,
+                "fire_rate": round(self.hedges_fired / self.hedged_runs, 3) if self.hedged_runs else 0.0,
+                "latency_saved_seconds_est": round(self.latency_saved, 2),
+            },
+            "local_devices": self._devices,
+            "recent_decisions": list(self.decisions),
+        }
+
+
+ROUTER = BackendRouter()
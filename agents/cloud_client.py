@@ -0,0 +1,302 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- MobileRun SDK ---
+try:
+    from mobilerun import MobileRunClient
+except ImportError:
+    try:
+        from mobile_use import MobileRunClient
+    except ImportError:
+        MobileRunClient = None
+
+from agents.backend_router import report_progress
+from agents.task_log import task_log
+
+# Offline stand-in for the MobileRun API (see FakeMobileRunClient)
+MOBILERUN_FAKE = os.getenv("MOBILERUN_FAKE", "False").lower() == "true"
+
+# Consecutive cloud failures before the breaker opens
+BREAKER_THRESHOLD = int(os.getenv("CLOUD_BREAKER_THRESHOLD", "3"))
+# Seconds the breaker stays open before letting a probe job through
+BREAKER_COOLDOWN = float(os.getenv("CLOUD_BREAKER_COOLDOWN", "60"))
+
+# run_cloud_job's answer when no job was submitted (no client, breaker open). Not a cloud failure.
+SKIPPED = {"status": "skipped", "error": "Cloud skipped"}
+
+
+class CircuitBreaker:
+    """
+    closed    -> calls go through, consecutive failures are counted.
+    open      -> calls are refused until the cooldown passes.
+    half_open -> a single probe call is let through; success closes, failure re-opens.
+    """
+
+    def __init__(self, name: str, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+        self.opened_count = 0
+        self.rejected = 0
+
+    def available(self) -> bool:
+        """True if a call could be attempted now. Has no side effects besides the open -> half_open timeout."""
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown:
+            self.state = "half_open"
+            print(f"[Breaker:{self.name}] Cooldown over, half-open for a probe.")
+        if self.state == "half_open":
+            return not self.probe_in_flight
+        return self.state == "closed"
+
+    def allow(self) -> bool:
+        """Claims permission for one call. Must be followed by record_success/record_failure/release."""
+        if not self.available():
+            self.rejected += 1
+            return False
+        if self.state == "half_open":
+            self.probe_in_flight = True
+        return True
+
+    def record_success(self):
+        if self.state != "closed":
+            print(f"[Breaker:{self.name}] Probe succeeded, closing.")
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.threshold:
+            if self.state != "open":
+                self.opened_count += 1
+            print(f"[Breaker:{self.name}] Open for {self.cooldown:.0f}s after {self.consecutive_failures} failure(s).")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def release(self):
+        """The call was abandoned (e.g. cancelled) without telling us anything about health."""
+        self.probe_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        self.available()
+        retry_in = 0.0
+        if self.state == "open":
+            retry_in = max(0.0, self.cooldown - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.opened_count,
+            "rejected_calls": self.rejected,
+            "retry_in_seconds": round(retry_in, 1),
+        }
+
+
+BREAKER = CircuitBreaker("mobilerun")
+
+_client = None
+
+
+def get_client():
+    """
+    Shared MobileRunClient for the whole process, so its HTTP connections are reused across tasks.
+    Returns None when the SDK or MOBILERUN_API_KEY is missing.
+    """
+    global _client
+    if _client is None and MOBILERUN_FAKE:
+        _client = FakeMobileRunClient()
+        print("[MobileRun] Using offline fake client 🧪")
+    if _client is None and MobileRunClient:
+        api_key = os.getenv("MOBILERUN_API_KEY")
+        if api_key:
+            try:
+                _client = MobileRunClient(api_key=api_key)
+                print("[MobileRun] Shared client ready ☁️")
+            except Exception as e:
+                print(f"[MobileRun] Client init failed: {e}")
+    return _client
+
+
+async def close_client():
+    global _client
+    if _client is None:
+        return
+    for name in ("aclose", "close"):
+        closer = getattr(_client, name, None)
+        if closer:
+            try:
+                res = closer()
+                if hasattr(res, "__await__"):
+                    await res
+            except Exception as e:
+                print(f"[MobileRun] Client close failed: {e}")
+            break
+    _client = None
+
+
+def describe_cloud_event(event: Any) -> str:
+    """One log line for a streamed job event, whatever shape the SDK hands us."""
+    if isinstance(event, str):
+        return f"☁️ {event}"
+    data = event if isinstance(event, dict) else getattr(event, "__dict__", {})
+    kind = data.get("type") or data.get("event") or type(event).__name__
+    step = data.get("step")
+    detail = data.get("message") or data.get("action") or data.get("description") or data.get("status") or ""
+    prefix = f"☁️ [step {step}] " if step is not None else "☁️ "
+    return f"{prefix}{kind}: {detail}".rstrip(": ")
+
+
+def _event_stream(job):
+    """The job's async event iterator, if this SDK version exposes one."""
+    for name in ("stream_events", "events", "stream"):
+        fn = getattr(job, name, None)
+        if callable(fn):
+            return fn()
+    if hasattr(job, "__aiter__"):
+        return job
+    return None
+
+
+async def _forward_events(job, on_event: Callable[[str], Awaitable[None]]):
+    stream = _event_stream(job)
+    if stream is None:
+        return
+    try:
+        async for event in stream:
+            report_progress()
+            await on_event(describe_cloud_event(event))
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"[MobileRun] Event stream ended: {e}")
+
+
+async def run_cloud_job(app_id: str, instruction: str, on_event: Optional[Callable[[str], Awaitable[None]]] = None,
+                        **submit_kwargs) -> Union[str, Dict[str, str], None]:
+    """
+    Submits one job on the shared client behind the breaker.
+    Progress events are forwarded to `on_event` (default: the current task's log) while the job runs.
+    Returns the job output text, SKIPPED if no job was submitted, or None if the job did not complete.
+    """
+    client = get_client()
+    if client is None:
+        return dict(SKIPPED)
+    if not BREAKER.allow():
+        print(f"[MobileRun] ⛔ Breaker {BREAKER.state}, skipping cloud.")
+        return dict(SKIPPED)
+
+    try:
+        job = await client.submit_job(
+            app_id=app_id,
+            instruction=instruction,
+            device="pixel_8_pro",
+            stream=True,
+            **submit_kwargs
+        )
+        forwarder = asyncio.create_task(_forward_events(job, on_event or task_log))
+        try:
+            result = await job.result()
+            # Let events that were already queued reach the log before we report completion
+            try:
+                await asyncio.wait_for(asyncio.shield(forwarder), timeout=0.5)
+            except asyncio.TimeoutError:
+                pass
+        except asyncio.CancelledError:
+            # Lost a hedge race or the task was cancelled: don't leave the cloud device burning credits
+            if hasattr(job, "cancel"):
+                try:
+                    await job.cancel()
+                except Exception:
+                    pass
+            raise
+        finally:
+            forwarder.cancel()
+    except asyncio.CancelledError:
+        BREAKER.release()
+        raise
+    except Exception as e:
+        print(f"[MobileRun] ⚠️ Error: {e}")
+        BREAKER.record_failure()
+        return None
+
+    if result.status == "COMPLETED":
+        BREAKER.record_success()
+        return result.output
+
+    print(f"[MobileRun] ❌ Job Status: {result.status}")
+    BREAKER.record_failure()
+    return None
+
+
+class FakeJobResult:
+    def __init__(self, status: str, output: str):
+        self.status = status
+        self.output = output
+
+
+class FakeJob:
+    """Emits scripted progress events with a delay between each, then completes."""
+
+    def __init__(self, app_id: str, instruction: str, step_delay: float, fail_rate: float):
+        self.app_id = app_id
+        self.instruction = instruction
+        self.step_delay = step_delay
+        self.failed = random.random() < fail_rate
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.done = asyncio.get_running_loop().create_future()
+        self.runner = asyncio.create_task(self._run())
+
+    async def _run(self):
+        script = [
+            {"type": "device_allocated", "message": "pixel_8_pro"},
+            {"type": "app_launched", "message": self.app_id},
+            {"type": "action", "step": 1, "action": f"working on: {self.instruction[:40]}"},
+            {"type": "action", "step": 2, "action": "extracting result"},
+        ]
+        for event in script:
+            await asyncio.sleep(self.step_delay)
+            await self.events.put(event)
+        await self.events.put(None)
+        if self.failed:
+            self.done.set_result(FakeJobResult("FAILED", ""))
+        else:
+            self.done.set_result(FakeJobResult("COMPLETED", '{"status": "success", "message": "fake cloud run"}'))
+
+    async def stream_events(self):
+        while True:
+            event = await self.events.get()
+            if event is None:
+                return
+            yield event
+
+    async def result(self):
+        return await asyncio.shield(self.done)
+
+    async def cancel(self):
+        self.runner.cancel()
+
+
+class FakeMobileRunClient:
+    """
+    Offline stand-in for MobileRunClient (MOBILERUN_FAKE=true).
+    MOBILERUN_FAKE_STEP_DELAY sets seconds between events, MOBILERUN_FAKE_FAIL_RATE the share of failed jobs.
+    """
+
+    def __init__(self):
+        self.step_delay = float(os.getenv("MOBILERUN_FAKE_STEP_DELAY", "0.5"))
+        self.fail_rate = float(os.getenv("MOBILERUN_FAKE_FAIL_RATE", "0"))
+
+    async def submit_job(self, app_id: str, instruction: str, **kwargs) -> FakeJob:
+        return FakeJob(app_id, instruction, self.step_delay, self.fail_rate)
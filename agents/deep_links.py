@@ -0,0 +1,157 @@
+import asyncio
+import os
+from typing import Any, Dict, Optional
+from urllib.parse import quote
+
+from agents.device_primitives import foreground_package, open_intent
+from agents.tracing import span
+
+# How long to wait for the app to come to the foreground after firing the link
+DEEP_LINK_SETTLE = float(os.getenv("DEEP_LINK_SETTLE", "3"))
+DEEP_LINKS_ENABLED = os.getenv("DEEP_LINKS", "True").lower() == "true"
+
+# Airport codes for the MakeMyTrip flight search link; other cities fall back to the menu walk
+IATA = {
+    "bengaluru": "BLR", "bangalore": "BLR", "mumbai": "BOM", "bombay": "BOM", "delhi": "DEL", "new delhi": "DEL",
+    "goa": "GOI", "chennai": "MAA", "madras": "MAA", "kolkata": "CCU", "calcutta": "CCU", "hyderabad": "HYD",
+    "pune": "PNQ", "ahmedabad": "AMD", "jaipur": "JAI", "kochi": "COK", "cochin": "COK", "lucknow": "LKO",
+    "guwahati": "GAU", "chandigarh": "IXC", "varanasi": "VNS", "srinagar": "SXR", "thiruvananthapuram": "TRV",
+}
+
+# (app, flow) -> link. Only links the app handles itself (custom scheme or verified app link) are listed;
+# Zomato, Ola and MakeMyTrip cabs have no public entry point that lands past the home screen.
+# steps_saved: agent steps the original goal spends getting to the same screen.
+CATALOG = {
+    ("Amazon", "search"): {
+        "package": "com.amazon.mShop.android.shopping",
+        "uri": "https://www.amazon.in/s?k={query}",
+        "lands_on": "search results for '{raw_query}'",
+        "steps_saved": 3,
+    },
+    ("Flipkart", "search"): {
+        "package": "com.flipkart.android",
+        "uri": "https://www.flipkart.com/search?q={query}",
+        "lands_on": "search results for '{raw_query}'",
+        "steps_saved": 3,
+    },
+    ("Swiggy", "search"): {
+        "package": "in.swiggy.android",
+        "uri": "https://www.swiggy.com/search?query={query}",
+        "lands_on": "search results for '{raw_query}'",
+        "steps_saved": 3,
+    },
+    ("Uber", "ride"): {
+        "package": "com.ubercab",
+        "uri": "uber://?action=setPickup&pickup[formatted_address]={pickup}&dropoff[formatted_address]={drop}",
+        "lands_on": "the ride screen with pickup '{raw_pickup}' and drop '{raw_drop}' prefilled",
+        "steps_saved": 4,
+    },
+    ("MakeMyTrip", "flights"): {
+        "package": "com.makemytrip",
+        "uri": ("https://www.makemytrip.com/flight/search?itinerary={source}-{dest}-{date}"
+                "&tripType=O&paxType=A-1_C-0_I-0&intl=false&cabinClass=E"),
+        "lands_on": "one-way flight results from {raw_source} to {raw_dest} on {raw_date}",
+        "steps_saved": 7,
+    },
+}
+
+
+def _airport(city: str) -> Optional[str]:
+    city = (city or "").strip()
+    if city.lower() in IATA:
+        return IATA[city.lower()]
+    # Already a code ("BLR")
+    if len(city) == 3 and city.isalpha() and city.isupper():
+        return city
+    return None
+
+
+def _mmt_date(date: str) -> Optional[str]:
+    # 2026-11-01 -> 01/11/2026
+    parts = (date or "").split("-")
+    if len(parts) == 3 and len(parts[0]) == 4:
+        return f"{parts[2]}/{parts[1]}/{parts[0]}"
+    return None
+
+
+class DeepLinkCatalog:
+    """Opens apps straight on a search/booking screen and keeps per-app hit and steps-saved counts."""
+
+    def __init__(self, catalog: Dict = CATALOG):
+        self.catalog = catalog
+        self.counters: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, app: str, field: str, amount: int = 1):
+        counters = self.counters.setdefault(app, {"requests": 0, "unsupported": 0, "opened": 0, "fallbacks": 0,
+                                                  "steps_saved": 0})
+        counters[field] += amount
+
+    def build(self, app: str, flow: str, **params) -> Optional[Dict[str, Any]]:
+        """Fills the link for (app, flow), or None if there is no link or the params can't be expressed."""
+        entry = self.catalog.get((app, flow))
+        if not entry:
+            return None
+
+        values = {f"raw_{k}": v for k, v in params.items()}
+        if flow == "flights":
+            source, dest, date = _airport(params.get("source")), _airport(params.get("dest")), _mmt_date(params.get("date"))
+            if not (source and dest and date):
+                return None
+            values.update(source=source, dest=dest, date=date)
+        else:
+            values.update({k: quote(str(v), safe="") for k, v in params.items()})
+
+        return {
+            "package": entry["package"],
+            "uri": entry["uri"].format(**values),
+            "lands_on": entry["lands_on"].format(**values),
+            "steps_saved": entry["steps_saved"],
+        }
+
+    async def open(self, app: str, flow: str, serial: Optional[str] = None, **params) -> Optional[str]:
+        """
+        Fires the link and waits for the app to be in front. Returns a description of the screen
+        the agent starts on, or None when the caller should run its full goal instead.
+        """
+        if not DEEP_LINKS_ENABLED:
+            return None
+        self._count(app, "requests")
+        link = self.build(app, flow, **params)
+        if not link:
+            self._count(app, "unsupported")
+            return None
+
+        try:
+            with span("deep_link", app=app, flow=flow):
+                if not await open_intent(data=link["uri"], package=link["package"], serial=serial):
+                    raise RuntimeError("intent not resolved")
+                deadline = asyncio.get_running_loop().time() + DEEP_LINK_SETTLE
+                while await foreground_package(serial) != link["package"]:
+                    if asyncio.get_running_loop().time() > deadline:
+                        raise RuntimeError("app did not come to the foreground")
+                    await asyncio.sleep(0.3)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[DeepLink] {app}/{flow} failed ({e}), using full goal")
+            self._count(app, "fallbacks")
+            return None
+
+        print(f"🔗 [DeepLink] {app}: {link['lands_on']}")
+        self._count(app, "opened")
+        self._count(app, "steps_saved", link["steps_saved"])
+        return link["lands_on"]
+
+    def stats(self) -> Dict[str, Any]:
+        coverage: Dict[str, list] = {}
+        for app, flow in self.catalog:
+            coverage.setdefault(app, []).append(flow)
+        return {
+            "enabled": DEEP_LINKS_ENABLED,
+            "coverage": coverage,
+            "apps": self.counters,
+            "steps_saved_total": sum(c["steps_saved"] for c in self.counters.values()),
+        }
+
+
+DEEP_LINKS = DeepLinkCatalog()
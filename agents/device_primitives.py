@@ -0,0 +1,217 @@
+import re
+import shlex
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.adb_utils import adb_shell, adb_shell_run
+from agents.app_index import APPS
+from agents.intent_matcher import TOGGLES
+from agents.tracing import span
+
+KEYCODES = {
+    "home": 3,
+    "back": 4,
+    "call": 5,
+    "end_call": 6,
+    "volume_up": 24,
+    "volume_down": 25,
+    "power": 26,
+    "camera": 27,
+    "enter": 66,
+    "delete": 67,
+    "menu": 82,
+    "search": 84,
+    "play_pause": 85,
+    "mute": 164,
+    "recents": 187,
+}
+
+# Canonical setting name (see intent_matcher.TOGGLES) -> shell command per state.
+# Flashlight has no shell switch, so it stays with the agent.
+TOGGLE_COMMANDS = {
+    "Wi-Fi": {"on": ["svc", "wifi", "enable"], "off": ["svc", "wifi", "disable"]},
+    "Mobile data": {"on": ["svc", "data", "enable"], "off": ["svc", "data", "disable"]},
+    "Bluetooth": {"on": ["svc", "bluetooth", "enable"], "off": ["svc", "bluetooth", "disable"]},
+    "Airplane mode": {"on": ["cmd", "connectivity", "airplane-mode", "enable"],
+                      "off": ["cmd", "connectivity", "airplane-mode", "disable"]},
+    "Location": {"on": ["cmd", "location", "set-location-enabled", "true"],
+                 "off": ["cmd", "location", "set-location-enabled", "false"]},
+    "Do Not Disturb": {"on": ["cmd", "notification", "set_dnd", "priority"],
+                       "off": ["cmd", "notification", "set_dnd", "off"]},
+}
+
+# app_identifier of free-form tasks, whose app is only named in the instruction
+UNIVERSAL = "Universal"
+
+_ADB_ERRORS = ("error", "exception", "unknown command", "not found", "can't find", "no activities found", "permission denial")
+
+# package -> launcher component ("pkg/.MainActivity"), resolved once per process
+_launch_components: Dict[str, Optional[str]] = {}
+
+_OPEN = re.compile(r"^(?:open|launch|start)\s+(?:the\s+)?(?P<app>.+?)(?:\s+app)?\.?$", re.IGNORECASE)
+# "Open Spotify and play lo-fi" -> "Spotify": the app a free-form instruction starts in
+_OPENS_IN = re.compile(
+    r"^(?:open|launch|start)\s+(?:the\s+)?(?P<app>.+?)(?:\s+app)?(?=\s*(?:[,.;]|\s(?:and|then|to|&)\s|$))",
+    re.IGNORECASE,
+)
+_KEY = re.compile(
+    r"^(?:press|tap|hit|go)\s+(?:the\s+)?(?:system\s+)?(?P<key>home|back|recents|enter|power|volume up|volume down|mute)"
+    r"(?:\s+(?:button|key|screen))?\.?$",
+    re.IGNORECASE,
+)
+_SETTINGS = "|".join(re.escape(t) for t in sorted(TOGGLES, key=len, reverse=True))
+_TOGGLE = re.compile(rf"^(?:turn|switch)\s+(?P<state>on|off)\s+(?:the\s+)?(?P<setting>{_SETTINGS})\.?$", re.IGNORECASE)
+
+
+def _failed(result: Tuple[int, str, str]) -> bool:
+    """Non-zero exit, or an error on either stream (`am`/`cmd` often exit 0 after printing one)."""
+    code, out, err = result
+    text = f"{out}\n{err}".lower()
+    return code != 0 or any(marker in text for marker in _ADB_ERRORS)
+
+
+async def press_key(key, serial: Optional[str] = None) -> bool:
+    code = KEYCODES.get(str(key).lower().replace(" ", "_"), key)
+    with span("primitive", kind="key", key=str(key)):
+        result = await adb_shell_run("input", "keyevent", str(code), serial=serial, timeout=5)
+    return not _failed(result)
+
+
+async def launch_app(package: str, serial: Optional[str] = None) -> bool:
+    """
+    Starts the app's launcher activity. Uses `am start -n` once the component is known
+    (resolved via `cmd package resolve-activity`), otherwise falls back to `monkey`.
+    """
+    with span("primitive", kind="launch", app=package):
+        if package not in _launch_components:
+            output = await adb_shell("cmd", "package", "resolve-activity", "--brief",
+                                     "-c", "android.intent.category.LAUNCHER", package, serial=serial)
+            last = output.splitlines()[-1].strip() if output else ""
+            _launch_components[package] = last if "/" in last else None
+
+        component = _launch_components[package]
+        if component:
+            result = await adb_shell_run("am", "start", "-n", component, serial=serial)
+            if not _failed(result):
+                return True
+
+        code, output, _ = await adb_shell_run("monkey", "-p", package, "-c", "android.intent.category.LAUNCHER", "1",
+                                              serial=serial)
+        return code == 0 and "Events injected: 1" in output
+
+
+async def open_intent(action: str = "android.intent.action.VIEW", data: Optional[str] = None,
+                      package: Optional[str] = None, extras: Optional[Dict[str, str]] = None,
+                      serial: Optional[str] = None) -> bool:
+    """
+    `am start -W` for an arbitrary intent (deep links, settings panels, share targets...).
+    True only when am reports the launch completed (and, with `package`, that it landed in that app).
+    """
+    args: List[str] = ["am", "start", "-W", "-a", action]
+    if data:
+        args += ["-d", data]
+    for key, value in (extras or {}).items():
+        args += ["--es", key, str(value)]
+    if package:
+        args.append(package)
+    # One quoted string: adb joins separate args for the device's sh, which would cut URIs at '&' and glob '[]'
+    command = " ".join(shlex.quote(a) for a in args)
+    with span("primitive", kind="intent", app=package or ""):
+        result = await adb_shell_run(command, serial=serial)
+    return not _failed(result) and _launched(result[1], package)
+
+
+def _launched(output: str, package: Optional[str]) -> bool:
+    """Reads `am start -W` output: 'Status: ok' and, when it names one, the activity of the expected package."""
+    status = re.search(r"^Status: (\w+)", output, re.MULTILINE)
+    if not status or status.group(1) != "ok":
+        return False
+    activity = re.search(r"^Activity: ([\w.]+)/", output, re.MULTILINE)
+    return not (package and activity and activity.group(1) != package)
+
+
+async def set_toggle(setting: str, on: bool, serial: Optional[str] = None) -> bool:
+    commands = TOGGLE_COMMANDS.get(setting)
+    if not commands:
+        return False
+    with span("primitive", kind="toggle", setting=setting):
+        result = await adb_shell_run(*commands["on" if on else "off"], serial=serial)
+    return not _failed(result)
+
+
+def spoken_app(instruction: str) -> Optional[str]:
+    """The app a free-form instruction opens first ("Open WhatsApp and message Ravi" -> "WhatsApp"), if it says."""
+    m = _OPENS_IN.match((instruction or "").strip())
+    return m.group("app").strip() if m else None
+
+
+def match_primitive(app_identifier: str, app_package: str, instruction: str) -> Optional[Dict[str, Any]]:
+    """
+    Recognises instructions that are a single device operation. Returns a plan
+    ({"kind": "launch"|"key"|"toggle", ...}) or None if the task needs an agent.
+    For UNIVERSAL tasks the app to launch is resolved from the instruction through APPS.
+    """
+    text = (instruction or "").strip()
+
+    m = _KEY.match(text)
+    if m:
+        return {"kind": "key", "key": m.group("key").lower().replace(" ", "_")}
+
+    m = _TOGGLE.match(text)
+    if m:
+        setting = TOGGLES[m.group("setting").lower()]
+        if setting in TOGGLE_COMMANDS:
+            return {"kind": "toggle", "setting": setting, "on": m.group("state").lower() == "on"}
+        return None
+
+    m = _OPEN.match(text)
+    if not m:
+        return None
+    # Only a bare "Open <that app>", anything more is a real task
+    spoken = m.group("app").strip()
+    if app_identifier == UNIVERSAL:
+        found = APPS.lookup(spoken)
+        return {"kind": "launch", "package": found[0], "app": found[1]} if found else None
+    if app_package and "." in app_package and spoken.lower() in (str(app_identifier).lower(), app_package.lower()):
+        return {"kind": "launch", "package": app_package, "app": app_identifier}
+
+    return None
+
+
+async def run_primitive(app_identifier: str, app_package: str, instruction: str,
+                        serial: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Executes the instruction directly over ADB if it is a primitive. None means: use an agent."""
+    if app_identifier == UNIVERSAL:
+        # Installed apps beyond APP_MAPPING are only in the index once the device has been listed
+        await APPS.refresh(serial)
+    plan = match_primitive(app_identifier, app_package, instruction)
+    if not plan:
+        return None
+
+    try:
+        if plan["kind"] == "key":
+            ok = await press_key(plan["key"], serial=serial)
+            message = f"Pressed {plan['key'].replace('_', ' ').title()}"
+        elif plan["kind"] == "toggle":
+            ok = await set_toggle(plan["setting"], plan["on"], serial=serial)
+            message = f"{plan['setting']} turned {'on' if plan['on'] else 'off'}"
+        else:
+            ok = await launch_app(plan["package"], serial=serial)
+            message = f"Opened {plan['app']}"
+    except Exception as e:
+        print(f"[Primitive] {plan['kind']} failed: {e}")
+        return None
+
+    if not ok:
+        print(f"[Primitive] {plan['kind']} not confirmed by device, falling back to agent")
+        return None
+
+    print(f"⚡ [Primitive] {message}")
+    return {"status": "success", "message": message, "primitive": plan["kind"]}
+
+
+async def foreground_package(serial: Optional[str] = None) -> Optional[str]:
+    """Package of the resumed activity, e.g. 'com.ubercab'."""
+    output = await adb_shell("dumpsys activity activities | grep -E 'mResumedActivity|topResumedActivity'",
+                             serial=serial, timeout=5)
+    m = re.search(r"\bu\d+ ([\w.]+)/", output)
+    return m.group(1) if m else None
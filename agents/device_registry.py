@@ -0,0 +1,242 @@
+import os
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from agents.adb_utils import adb, adb_shell
+
+# App name -> package, shared by AgentFactory, MobileRunWrapper and the intent matcher
+APP_MAPPING = {
+    # Transit
+    "Uber": "com.ubercab",
+    "MakeMyTrip": "com.makemytrip",
+    # Stay
+    "Booking.com": "com.booking",
+    # Commerce
+    "Amazon": "com.amazon.mShop.android.shopping",
+    "Flipkart": "com.flipkart.android",
+    "Zomato": "com.application.zomato",
+    "Swiggy": "in.swiggy.android",
+    # Social
+    "WhatsApp": "com.whatsapp",
+    # Pharmacy
+    "PharmEasy": "com.pharmeasy.app",
+    "Apollo 24|7": "com.apollo.patientapp",
+    "Tata 1mg": "com.aranoah.healthkart.plus",
+    # Ride
+    "Ola": "com.olacabs.customer",
+    "System": "com.android.settings",
+}
+
+# Installed packages are re-listed after this long; device props only on reboot/reconnect
+PACKAGES_TTL = float(os.getenv("DEVICE_PACKAGES_TTL", "300"))
+# How long an `adb devices` answer and a rotation reading are trusted
+DEVICES_TTL = 10.0
+ORIENTATION_TTL = 2.0
+
+_SECTION = re.compile(r"^@(\w+)$", re.MULTILINE)
+_PROBE = ("echo @size; wm size; echo @density; wm density; echo @sdk; getprop ro.build.version.sdk; "
+          "echo @release; getprop ro.build.version.release; echo @model; getprop ro.product.model; "
+          "echo @boot; cat /proc/sys/kernel/random/boot_id")
+# Installed packages with version codes, then the packages with a launcher activity (what a user can "open")
+_PACKAGES = ("echo @packages; cmd package list packages --show-versioncode; echo @launcher; "
+             "cmd package query-activities --brief -a android.intent.action.MAIN -c android.intent.category.LAUNCHER")
+_COMPONENT = re.compile(r"^\s*([\w.]+)/[\w.$]+\s*$", re.MULTILINE)
+
+
+def _sections(output: str) -> Dict[str, str]:
+    parts = _SECTION.split(output)
+    return {parts[i]: parts[i + 1].strip() for i in range(1, len(parts) - 1, 2)}
+
+
+def _override_or_physical(text: str, pattern: str) -> Optional[str]:
+    """`wm size`/`wm density` print the physical value and, if set, an override that is what apps see."""
+    found = dict(re.findall(rf"(Physical|Override) {pattern}: (\S+)", text))
+    return found.get("Override") or found.get("Physical")
+
+
+class DeviceProfile:
+    def __init__(self, serial: str):
+        self.serial = serial
+        self.width = 0
+        self.height = 0
+        self.density = 0
+        self.sdk = 0
+        self.release = ""
+        self.model = ""
+        self.boot_id = ""
+        self.orientation = 0
+        self.packages: Dict[str, int] = {}
+        self.launchable: Set[str] = set()
+        self.probed_at = 0.0
+        self.packages_at = 0.0
+        self.orientation_at = 0.0
+
+    def screen_size(self) -> Tuple[int, int]:
+        """Size in the current orientation (wm size reports the natural, usually portrait, one)."""
+        if self.orientation in (1, 3):
+            return self.height, self.width
+        return self.width, self.height
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "width": self.width,
+            "height": self.height,
+            "density": self.density,
+            "orientation": self.orientation,
+            "sdk": self.sdk,
+            "release": self.release,
+            "model": self.model,
+            "packages": len(self.packages),
+            "launchable": len(self.launchable),
+            "probed_at": time.strftime("%H:%M:%S", time.localtime(self.probed_at)) if self.probed_at else None,
+        }
+
+
+class DeviceRegistry:
+    """
+    Per-serial cache of what a device is: resolution, density, orientation, Android version and the
+    installed packages with their version codes (and which of them have a launcher activity). Static properties are probed once and re-probed only when
+    the device reconnects or reboots (boot id changes); the package list expires after PACKAGES_TTL or
+    when invalidate() is called, e.g. after a launch failed.
+    """
+
+    def __init__(self):
+        self.profiles: Dict[str, DeviceProfile] = {}
+        self.serials: List[str] = []
+        self.skipped: Dict[str, int] = {}
+        self.refreshes = 0
+        self._serials_at = 0.0
+
+    async def devices(self) -> List[str]:
+        """Attached serials. Devices that left are dropped, so a reconnect probes them afresh."""
+        if time.monotonic() - self._serials_at > DEVICES_TTL:
+            try:
+                out = await adb("devices", timeout=5)
+                self.serials = [line.split()[0] for line in out.splitlines()[1:] if line.strip().endswith("device")]
+            except Exception as e:
+                print(f"[Devices] adb devices failed: {e}")
+                self.serials = []
+            for gone in set(self.profiles) - set(self.serials):
+                print(f"[Devices] {gone} disconnected, dropping cached profile")
+                del self.profiles[gone]
+            self._serials_at = time.monotonic()
+        return self.serials
+
+    async def default_serial(self) -> Optional[str]:
+        serials = await self.devices()
+        return serials[0] if serials else None
+
+    async def profile(self, serial: Optional[str] = None) -> Optional[DeviceProfile]:
+        serial = serial or await self.default_serial()
+        if not serial:
+            return None
+        profile = self.profiles.get(serial)
+        try:
+            if profile is None:
+                profile = self.profiles[serial] = DeviceProfile(serial)
+                await self._probe(profile)
+            elif time.monotonic() - profile.packages_at > PACKAGES_TTL:
+                # Cheap reboot check rides along with the package refresh
+                boot_id = (await adb_shell("cat", "/proc/sys/kernel/random/boot_id", serial=serial, timeout=5)).strip()
+                if boot_id != profile.boot_id:
+                    print(f"[Devices] {serial} rebooted, re-probing")
+                    await self._probe(profile)
+                else:
+                    await self._list_packages(profile)
+        except Exception as e:
+            print(f"[Devices] Could not probe {serial}: {e}")
+            if not profile.probed_at:
+                self.profiles.pop(serial, None)
+                return None
+        return profile
+
+    async def _probe(self, profile: DeviceProfile):
+        self.refreshes += 1
+        info = _sections(await adb_shell(_PROBE, serial=profile.serial, timeout=10))
+        size = _override_or_physical(info.get("size", ""), "size")
+        if size and "x" in size:
+            profile.width, profile.height = (int(v) for v in size.split("x"))
+        density = _override_or_physical(info.get("density", ""), "density")
+        profile.density = int(density) if density and density.isdigit() else 0
+        sdk = info.get("sdk", "")
+        profile.sdk = int(sdk) if sdk.isdigit() else 0
+        profile.release = info.get("release", "")
+        profile.model = info.get("model", "")
+        profile.boot_id = info.get("boot", "")
+        profile.probed_at = time.time()
+        await self._list_packages(profile)
+        await self.orientation(profile.serial)
+        print(f"📱 [Devices] {profile.serial}: {profile.model} Android {profile.release}, "
+              f"{profile.width}x{profile.height} @{profile.density}dpi, {len(profile.packages)} packages")
+
+    async def _list_packages(self, profile: DeviceProfile):
+        info = _sections(await adb_shell(_PACKAGES, serial=profile.serial, timeout=15))
+        packages = {}
+        for m in re.finditer(r"package:(\S+)(?:\s+versionCode:(\d+))?", info.get("packages", "")):
+            packages[m.group(1)] = int(m.group(2) or 0)
+        if packages:
+            profile.packages = packages
+            profile.launchable = {p for p in _COMPONENT.findall(info.get("launcher", "")) if p in packages}
+        profile.packages_at = time.monotonic()
+
+    async def orientation(self, serial: Optional[str] = None) -> int:
+        """Current rotation (0-3). Read live, but at most every ORIENTATION_TTL seconds."""
+        profile = self.profiles.get(serial or "")
+        if profile and time.monotonic() - profile.orientation_at < ORIENTATION_TTL:
+            return profile.orientation
+        try:
+            out = await adb_shell("dumpsys input | grep -m1 SurfaceOrientation", serial=serial, timeout=5)
+            m = re.search(r"SurfaceOrientation: (\d)", out)
+            rotation = int(m.group(1)) if m else 0
+        except Exception:
+            rotation = 0
+        if profile:
+            profile.orientation = rotation
+            profile.orientation_at = time.monotonic()
+        return rotation
+
+    def invalidate(self, serial: Optional[str] = None):
+        """Forces a package re-list on the next lookup (all devices when no serial is given)."""
+        for s, profile in self.profiles.items():
+            if serial is None or s == serial:
+                profile.packages_at = 0.0
+
+    async def is_installed(self, app: str, serial: Optional[str] = None) -> Optional[bool]:
+        """
+        True/False for known apps (by name or package). None when it can't be told:
+        no device, the probe failed, or the identifier isn't a package.
+        """
+        package = APP_MAPPING.get(app, app)
+        if not package or "." not in package:
+            return None
+        profile = await self.profile(serial)
+        if profile is None or not profile.packages:
+            return None
+        return package in profile.packages
+
+    async def installed(self, apps: Iterable[str], serial: Optional[str] = None) -> List[str]:
+        """`apps` minus the ones known to be missing. Unknown apps are kept."""
+        kept = []
+        for app in apps:
+            if await self.is_installed(app, serial) is False:
+                self.skip(app)
+                continue
+            kept.append(app)
+        return kept
+
+    def skip(self, app: str):
+        """Counts a run that wasn't started because the app is missing."""
+        self.skipped[app] = self.skipped.get(app, 0) + 1
+        print(f"⏭️ [Devices] {app} is not installed, skipping")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "devices": {s: p.to_dict() for s, p in self.profiles.items()},
+            "refreshes": self.refreshes,
+            "skipped_not_installed": self.skipped,
+            "llm_runs_saved": sum(self.skipped.values()),
+        }
+
+
+DEVICES = DeviceRegistry()
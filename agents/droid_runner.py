@@ -0,0 +1,132 @@
+import asyncio
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from agents import popup_handler
+from agents.backend_router import report_progress
+from agents.task_log import task_log, task_step
+from agents.tracing import span
+
+# Event class name fragments -> step kind. First match wins, unknown events are not reported.
+EVENT_KINDS = [
+    ("Screenshot", "screenshot"),
+    ("Plan", "plan"),
+    ("Thinking", "thinking"),
+    ("Reason", "thinking"),
+    ("Tap", "action"),
+    ("Swipe", "action"),
+    ("InputText", "action"),
+    ("Action", "action"),
+    ("Execute", "action"),
+    ("UIState", "ui_state"),
+    ("Result", "outcome"),
+    ("Finalize", "result"),
+    ("TaskEnd", "result"),
+]
+
+# Attributes that usually carry the human-readable part of an event
+DETAIL_FIELDS = ["plan", "current_subgoal", "description", "action", "thoughts", "thought", "code", "reason", "output", "success"]
+
+# Action details that mean the agent just opened an app, when interstitials usually show up
+_LAUNCH = re.compile(r"start_app|open_app|launch", re.IGNORECASE)
+
+STEP_ICONS = {"plan": "🗺️", "thinking": "💭", "action": "👆", "screenshot": "📸", "ui_state": "🌳", "outcome": "✔️", "result": "🏁"}
+
+
+def step_kind(event: Any) -> Optional[str]:
+    name = type(event).__name__
+    for fragment, kind in EVENT_KINDS:
+        if fragment in name:
+            return kind
+    return None
+
+
+def step_detail(event: Any) -> str:
+    for field in DETAIL_FIELDS:
+        value = getattr(event, field, None)
+        if value not in (None, "", [], {}):
+            if isinstance(value, list):
+                value = "; ".join(str(v) for v in value[:3])
+            return " ".join(str(value).split())[:200]
+    return ""
+
+
+async def run_droid_agent(agent, label: str = "DroidAgent", app: str = ""):
+    """
+    Runs a DroidAgent and returns its final result, like `await agent.run()`.
+    While it runs, every recognised event becomes a step record (kind, detail, timing)
+    that goes to the current task's log and step stream.
+    """
+    with span("agent.run", app=app, agent=label):
+        return await _run_streaming(agent, label)
+
+
+async def _between_steps():
+    """
+    Interstitials are dismissed locally instead of costing the agent vision steps. Called when the result of
+    an app launch comes in, i.e. between the agent's steps, never on a timer.
+    """
+    if not (popup_handler.POPUP_WATCH and popup_handler.POPUP_AGENT_CHECK):
+        return
+    try:
+        await popup_handler.POPUPS.check()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        print(f"[Popup] Check failed: {e}")
+
+
+async def _run_streaming(agent, label: str):
+    handler = agent.run()
+    if not hasattr(handler, "stream_events"):
+        return await handler
+
+    started = time.monotonic()
+    last = started
+    steps: List[Dict[str, Any]] = []
+    launched = False
+
+    try:
+        async for event in handler.stream_events():
+            kind = step_kind(event)
+            if kind is None:
+                continue
+
+            now = time.monotonic()
+            record = {
+                "step": len(steps) + 1,
+                "agent": label,
+                "kind": kind,
+                "event": type(event).__name__,
+                "detail": step_detail(event),
+                "at_seconds": round(now - started, 3),
+                "duration_seconds": round(now - last, 3),
+            }
+            last = now
+            steps.append(record)
+            report_progress()
+
+            icon = STEP_ICONS.get(kind, "•")
+            await task_log(f"{icon} [{label} {record['step']}] {kind}: {record['detail']}".rstrip(": "))
+            await task_step(record)
+            if kind == "action" and _LAUNCH.search(record["detail"]):
+                launched = True
+            elif kind == "outcome" and launched:
+                launched = False
+                await _between_steps()
+
+        result = await handler
+    except asyncio.CancelledError:
+        # Stop the workflow itself, not just our wait on it
+        cancel_run = getattr(handler, "cancel_run", None)
+        if cancel_run:
+            try:
+                await cancel_run()
+            except Exception:
+                pass
+        raise
+
+    total = time.monotonic() - started
+    print(f"[{label}] {len(steps)} steps in {total:.1f}s")
+    return result
@@ -1,5 +1,6 @@
 import os
 import json
+import re
 import asyncio
 import sys
 from typing import List, Dict, Any
@@ -18,8 +19,44 @@ except ImportError:
     sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
     from agents.agent_factory import AgentFactory
 
+from agents.app_index import APPS
+from agents.intent_matcher import IntentMatcher, INTENT_CONFIDENCE
+from agents.llm_limiter import INTERACTIVE
+from agents.model_cascade import CASCADE
+
 load_dotenv()
 
+# Voice commands are latency-critical: optionally race cloud and local execution
+HEDGE_VOICE_COMMANDS = os.getenv("HEDGE_VOICE_COMMANDS", "False").lower() == "true"
+# Answer common commands ("open WhatsApp", "turn on wifi") locally instead of asking Gemini
+INTENT_FAST_PATH = os.getenv("INTENT_FAST_PATH", "True").lower() == "true"
+
+_ACTION_BLOCK = re.compile(r"```json\s*(\{.*?\})\s*```", re.DOTALL)
+# Actions that spend money; only the configured model may emit them
+_SIDE_EFFECTS = {"order", "book"}
+
+
+def _judge_reply(response):
+    """
+    Cascade judge for chat turns. Plain text and search/compare/general actions are fine from any tier.
+    Orders and bookings escalate so the configured model decides whether they fire, and garbled action
+    blocks escalate for a parseable answer. On the final tier the text is returned as it is.
+    """
+    text = response.text
+    if "```json" not in text and '"execute"' not in text:
+        return text, None
+    match = _ACTION_BLOCK.search(text)
+    if not match:
+        return text, "parse_failure"
+    try:
+        action = json.loads(match.group(1))
+    except json.JSONDecodeError:
+        return text, "parse_failure"
+    if isinstance(action, dict) and action.get("action") in _SIDE_EFFECTS:
+        return text, "side_effect"
+    return text, None
+
+
 class GeneralAgent:
     """
     The 'Brain' of the Agentic OS.
@@ -34,6 +71,7 @@ class GeneralAgent:
         self.model = model
         # Simple in-memory session store: { session_id: [messages] }
         self.sessions: Dict[str, List[Dict]] = {}
+        self.intent_matcher = IntentMatcher(AgentFactory.APP_MAPPING, resolver=APPS.lookup)
 
         # Initialize specialized agents
         # We need to add root to path to import them
@@ -68,8 +106,8 @@ class GeneralAgent:
             "   Required: 'item' (e.g. 'Fried Rice'), 'action' ('order' or 'search')\n"
             "   Output: { \"type\": \"execute\", \"domain\": \"food\", \"item\": \"...\", \"action\": \"order/search\", \"app_preference\": \"Zomato/Swiggy/None\" }\n"
             "2. Book Rides (Uber/Ola)\n"
-            "   Required: 'pickup', 'drop', 'type' (optional)\n"
-            "   Output: { \"type\": \"execute\", \"domain\": \"ride\", \"pickup\": \"...\", \"drop\": \"...\", \"mode\": \"cab\" }\n"
+            "   Required: 'pickup', 'drop', 'type' (optional), 'action' ('compare' or 'book')\n"
+            "   Output: { \"type\": \"execute\", \"domain\": \"ride\", \"pickup\": \"...\", \"drop\": \"...\", \"mode\": \"cab\", \"action\": \"compare/book\" }\n"
             "3. General Tasks\n"
             "   Output: { \"type\": \"execute\", \"domain\": \"general\", \"app\": \"App Name\", \"instruction\": \"...\" }\n"
             "\n"
@@ -79,6 +117,8 @@ class GeneralAgent:
             "3. IF user wants a task -> CHECK if all details are present.\n"
             "4. IF details missing -> ASK clarifying question.\n"
             "5. IF details clear -> RETURN the JSON block.\n"
+            "6. BEFORE an 'order' or 'book' action -> ASK the user to confirm; only return it after they say yes. "
+            "Searching and comparing need no confirmation.\n"
             "\n"
             "OUTPUT FORMAT:\n"
             "If replying/asking: Just plain text.\n"
@@ -98,8 +138,10 @@ class GeneralAgent:
         # 2. Add User Message
         history.append({"role": "user", "parts": [user_text]})
         
-        # 3. Call LLM
-        response_text = await self._call_llm(history)
+        # 3. Fast path for self-contained commands, otherwise call LLM
+        response_text = self._fast_path(history, user_text)
+        if response_text is None:
+            response_text = await self._call_llm(history)
         
         # 4. Parse Response for Actions
         action = None
@@ -142,6 +184,26 @@ class GeneralAgent:
             "action_debug": action
         }
 
+    def _fast_path(self, history: List[Dict], user_text: str):
+        """
+        Returns the reply Gemini would have given (a ```json execute block) for high-confidence commands, else None.
+        Skipped while we are waiting on an answer to our own question, since that turn needs the conversation.
+        """
+        if not INTENT_FAST_PATH:
+            return None
+        if len(history) > 1 and str(history[-2]["parts"][0]).rstrip().endswith("?"):
+            return None
+
+        match = self.intent_matcher.match(user_text)
+        if not match or match["confidence"] < INTENT_CONFIDENCE:
+            return None
+
+        print(f"⚡ [Intent] Fast path: {match['rule']} ({match['confidence']:.2f})")
+        if match.get("confirm"):
+            # Orders and bookings are never placed straight from the grammar; the "yes" turn goes to the LLM
+            return match["confirm"]
+        return f"```json\n{json.dumps(match['action'])}\n```"
+
     async def _execute_action(self, action: Dict) -> Dict:
         """Routes the action to the correct specialized agent."""
         domain = action.get("domain")
@@ -167,9 +229,17 @@ class GeneralAgent:
                 pickup = action.get("pickup")
                 drop = action.get("drop")
                 mode = action.get("mode", "cab")
-                
-                # Use book_cheapest_ride wrapper
-                return await self.ride_agent.book_cheapest_ride(pickup, drop, mode)
+
+                if action.get("action") == "book":
+                    # Use book_cheapest_ride wrapper
+                    return await self.ride_agent.book_cheapest_ride(pickup, drop, mode)
+
+                comparison = await self.ride_agent.compare_rides(pickup, drop, mode)
+                best = comparison.get("best_deal")
+                if not best:
+                    return {"status": "failed", "error": "No rides found."}
+                return {"status": "success", "message": f"Best Option: {best['app']} @ {best['data'].get('price')}",
+                        "details": comparison}
 
             # --- GENERAL / FALLBACK ---
             else:
@@ -184,7 +254,8 @@ class GeneralAgent:
                     app_identifier=app_name, 
                     instruction=instruction,
                     provider=self.provider,
-                    model=self.model
+                    model=self.model,
+                    hedge=HEDGE_VOICE_COMMANDS
                 )
                 
         except Exception as e:
@@ -198,7 +269,6 @@ class GeneralAgent:
         try:
             import google.generativeai as genai
             genai.configure(api_key=api_key)
-            model = genai.GenerativeModel(self.model)
             
             # Construct Chat History
             # We insert the System Prompt into the very first turn to ensure persistence
@@ -212,11 +282,6 @@ class GeneralAgent:
             # or use system_instruction if supported (Gemini 1.5 supports it nicely)
             # Let's try system_instruction first, it's cleaner.
             
-            model = genai.GenerativeModel(
-                model_name=self.model,
-                system_instruction=self.system_prompt
-            )
-            
             # Convert roles
             for h in history:
                 role = "user" if h["role"] == "user" else "model"
@@ -225,13 +290,21 @@ class GeneralAgent:
             
             # Start Chat
             # Use history[:-1] as past, and last msg as new input
+            # Cheap model first; orders, bookings and garbled action blocks are answered by the configured model
             if chat_history:
                 last_msg = chat_history[-1]
                 past_history = chat_history[:-1]
                 
-                chat = model.start_chat(history=past_history)
-                response = chat.send_message(last_msg["parts"][0])
-                return response.text
+                def send(model_name):
+                    chat = CASCADE.model(model_name, system_instruction=self.system_prompt).start_chat(history=past_history)
+                    return chat.send_message_async(last_msg["parts"][0])
+
+                text, _ = await CASCADE.run(
+                    send, _judge_reply, api_key=api_key, priority=INTERACTIVE, persona="general",
+                    tiers=CASCADE.ending_with(self.model), name="send_message",
+                    prompt_chars=sum(len(str(p)) for h in chat_history for p in h["parts"]),
+                )
+                return text
             else:
                 return "Hello! How can I help?"
                 
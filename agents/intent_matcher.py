@@ -0,0 +1,206 @@
+import os
+import re
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Matches at or above this confidence skip the LLM entirely
+INTENT_CONFIDENCE = float(os.getenv("INTENT_CONFIDENCE", "0.85"))
+
+# Spoken/alternate names that don't fall out of APP_MAPPING keys
+EXTRA_ALIASES = {
+    "whats app": "WhatsApp",
+    "make my trip": "MakeMyTrip",
+    "mmt": "MakeMyTrip",
+    "booking": "Booking.com",
+    "pharm easy": "PharmEasy",
+    "apollo": "Apollo 24|7",
+    "apollo pharmacy": "Apollo 24|7",
+    "1mg": "Tata 1mg",
+    "one mg": "Tata 1mg",
+    "settings": "System",
+    "ola cabs": "Ola",
+}
+
+# Quick settings the System app can flip; value is how the instruction names it
+TOGGLES = {
+    "wifi": "Wi-Fi", "wi-fi": "Wi-Fi", "wi fi": "Wi-Fi",
+    "bluetooth": "Bluetooth",
+    "flashlight": "Flashlight", "torch": "Flashlight",
+    "airplane mode": "Airplane mode", "aeroplane mode": "Airplane mode", "flight mode": "Airplane mode",
+    "mobile data": "Mobile data", "data": "Mobile data",
+    "location": "Location", "gps": "Location",
+    "do not disturb": "Do Not Disturb", "dnd": "Do Not Disturb",
+}
+
+FOOD_APPS = ("Zomato", "Swiggy")
+RIDE_MODES = {"cab": "cab", "taxi": "cab", "car": "cab", "ride": "cab", "uber": "cab", "ola": "cab",
+              "auto": "auto", "rickshaw": "auto", "bike": "bike"}
+
+_FILLER = re.compile(
+    r"^(?:(?:hey|hi|hello|ok|okay)\s+(?:sanjeevani\s+)?)?"
+    r"(?:(?:please|kindly|can you|could you|would you|will you|i want to|i want you to|i'd like to|i would like to)\s+)*",
+    re.IGNORECASE,
+)
+
+
+def _normalize(text: str) -> str:
+    # Case is kept so place names and dishes come through as the user said them
+    text = re.sub(r"[.!?,;]+", " ", text)
+    text = re.sub(r"\s+", " ", text).strip()
+    text = _FILLER.sub("", text)
+    return re.sub(r"\s+please$", "", text, flags=re.IGNORECASE).strip()
+
+
+def _alternation(names) -> str:
+    # Longest first so "apollo pharmacy" wins over "apollo"
+    return "|".join(re.escape(n) for n in sorted(names, key=len, reverse=True))
+
+
+class IntentMatcher:
+    """
+    Grammar-based matcher for the commands people say most ("open WhatsApp", "turn on wifi",
+    "order fried rice from Zomato", "book a cab from X to Y"). Produces the same action JSON the
+    GeneralAgent system prompt asks Gemini for, plus a confidence score.
+    """
+
+    def __init__(self, app_mapping: Dict[str, str],
+                 resolver: Optional[Callable[[str], Optional[Tuple[str, str, float]]]] = None):
+        # Optional installed-app lookup (AppIndex.lookup) for "open <any app>"
+        self.resolver = resolver
+        self.aliases: Dict[str, str] = {}
+        for name in app_mapping:
+            self.aliases[name.lower()] = name
+            spaced = re.sub(r"[^a-z0-9]+", " ", name.lower()).strip()
+            self.aliases.setdefault(spaced, name)
+        for alias, name in EXTRA_ALIASES.items():
+            if name in app_mapping:
+                self.aliases.setdefault(alias, name)
+
+        apps = _alternation(self.aliases)
+        toggles = _alternation(TOGGLES)
+        food_apps = _alternation(a for a, n in self.aliases.items() if n in FOOD_APPS)
+        modes = _alternation(RIDE_MODES)
+
+        self.open_app = re.compile(
+            rf"^(?:open|launch|start|go to|show me)\s+(?:the\s+)?(?P<app>{apps})(?:\s+app)?(?P<rest>\s+.+)?$",
+            re.IGNORECASE,
+        )
+        self.toggle = re.compile(
+            rf"^(?:(?:turn|switch|put)\s+(?P<state1>on|off)\s+(?:the\s+)?(?P<setting1>{toggles})"
+            rf"|(?:turn|switch|put)\s+(?:the\s+)?(?P<setting2>{toggles})\s+(?P<state2>on|off)"
+            rf"|(?P<verb>enable|disable)\s+(?:the\s+)?(?P<setting3>{toggles}))$",
+            re.IGNORECASE,
+        )
+        self.food = re.compile(
+            rf"^(?P<verb>order|get me|get|search for|search|find|look for)\s+(?P<item>.+?)\s+(?:from|on|in|using)\s+(?P<app>{food_apps})$",
+            re.IGNORECASE,
+        )
+        self.open_any = re.compile(r"^(?:open|launch|start)\s+(?:the\s+)?(?P<app>.+?)(?:\s+app)?$", re.IGNORECASE)
+        self.ride = re.compile(
+            rf"^(?P<verb>book|get|call|find)\s+(?:me\s+)?(?:a\s+|an\s+)?(?P<mode>{modes})(?:\s+ride)?"
+            rf"\s+from\s+(?P<pickup>.+?)\s+to\s+(?P<drop>.+)$",
+            re.IGNORECASE,
+        )
+
+        self.matched = 0
+        self.missed = 0
+
+    def _app(self, spoken: str) -> str:
+        return self.aliases[spoken.strip().lower()]
+
+    def match(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"action", "confidence", "rule", "confirm"} or None. `confirm` is a question to ask
+        before an order or booking is executed.
+        """
+        result = self._match(_normalize(text))
+        if result:
+            self.matched += 1
+        else:
+            self.missed += 1
+        return result
+
+    def _match(self, text: str) -> Optional[Dict[str, Any]]:
+        m = self.toggle.match(text)
+        if m:
+            setting = TOGGLES[(m.group("setting1") or m.group("setting2") or m.group("setting3")).lower()]
+            state = (m.group("state1") or m.group("state2") or ("on" if m.group("verb").lower() == "enable" else "off")).lower()
+            return {
+                "rule": "toggle",
+                "confidence": 0.95,
+                "action": {"type": "execute", "domain": "general", "app": "System",
+                           "instruction": f"Turn {state} {setting}"},
+            }
+
+        m = self.food.match(text)
+        if m:
+            item = re.sub(r"^(?:some|a|an|the)\s+", "", m.group("item"), flags=re.IGNORECASE).strip()
+            app = self._app(m.group("app"))
+            # Only an explicit "order" places an order, and only after the user confirms
+            action = "order" if m.group("verb").lower() == "order" else "search"
+            return {
+                "rule": "food",
+                # Long "items" are usually whole sentences the grammar swallowed
+                "confidence": 0.9 if len(item.split()) <= 4 else 0.6,
+                "action": {"type": "execute", "domain": "food", "item": item, "action": action,
+                           "app_preference": app},
+                "confirm": f"Shall I place an order for {item} on {app}?" if action == "order" else None,
+            }
+
+        m = self.ride.match(text)
+        if m:
+            pickup, drop = m.group("pickup").strip(), m.group("drop").strip()
+            short = len(pickup.split()) <= 5 and len(drop.split()) <= 5
+            mode = RIDE_MODES[m.group("mode").lower()]
+            # "find/get me a cab" compares fares; "book/call a cab" books, after the user confirms
+            action = "book" if m.group("verb").lower() in ("book", "call") else "compare"
+            return {
+                "rule": "ride",
+                "confidence": 0.9 if short else 0.6,
+                "action": {"type": "execute", "domain": "ride", "pickup": pickup, "drop": drop,
+                           "mode": mode, "action": action},
+                "confirm": f"Shall I book the cheapest {mode} from {pickup} to {drop}?" if action == "book" else None,
+            }
+
+        m = self.open_app.match(text)
+        if m:
+            app = self._app(m.group("app"))
+            rest = (m.group("rest") or "").strip()
+            if not rest:
+                return {
+                    "rule": "open_app",
+                    "confidence": 0.95,
+                    "action": {"type": "execute", "domain": "general", "app": app, "instruction": f"Open {app}"},
+                }
+            # "open WhatsApp and message Ravi" - app is certain, the rest needs the LLM to be sure
+            return {
+                "rule": "open_app_with_task",
+                "confidence": 0.7,
+                "action": {"type": "execute", "domain": "general", "app": app, "instruction": text},
+            }
+
+        m = self.open_any.match(text) if self.resolver else None
+        if m:
+            found = self.resolver(m.group("app"))
+            if found:
+                _, label, score = found
+                return {
+                    "rule": "open_installed_app",
+                    # Exact label/alias as sure as a known app, fuzzy ones scale with the match
+                    "confidence": 0.9 if score >= 1.0 else round(0.9 * score, 2),
+                    "action": {"type": "execute", "domain": "general", "app": label, "instruction": f"Open {label}"},
+                }
+
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.matched + self.missed
+        return {
+            "matched": self.matched,
+            "missed": self.missed,
+            "match_rate": round(self.matched / total, 3) if total else 0.0,
+            "threshold": INTENT_CONFIDENCE,
+        }
@@ -0,0 +1,254 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import os
+import random
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from dotenv import load_dotenv
+
+from agents.tracing import span
+
+load_dotenv()
+
+# Requests per minute allowed per (API key, model), and how many may go out back to back
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "30"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "5"))
+# Retries after the first attempt for 429 / 5xx / timeouts
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+# Exponential backoff (seconds) when the server gives no retry hint: full jitter in [0, min(max, base * 2^n)]
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1"))
+GEMINI_BACKOFF_MAX = float(os.getenv("GEMINI_BACKOFF_MAX", "30"))
+
+# Lower value = served first when callers are queued on the same bucket
+INTERACTIVE = 0  # /api/chat turns, someone is waiting on the answer
+TASK = 1         # planner calls inside a running task
+BATCH = 2        # background generation (itineraries etc.)
+
+T = TypeVar("T")
+
+# Transient failures: google.api_core exception classes and the HTTP statuses they stand for
+_RETRYABLE_TYPES = {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+                    "DeadlineExceeded", "GatewayTimeout"}
+_RETRYABLE_CODES = {429, 500, 503, 504}
+# "Please retry in 12.5s" / retry_delay { seconds: 12 } / Retry-After: 12
+_HINT_PATTERNS = [
+    re.compile(r"retry in ([\d.]+)\s*s", re.IGNORECASE),
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)", re.IGNORECASE),
+    re.compile(r"retry-after:?\s*([\d.]+)", re.IGNORECASE),
+]
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an API error (`code` on google.api_core errors, `status_code` on HTTP client errors)."""
+    for holder in (error, getattr(error, "response", None)):
+        for attr in ("code", "status_code"):
+            code = getattr(holder, attr, None)
+            if isinstance(code, int):
+                return int(code)
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    if any(cls.__name__ in _RETRYABLE_TYPES for cls in type(error).__mro__):
+        return True
+    return _status_code(error) in _RETRYABLE_CODES
+
+
+def retry_hint(error: Exception) -> Optional[float]:
+    """Seconds the server asked us to wait, if it said so."""
+    retry_after = getattr(error, "retry_after", None)
+    if isinstance(retry_after, (int, float)):
+        return float(retry_after)
+    for pattern in _HINT_PATTERNS:
+        match = pattern.search(str(error))
+        if match:
+            return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """
+    Async token bucket. Waiters are served strictly by (priority, arrival), so a queued chat turn
+    goes ahead of queued batch work. pause() stops handing out tokens until a server-given deadline.
+    """
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self.order = itertools.count()
+        self.pump: Optional[asyncio.Task] = None
+
+    def _refill(self):
+        now = time.monotonic()
+        # No credit for time spent paused, or the bucket would burst right after the server's retry hint
+        since = max(self.updated, self.paused_until)
+        self.tokens = min(self.capacity, self.tokens + max(0.0, now - since) * self.rate)
+        self.updated = now
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self, priority: int = TASK) -> float:
+        """Waits for a token. Returns the seconds spent waiting."""
+        self._refill()
+        if not self.waiters and self.tokens >= 1 and time.monotonic() >= self.paused_until:
+            self.tokens -= 1
+            return 0.0
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.order), future))
+        if self.pump is None or self.pump.done():
+            self.pump = asyncio.create_task(self._pump())
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted just as we were cancelled: hand the token back
+            if future.done() and not future.cancelled():
+                self.tokens = min(self.capacity, self.tokens + 1)
+            raise
+        return time.monotonic() - started
+
+    async def _pump(self):
+        while self.waiters:
+            future = self.waiters[0][2]
+            if future.done():
+                heapq.heappop(self.waiters)
+                continue
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self._refill()
+            if self.tokens >= 1:
+                heapq.heappop(self.waiters)
+                self.tokens -= 1
+                future.set_result(None)
+                continue
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LLMLimiter:
+    """
+    One limiter for every Gemini call in the process. Each (API key, model) pair gets its own bucket,
+    since that is what Google's quota is counted against.
+    """
+
+    def __init__(self, rpm: float = GEMINI_RPM, burst: int = GEMINI_BURST, max_retries: int = GEMINI_MAX_RETRIES):
+        self.rpm = rpm
+        self.burst = burst
+        self.max_retries = max_retries
+        self.buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.counters: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def _key(self, api_key: Optional[str], model: str) -> Tuple[str, str]:
+        # Never keep the raw key around (it shows up in /router/stats)
+        digest = hashlib.sha1((api_key or "").encode()).hexdigest()[:8]
+        return digest, model.replace("models/", "")
+
+    def _bucket(self, key: Tuple[str, str]) -> TokenBucket:
+        if key not in self.buckets:
+            self.buckets[key] = TokenBucket(self.rpm / 60.0, self.burst)
+            self.counters[key] = {"calls": 0, "retries": 0, "failures": 0, "hinted_waits": 0,
+                                  "throttled": 0, "wait_seconds": 0.0}
+        return self.buckets[key]
+
+    async def acquire(self, api_key: Optional[str], model: str, priority: int = TASK) -> float:
+        """Takes one token from the (api_key, model) bucket, for calls whose client does its own retries."""
+        key = self._key(api_key, model)
+        waited = await self._bucket(key).acquire(priority)
+        counters = self.counters[key]
+        counters["calls"] += 1
+        if waited > 0:
+            counters["throttled"] += 1
+            counters["wait_seconds"] += waited
+        return waited
+
+    async def run(self, call: Callable[[], Awaitable[T]], api_key: Optional[str], model: str,
+                  priority: int = TASK, name: str = "generate_content", **attrs) -> T:
+        """
+        Runs `call` (a fresh coroutine per attempt) under the bucket for (api_key, model).
+        Retries rate-limit and server errors with jittered backoff, waiting at least as long as the server asks.
+        Raises the last error once retries run out.
+        """
+        key = self._key(api_key, model)
+        bucket = self._bucket(key)
+        counters = self.counters[key]
+        attempt = 0
+
+        while True:
+            await self.acquire(api_key, model, priority)
+            try:
+                with span(name, attempt=attempt, **attrs):
+                    return await call()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    counters["failures"] += 1
+                    raise
+
+                hint = retry_hint(e)
+                if hint is not None:
+                    counters["hinted_waits"] += 1
+                    # Everyone on this key/model backs off, not just us
+                    bucket.pause(hint)
+                    delay = hint + random.uniform(0, GEMINI_BACKOFF_BASE)
+                else:
+                    delay = random.uniform(0, min(GEMINI_BACKOFF_MAX, GEMINI_BACKOFF_BASE * 2 ** attempt))
+
+                attempt += 1
+                counters["retries"] += 1
+                print(f"[LLMLimiter] {key[1]} attempt {attempt} failed ({type(e).__name__}), "
+                      f"retrying in {delay:.1f}s{' (server hint)' if hint is not None else ''}")
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        out = {}
+        for (key_id, model), counters in self.counters.items():
+            bucket = self.buckets[(key_id, model)]
+            bucket._refill()
+            out[f"{key_id}/{model}"] = {
+                **{k: round(v, 2) if isinstance(v, float) else v for k, v in counters.items()},
+                "queued": sum(1 for _, _, f in bucket.waiters if not f.done()),
+                "tokens": round(bucket.tokens, 2),
+                "paused_for_seconds": round(max(0.0, bucket.paused_until - time.monotonic()), 1),
+            }
+        return {"rpm": self.rpm, "burst": self.burst, "buckets": out}
+
+
+LIMITER = LLMLimiter()
+
+# llama-index LLM coroutines DroidAgent calls; the sync variants are never used on the event loop
+_LLM_METHODS = ("achat", "acomplete", "astream_chat", "astream_complete")
+
+
+def limited_llm(llm: Any, api_key: Optional[str], model: str, priority: int = TASK) -> Any:
+    """
+    Puts an LLM from droidrun's load_llm() behind LIMITER: each of its async calls first takes a token
+    from the same (api_key, model) bucket as our own Gemini calls. Retries stay with the llama-index client.
+    The object itself is returned (patched per instance), so DroidAgent's type checks still see a real LLM.
+    """
+    for method in _LLM_METHODS:
+        original = getattr(llm, method, None)
+        if original is None:
+            continue
+
+        async def gated(*args, _original=original, **kwargs):
+            await LIMITER.acquire(api_key, model, priority)
+            return await _original(*args, **kwargs)
+
+        # LLMs are pydantic models that reject unknown attributes through setattr
+        object.__setattr__(llm, method, gated)
+    return llm
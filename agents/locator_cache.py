@@ -0,0 +1,160 @@
+import json
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+from agents.adb_utils import adb_shell
+from agents.ui_tree import UINode
+
+LOCATOR_CACHE_PATH = os.path.expanduser(os.getenv("LOCATOR_CACHE_PATH", "~/.cache/bugslayers/locators.json"))
+# Bounds-only matches must land within this many pixels of the learned centre
+BOUNDS_TOLERANCE = 40
+
+_QUOTED = re.compile(r"'([^']*)'|\"([^\"]*)\"")
+
+
+def goal_signature(goal: str) -> str:
+    """'Search for 'Fries' on Zomato' and 'Search for 'Pizza' on Zomato' share one trajectory."""
+    sig = _QUOTED.sub("<q>", goal.lower())
+    return re.sub(r"\d+", "#", re.sub(r"\s+", " ", sig)).strip()
+
+
+def goal_values(goal: str) -> List[str]:
+    return [a or b for a, b in _QUOTED.findall(goal)]
+
+
+class LocatorCache:
+    """
+    Per (package, app version) map of semantic target ("search field", "add to cart") -> how the element
+    was found last time (resource-id, label, class, bounds). Lookups are always checked against the live
+    hierarchy; a locator that no longer matches counts as stale and the caller asks the LLM instead.
+
+    Also keeps, per (package, goal signature), the list of steps that completed the mission last time,
+    so a repeat of the same kind of mission can walk the cached targets without planning each step.
+    """
+
+    def __init__(self, path: str = LOCATOR_CACHE_PATH):
+        self.path = path
+        self.locators: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.trajectories: Dict[str, List[Dict[str, Any]]] = {}
+        self.versions: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self.locators = data.get("locators", {})
+            self.trajectories = data.get("trajectories", {})
+        except (OSError, ValueError):
+            pass
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"locators": self.locators, "trajectories": self.trajectories}, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[LocatorCache] Could not save: {e}")
+
+    async def app_version(self, package: str, serial: Optional[str] = None) -> str:
+        if package not in self.versions:
+            try:
+                out = await adb_shell(f"dumpsys package {package} | grep versionName", serial=serial, timeout=5)
+                m = re.search(r"versionName=(\S+)", out)
+                self.versions[package] = m.group(1) if m else "unknown"
+            except Exception:
+                self.versions[package] = "unknown"
+        return self.versions[package]
+
+    @staticmethod
+    def _app_key(package: str, version: str) -> str:
+        return f"{package}@{version}"
+
+    def learn(self, package: str, version: str, target: str, node: UINode):
+        if not target:
+            return
+        entry = self.locators.setdefault(self._app_key(package, version), {})
+        previous = entry.get(target.lower(), {})
+        entry[target.lower()] = {
+            "resource_id": node.resource_id,
+            "label": node.label,
+            "cls": node.cls,
+            "bounds": node.bounds,
+            "uses": previous.get("uses", 0) + 1,
+            "learned_at": int(time.time()),
+        }
+
+    def resolve(self, package: str, version: str, target: str, nodes: List[UINode]) -> Optional[UINode]:
+        """Live node for `target`, or None (not cached, or the cached locator matches nothing on screen)."""
+        locator = self.locators.get(self._app_key(package, version), {}).get((target or "").lower())
+        if not locator:
+            self.misses += 1
+            return None
+
+        node = self._match(locator, nodes)
+        if node is None:
+            self.stale += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return node
+
+    @staticmethod
+    def _match(locator: Dict[str, Any], nodes: List[UINode]) -> Optional[UINode]:
+        rid, label = locator.get("resource_id"), locator.get("label")
+        if rid:
+            by_id = [n for n in nodes if n.resource_id == rid]
+            if len(by_id) == 1:
+                return by_id[0]
+            # Repeated ids (list rows): the label decides
+            for n in by_id:
+                if label and n.label == label:
+                    return n
+        if label:
+            for n in nodes:
+                if n.label == label and n.cls == locator.get("cls"):
+                    return n
+        if not rid and not label and locator.get("bounds"):
+            x1, y1, x2, y2 = locator["bounds"]
+            cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+            for n in nodes:
+                nx, ny = n.center()
+                if n.cls == locator.get("cls") and abs(nx - cx) <= BOUNDS_TOLERANCE and abs(ny - cy) <= BOUNDS_TOLERANCE:
+                    return n
+        return None
+
+    def trajectory(self, package: str, goal: str) -> List[Dict[str, Any]]:
+        return self.trajectories.get(f"{package}|{goal_signature(goal)}", [])
+
+    def remember_trajectory(self, package: str, goal: str, steps: List[Dict[str, Any]]):
+        """Stores the steps of a successful mission; typed goal values are kept as {q0}, {q1}... placeholders."""
+        values = goal_values(goal)
+        stored = []
+        for step in steps:
+            step = dict(step)
+            if step.get("text") in values:
+                step["text"] = "{q%d}" % values.index(step["text"])
+            stored.append(step)
+        self.trajectories[f"{package}|{goal_signature(goal)}"] = stored
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "apps": len(self.locators),
+            "locators": sum(len(v) for v in self.locators.values()),
+            "trajectories": len(self.trajectories),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+LOCATORS = LocatorCache()
@@ -7,17 +7,6 @@ from dotenv import load_dotenv
 # Load env to get keys
 load_dotenv()
 
-# --- MobileRun SDK ---
-try:
-    from mobilerun import MobileRunClient
-except ImportError:
-    try:
-        from mobile_use import MobileRunClient
-    except ImportError:
-        # If sdk not installed, we will rely 100% on fallback
-        MobileRunClient = None
-        print("[MobileRun] SDK not found. Will default to DroidRun.")
-
 # --- DroidRun Imports (for Fallback) ---
 try:
     from droidrun.agent.droid import DroidAgent
@@ -27,36 +16,19 @@ except ImportError:
     print("CRITICAL ERROR: 'droidrun' library not found.")
     sys.exit(1)
 
+from agents.backend_router import ROUTER, skipped
+from agents.device_registry import APP_MAPPING, DEVICES
+from agents.droid_runner import run_droid_agent
+from agents.llm_limiter import limited_llm
+from agents.tracing import span
+from agents.cloud_client import BREAKER, get_client, run_cloud_job
+
 class MobileRunWrapper:
     """
     Unified client for MobileRun Cloud with DroidRun Local Fallback.
     """
     
-    APP_MAPPING = {
-        # Transit
-        "Uber": "com.ubercab",
-        "MakeMyTrip": "com.makemytrip",
-        
-        # Stay
-        "Booking.com": "com.booking",
-        
-        # Commerce
-        "Amazon": "com.amazon.mShop.android.shopping",
-        "Flipkart": "com.flipkart.android",
-        "Zomato": "com.application.zomato",
-        "Swiggy": "in.swiggy.android", # Check exact ID, usually this or bundl
-        
-        # Social
-        "WhatsApp": "com.whatsapp",
-        
-        # Pharmacy
-        "PharmEasy": "com.pharmeasy.app",
-        "Apollo 24|7": "com.apollo.patientapp",
-        "Tata 1mg": "com.aranoah.healthkart.plus",
-        
-        # Ride
-        "Ola": "com.olacabs.customer"
-    }
+    APP_MAPPING = APP_MAPPING
 
     def __init__(self, provider="gemini", model="models/gemini-2.5-flash"):
         self.provider = provider
@@ -65,58 +37,60 @@ class MobileRunWrapper:
         self.mobilerun_key = os.getenv("MOBILERUN_API_KEY")
         self.gemini_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         
-        self.client = None
-        if self.mobilerun_key and MobileRunClient:
-            try:
-                self.client = MobileRunClient(api_key=self.mobilerun_key)
-                print("[Init] MobileRun Client Ready ☁️")
-            except Exception as e:
-                print(f"[Init] MobileRun Client Failed: {e}. using Local DroidRun.")
-        else:
+        # One client per process; wrappers share its connections
+        self.client = get_client()
+        if not self.client:
             print("[Init] MobileRun Key missing or SDK absent. Using Local DroidRun.")
 
-    async def run_agent(self, app_name: str, goal: str) -> dict:
+    async def run_agent(self, app_name: str, goal: str, hedge: bool = False) -> dict:
         """
         Attempts to run via MobileRun. Falls back to DroidRun on failure.
+        hedge: if the cloud job is slow, start DroidRun in parallel and keep the first success.
         """
         app_id = self.APP_MAPPING.get(app_name)
+
+        async def execute(backend):
+            if backend == "cloud":
+                return await self._run_cloud(app_name, app_id, goal)
+            return await self._run_local_droid(goal)
+
+        use_cloud = self.client and app_id and BREAKER.available()
+
+        if use_cloud and hedge:
+            result = await ROUTER.run_hedged("cloud", "local", execute)
+            return result if result and not skipped(result) else {"status": "failed", "error": "Cloud and local execution both failed"}
         
         # --- 1. MobileRun Execution ---
-        if self.client and app_id:
-            try:
-                print(f"[MobileRun] ☁️ Submitting Job for {app_name} ({app_id})...")
-                job = await self.client.submit_job(
-                    app_id=app_id,
-                    instruction=goal,
-                    device="pixel_8_pro",
-                    session_id=f"session_{os.getpid()}",
-                    stream=True
-                )
-                
-                print("[MobileRun] Waiting for result...")
-                result = await job.result()
-                
-                if result.status == "COMPLETED":
-                    print("[MobileRun] ✅ Success!")
-                    # Handle Output format (assume Cloud returns parseable Text or JSON)
-                    return self._parse_output(result.output)
-                else:
-                    print(f"[MobileRun] ❌ Job Failed: {result.status}")
-                    # Fallthrough to backup
-            except Exception as e:
-                print(f"[MobileRun] ⚠️ Error: {e}")
-                # Fallthrough to backup
+        if use_cloud:
+            result = await ROUTER.run("cloud", execute)
+            if result is not None and not skipped(result):
+                return result
         
         # --- 2. DroidRun Logic (Fallback) ---
+        if await DEVICES.is_installed(app_name) is False:
+            DEVICES.skip(app_name)
+            return {"status": "failed", "error": f"{app_name} is not installed on the device"}
         print(f"[Fallback] 📱 Switching to Local DroidRun for {app_name}...")
-        return await self._run_local_droid(goal)
+        return await ROUTER.run("local", execute)
+
+    async def _run_cloud(self, app_name: str, app_id: str, goal: str):
+        """Returns the parsed cloud output, or None if the job didn't complete."""
+        print(f"[MobileRun] ☁️ Submitting Job for {app_name} ({app_id})...")
+        output = await run_cloud_job(app_id, goal, session_id=f"session_{os.getpid()}")
+        if output is None or skipped(output):
+            return output
+        print("[MobileRun] ✅ Success!")
+        # Handle Output format (assume Cloud returns parseable Text or JSON)
+        return self._parse_output(output)
 
     async def _run_local_droid(self, goal: str) -> dict:
         """
         Internal: Executes using DroidRun Local Agent
         """
         provider_name = "GoogleGenAI" if self.provider == "gemini" else self.provider
-        llm = load_llm(provider_name=provider_name, model=self.model, api_key=self.gemini_key)
+        with span("load_llm"):
+            llm = limited_llm(load_llm(provider_name=provider_name, model=self.model, api_key=self.gemini_key),
+                              self.gemini_key, self.model)
         
         manager_config = ManagerConfig(vision=True)
         executor_config = ExecutorConfig(vision=True)
@@ -128,7 +102,7 @@ class MobileRunWrapper:
         
         try:
             print(f"      [DroidRun] 🧠 Analyzing...")
-            result = await agent.run()
+            result = await run_droid_agent(agent, "DroidRun")
             
             # Robust Parsing from original logic
             raw_text = str(result.reason) if hasattr(result, 'reason') else str(result)
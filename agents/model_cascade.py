@@ -0,0 +1,176 @@
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from agents.llm_limiter import LIMITER, TASK
+from agents.tracing import TASK_TRACE
+
+load_dotenv()
+
+# Try the first model, escalate along the list. False = always use the last (strongest) one
+MODEL_CASCADE = os.getenv("MODEL_CASCADE", "True").lower() == "true"
+CASCADE_MODELS = [m.strip() for m in os.getenv("CASCADE_MODELS", "gemini-2.0-flash-lite,gemini-2.5-flash").split(",")
+                  if m.strip()]
+# Self-reported confidence below this sends the step to the next model
+CASCADE_MIN_CONFIDENCE = float(os.getenv("CASCADE_MIN_CONFIDENCE", "0.6"))
+
+# USD per 1M tokens (input, output), list prices for text/image input up to 128k/200k context
+MODEL_PRICES = {
+    "gemini-1.5-flash": (0.075, 0.30),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-exp": (0.10, 0.40),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+# judge(response) -> (parsed value, None) to accept, or (value or None, reason) to escalate
+Judge = Callable[[Any], Tuple[Any, Optional[str]]]
+
+
+def _model_id(model: str) -> str:
+    return model.replace("models/", "")
+
+
+def usage(response: Any, prompt_chars: int = 0) -> Tuple[int, int]:
+    """(input, output) tokens from the response metadata, or a chars/4 estimate when there is none."""
+    meta = getattr(response, "usage_metadata", None)
+    tokens_in = getattr(meta, "prompt_token_count", None) if meta else None
+    tokens_out = getattr(meta, "candidates_token_count", None) if meta else None
+    if tokens_in is None:
+        tokens_in = prompt_chars // 4
+    if tokens_out is None:
+        try:
+            tokens_out = len(response.text) // 4 if response is not None else 0
+        except Exception:
+            tokens_out = 0
+    return int(tokens_in), int(tokens_out)
+
+
+def cost(model: str, tokens_in: int, tokens_out: int) -> float:
+    price_in, price_out = MODEL_PRICES.get(_model_id(model), MODEL_PRICES["gemini-2.5-flash"])
+    return (tokens_in * price_in + tokens_out * price_out) / 1_000_000
+
+
+class ModelCascade:
+    """
+    Cheap-model-first LLM calls. Each call starts on the first model in `tiers` (or a later one when the
+    caller already knows the step is hard) and moves up a tier when the judge rejects the answer:
+    unparseable output, low self-reported confidence, or an API error. The strongest model's answer is
+    final. Every step records which model answered, tokens, cost and latency, aggregated per persona
+    next to what the strongest model alone would have cost.
+    """
+
+    def __init__(self, tiers: Optional[List[str]] = None):
+        self.tiers = tiers or CASCADE_MODELS
+        self._models: Dict[str, Any] = {}
+        self.personas: Dict[str, Dict[str, Any]] = {}
+
+    def ending_with(self, model: str) -> List[str]:
+        """The cheap tiers, then `model` as the final one (for callers configured with a specific model)."""
+        model = _model_id(model)
+        return [m for m in self.tiers[:-1] if _model_id(m) != model] + [model]
+
+    def model(self, name: str, **kwargs):
+        """Cached genai.GenerativeModel per (name, kwargs)."""
+        import google.generativeai as genai
+        key = (name, tuple(sorted(kwargs.items())))
+        if key not in self._models:
+            self._models[key] = genai.GenerativeModel(name, **kwargs)
+        return self._models[key]
+
+    async def run(self, call: Callable[[str], Awaitable[Any]], judge: Judge, api_key: Optional[str],
+                  priority: int = TASK, persona: str = "", start_tier: int = 0, start_reason: str = "",
+                  prompt_chars: int = 0, tiers: Optional[List[str]] = None, **attrs) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Returns (accepted value, step record). `call(model_name)` makes one request.
+        Raises when the strongest model errors or its answer can't be parsed at all.
+        """
+        tiers = tiers or self.tiers
+        tiers = tiers if MODEL_CASCADE else tiers[-1:]
+        first = min(start_tier, len(tiers) - 1) if MODEL_CASCADE else 0
+        attempts: List[Dict[str, Any]] = []
+        value, error = None, None
+
+        for tier in range(first, len(tiers)):
+            model = tiers[tier]
+            started = time.perf_counter()
+            response = None
+            try:
+                response = await LIMITER.run(lambda: call(model), api_key=api_key, model=model, priority=priority,
+                                             tier=tier, **attrs)
+                value, reason = judge(response)
+                error = None
+            except Exception as e:
+                value, reason, error = None, "error", e
+            tokens_in, tokens_out = usage(response, prompt_chars)
+            attempts.append({
+                "model": _model_id(model),
+                "latency_s": round(time.perf_counter() - started, 3),
+                "tokens_in": tokens_in,
+                "tokens_out": tokens_out,
+                "cost_usd": cost(model, tokens_in, tokens_out),
+                "reason": reason,
+            })
+            if reason is None:
+                break
+            if tier + 1 < len(tiers):
+                print(f"[Cascade] {_model_id(model)}: {reason}, escalating to {_model_id(tiers[tier + 1])}")
+
+        record = {
+            "model": attempts[-1]["model"],
+            "tiers_tried": [a["model"] for a in attempts],
+            "escalations": ([start_reason] if first and start_reason else []) + [a["reason"] for a in attempts[:-1]],
+            "cost_usd": round(sum(a["cost_usd"] for a in attempts), 6),
+            "latency_s": round(sum(a["latency_s"] for a in attempts), 3),
+        }
+        self._account(persona, attempts, record, tiers[-1])
+
+        if error is not None:
+            raise error
+        if value is None:
+            raise ValueError(f"{record['model']} returned no usable answer")
+        return value, record
+
+    def _account(self, persona: str, attempts: List[Dict[str, Any]], record: Dict[str, Any], strongest: str):
+        trace = TASK_TRACE.get()
+        persona = (trace["persona"] if trace else "") or persona or "unknown"
+        p = self.personas.setdefault(persona, {"steps": 0, "by_model": {}, "escalations": {}, "cost_usd": 0.0,
+                                               "strongest_only_cost_usd": 0.0, "latency_s": 0.0,
+                                               "latency_by_model": {}})
+        p["steps"] += 1
+        p["by_model"][record["model"]] = p["by_model"].get(record["model"], 0) + 1
+        for reason in record["escalations"]:
+            p["escalations"][reason] = p["escalations"].get(reason, 0) + 1
+        p["cost_usd"] += record["cost_usd"]
+        p["latency_s"] += record["latency_s"]
+        # Same tokens priced on the strongest tier: what this step would have cost without the cascade
+        last = attempts[-1]
+        p["strongest_only_cost_usd"] += cost(strongest, last["tokens_in"], last["tokens_out"])
+        for a in attempts:
+            seen = p["latency_by_model"].setdefault(a["model"], [0, 0.0])
+            seen[0] += 1
+            seen[1] += a["latency_s"]
+
+    def stats(self) -> Dict[str, Any]:
+        personas = {}
+        for name, p in self.personas.items():
+            saved = p["strongest_only_cost_usd"] - p["cost_usd"]
+            personas[name] = {
+                "steps": p["steps"],
+                "by_model": p["by_model"],
+                "escalations": p["escalations"],
+                "cost_usd": round(p["cost_usd"], 6),
+                "strongest_only_cost_usd": round(p["strongest_only_cost_usd"], 6),
+                "cost_saved_usd": round(saved, 6),
+                "avg_step_latency_s": round(p["latency_s"] / p["steps"], 3) if p["steps"] else 0.0,
+                "avg_latency_by_model_s": {m: round(total / n, 3) for m, (n, total) in p["latency_by_model"].items()},
+            }
+        return {"enabled": MODEL_CASCADE, "tiers": self.tiers, "min_confidence": CASCADE_MIN_CONFIDENCE,
+                "personas": personas}
+
+
+CASCADE = ModelCascade()
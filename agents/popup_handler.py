@@ -0,0 +1,138 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from agents.adb_utils import adb_shell
+from agents.tracing import span
+from agents.ui_tree import UINode, dump_ui, overlay_bounds, parse_nodes, screen_package
+
+# Check the screen between NeuroOrchestrator steps and dismiss known interstitials
+POPUP_WATCH = os.getenv("POPUP_WATCH", "True").lower() == "true"
+# DroidAgent runs too, but only right after the agent launched an app: each check is a full uiautomator dump
+# that competes with DroidRun's own accessibility service for the UI tree
+POPUP_AGENT_CHECK = os.getenv("POPUP_AGENT_CHECK", "False").lower() == "true"
+# Dismissals in a row before the screen goes to the planner anyway (a popup that keeps coming back)
+POPUP_MAX_IN_A_ROW = int(os.getenv("POPUP_MAX_IN_A_ROW", "3"))
+
+PERMISSION_PACKAGES = ("com.google.android.permissioncontroller", "com.android.permissioncontroller",
+                       "com.android.packageinstaller", "com.google.android.packageinstaller")
+# Most permissive answer that still doesn't grant background access, in order of preference
+PERMISSION_BUTTONS = ("permission_allow_foreground_only_button", "permission_allow_button",
+                      "permission_allow_one_time_button")
+
+# Buttons that only ever mean "go away". Matched as the whole label, case-insensitive, and only inside a
+# dialog/overlay: bare "close"/"x"/"later"/"cancel" are too often real controls to be tapped anywhere.
+DISMISS_LABELS = ("skip", "not now", "no thanks", "no, thanks", "maybe later", "remind me later",
+                  "dismiss", "cancel update", "got it")
+# Close icons usually have no text, only an id or description
+CLOSE_ID = re.compile(r"(close|dismiss|cross)(_?(btn|button|icon|iv|img))?$|^(iv|btn|img)_?(close|cross)", re.IGNORECASE)
+# SearchView's clear-query button and friends look like close icons but edit what the agent typed
+NOT_CLOSE_ID = re.compile(r"search|clear|query", re.IGNORECASE)
+
+# Per-app overlays that the generic rules don't catch: package -> labels/ids to tap
+APP_RULES = {
+    "com.makemytrip": {"labels": ("skip", "not now"), "ids": ("ivCross", "iv_cross", "close_btn")},
+    "com.application.zomato": {"labels": ("skip", "not now", "maybe later")},
+    "in.swiggy.android": {"labels": ("skip", "not now", "got it")},
+    "com.ubercab": {"labels": ("not now", "skip", "got it")},
+    "com.olacabs.customer": {"labels": ("skip", "not now", "later")},
+    "com.booking": {"labels": ("not now", "maybe later")},
+}
+
+# Screens where a "close"-looking control may be real UI, not an overlay
+PROTECTED = re.compile(r"\b(place order|pay|confirm|book|delete|remove|uninstall)\b", re.IGNORECASE)
+
+
+class PopupHandler:
+    """
+    Dismisses permission dialogs, update/rating prompts and promo overlays by matching the UI hierarchy,
+    so agents don't spend vision LLM steps on them. Every dismissal is counted as at least one LLM step saved.
+    Generic dismiss/close rules only look inside a dialog window or overlay container (see overlay_bounds).
+    """
+
+    def __init__(self):
+        self.dismissed: Dict[str, int] = {}
+        self.by_app: Dict[str, int] = {}
+        self.checks = 0
+
+    def match(self, nodes: List[UINode], package: Optional[str],
+              overlay: Optional[List[int]] = None) -> Optional[Tuple[str, UINode]]:
+        clickable = [n for n in nodes if n.clickable]
+        package = package or ""
+
+        if package in PERMISSION_PACKAGES:
+            for wanted in PERMISSION_BUTTONS:
+                for n in clickable:
+                    if n.resource_id.endswith(f"/{wanted}"):
+                        return "permission", n
+            for n in clickable:
+                if n.label.lower() in ("allow", "while using the app", "only this time"):
+                    return "permission", n
+            return None
+
+        rules = APP_RULES.get(package, {})
+        for n in clickable:
+            rid = n.resource_id.split("/")[-1]
+            if rid and rid in rules.get("ids", ()):
+                return f"app:{package}", n
+            if n.label.lower() in rules.get("labels", ()):
+                return f"app:{package}", n
+
+        # Generic rules only for a dialog/overlay, and not when it looks like a checkout/confirmation step
+        if overlay is None:
+            return None
+        x1, y1, x2, y2 = overlay
+        inside = [n for n in clickable
+                  if n.bounds[0] >= x1 and n.bounds[1] >= y1 and n.bounds[2] <= x2 and n.bounds[3] <= y2]
+        if any(PROTECTED.search(n.label) for n in inside):
+            return None
+        for n in inside:
+            if n.label.strip().lower() in DISMISS_LABELS:
+                return "dismiss_button", n
+        for n in inside:
+            rid = n.resource_id.split("/")[-1]
+            if n.text or NOT_CLOSE_ID.search(rid):
+                continue
+            if CLOSE_ID.search(rid) or n.desc.lower() in ("close", "dismiss", "close dialog"):
+                return "close_icon", n
+        return None
+
+    async def check(self, serial: Optional[str] = None, nodes: Optional[List[UINode]] = None,
+                    package: Optional[str] = None, overlay: Optional[List[int]] = None) -> Optional[str]:
+        """Dismisses one interstitial if the screen shows one. Returns the rule that fired, or None."""
+        self.checks += 1
+        if nodes is None:
+            xml = await dump_ui(serial)
+            if not xml:
+                return None
+            nodes = parse_nodes(xml)
+            package = screen_package(xml)
+            overlay = overlay_bounds(xml)
+
+        found = self.match(nodes, package, overlay)
+        if not found:
+            return None
+
+        rule, node = found
+        x, y = node.center()
+        with span("popup_dismiss", app=package or "", rule=rule):
+            await adb_shell("input", "tap", str(x), str(y), serial=serial, timeout=5)
+        self.dismissed[rule] = self.dismissed.get(rule, 0) + 1
+        self.by_app[package or "unknown"] = self.by_app.get(package or "unknown", 0) + 1
+        print(f"🧹 [Popup] Dismissed {rule} via '{node.label or node.resource_id}'")
+        return rule
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self.dismissed.values())
+        return {
+            "enabled": POPUP_WATCH,
+            "agent_checks": POPUP_AGENT_CHECK,
+            "checks": self.checks,
+            "dismissed": total,
+            "by_rule": self.dismissed,
+            "by_app": self.by_app,
+            "llm_steps_saved": total,
+        }
+
+
+POPUPS = PopupHandler()
@@ -14,8 +14,14 @@ except ImportError:
     print("CRITICAL ERROR: 'droidrun' library not found.")
     sys.exit(1)
 
+from agents.droid_runner import run_droid_agent
+from agents.llm_limiter import LIMITER, BATCH, limited_llm
+from agents.tracing import span
 from schemas import HotelDetails, ItineraryDay, ItineraryActivity, FullTripPlan
 
+# Trips longer than this are generated one day per request, in parallel
+PARALLEL_DAY_THRESHOLD = int(os.getenv("ITINERARY_PARALLEL_DAYS", "4"))
+
 class StayManager:
     def __init__(self, provider="gemini", model="models/gemini-2.5-flash"):
         self.provider = provider
@@ -27,7 +33,9 @@ class StayManager:
     async def _run_agent(self, goal: str) -> dict:
         """Helper to run DroidAgent for Hotel Search."""
         provider_name = "GoogleGenAI" if self.provider == "gemini" else self.provider
-        llm = load_llm(provider_name=provider_name, model=self.model, api_key=self.api_key)
+        with span("load_llm"):
+            llm = limited_llm(load_llm(provider_name=provider_name, model=self.model, api_key=self.api_key),
+                              self.api_key, self.model)
         
         tools = await AdbTools.create()
 
@@ -43,7 +51,7 @@ class StayManager:
         
         try:
             print(f"      🧠 StayAgent Analyzing...")
-            result = await agent.run()
+            result = await run_droid_agent(agent, "StayAgent")
             
             # Robust Parsing
             raw_text = str(result.reason) if hasattr(result, 'reason') else str(result)
@@ -75,16 +83,15 @@ class StayManager:
         
         goal = (
             f"1. Open 'MakeMyTrip'. "
-            f"2. Handle any Ads/Popups if they appear. "
-            f"3. Click on 'Hotels'. "
-            f"4. Enter Location/City: '{city}'. "
-            f"5. Select Check-in Date: '{check_in_date}'. "
-            f"6. Click the central 'SEARCH' button. "
-            f"7. Wait 10 seconds for the hotel list. "
-            f"8. **SCROLL DOWN** slightly to see hotel cards. "
-            f"9. Identify the FIRST hotel card in the list. "
-            f"10. Extract directly from card: Hotel Name, Location/Address, Price Per Night. "
-            f"11. Return strict JSON: {{'name': '...', 'address': '...', 'price_per_night': '...'}}."
+            f"2. Click on 'Hotels'. "
+            f"3. Enter Location/City: '{city}'. "
+            f"4. Select Check-in Date: '{check_in_date}'. "
+            f"5. Click the central 'SEARCH' button. "
+            f"6. Wait 10 seconds for the hotel list. "
+            f"7. **SCROLL DOWN** slightly to see hotel cards. "
+            f"8. Identify the FIRST hotel card in the list. "
+            f"9. Extract directly from card: Hotel Name, Location/Address, Price Per Night. "
+            f"10. Return strict JSON: {{'name': '...', 'address': '...', 'price_per_night': '...'}}."
         )
         
         result = await self._run_agent(goal)
@@ -100,36 +107,56 @@ class StayManager:
             print(f"Error parsing hotel details: {e}")
             raise e
 
-    async def generate_itinerary(self, hotel_location: str, user_interests: str, days: int = 3) -> list[ItineraryDay]:
+    async def generate_itinerary(self, hotel_location: str, user_interests: str, days: int = 3, on_day=None) -> list[ItineraryDay]:
+        """
+        Streams the itinerary from Gemini and hands every completed day to `on_day` as soon as it parses.
+        Long trips (more than PARALLEL_DAY_THRESHOLD days) are generated one day per request, concurrently.
+        """
         print(f"🗺️ Generating Itinerary for {days} days based on interests: {user_interests}")
-        
-        prompt = (
-            f"Create a {days}-day travel itinerary for a trip staying at {hotel_location}. "
-            f"User Interests: {user_interests}. "
-            f"Strict Rules: \n"
-            f"1. Lunch MUST be at 1:00 PM every day. \n"
-            f"2. Activities MUST end by 10:00 PM (Sleep time). \n"
-            f"3. Include travel time between places. \n"
-            f"Return ONLY raw JSON list of objects matching this schema: \n"
-            f"[{{'day_number': 1, 'activities': [{{'time': '...','description': '...'}}]}}]"
-        )
-        
+
+        if days > PARALLEL_DAY_THRESHOLD:
+            return await self._generate_days_concurrently(hotel_location, user_interests, days, on_day)
+
+        prompt = self._itinerary_prompt(hotel_location, user_interests, days)
         model = genai.GenerativeModel(self.model)
-        response = model.generate_content(prompt)
-        
+        parser = ItineraryStreamParser()
+        itinerary = []
+        full_text = ""
+
+        try:
+            # Only opening the stream is retried; once days have been pushed to on_day a retry would duplicate them
+            response = await LIMITER.run(
+                lambda: model.generate_content_async(prompt, stream=True),
+                api_key=self.api_key, model=self.model, priority=BATCH, stream=True,
+            )
+            with span("stream_content"):
+                async for chunk in response:
+                    text = getattr(chunk, "text", "") or ""
+                    full_text += text
+                    for day_data in parser.feed(text):
+                        day = self._build_day(day_data)
+                        if day:
+                            itinerary.append(day)
+                            if on_day:
+                                await on_day(day)
+        except Exception as e:
+            print(f"Error streaming itinerary: {e}")
+
+        if itinerary:
+            return sorted(itinerary, key=lambda d: d.day_number)
+
+        # Stream produced nothing usable, fall back to parsing whatever text arrived
         try:
-            # Clean up response
-            text = response.text
             import re
-            json_match = re.search(r"\[.*\]", text, re.DOTALL)
+            json_match = re.search(r"\[.*\]", full_text, re.DOTALL)
             if json_match:
-                clean_json = json_match.group(0)
-                data = json.loads(clean_json)
-                
-                itinerary = []
-                for day in data:
-                    activities = [ItineraryActivity(**a) for a in day['activities']]
-                    itinerary.append(ItineraryDay(day_number=day['day_number'], activities=activities))
+                data = json.loads(json_match.group(0))
+                for day_data in data:
+                    day = self._build_day(day_data)
+                    if day:
+                        itinerary.append(day)
+                        if on_day:
+                            await on_day(day)
                 return itinerary
             else:
                  print("Error: Could not find JSON in LLM response")
@@ -137,3 +164,125 @@ class StayManager:
         except Exception as e:
             print(f"Error generating itinerary: {e}")
             return []
+
+    async def _generate_days_concurrently(self, hotel_location: str, user_interests: str, days: int, on_day=None) -> list[ItineraryDay]:
+        """One request per day, fired together. Days are pushed to `on_day` in completion order."""
+        model = genai.GenerativeModel(self.model)
+
+        async def generate_day(day_number: int):
+            prompt = self._itinerary_prompt(hotel_location, user_interests, days, day_number=day_number)
+            try:
+                response = await LIMITER.run(
+                    lambda: model.generate_content_async(prompt),
+                    api_key=self.api_key, model=self.model, priority=BATCH, day=day_number,
+                )
+                parser = ItineraryStreamParser()
+                for day_data in parser.feed(response.text):
+                    day_data["day_number"] = day_number
+                    return self._build_day(day_data)
+                print(f"Error: No JSON for day {day_number}")
+            except Exception as e:
+                print(f"Error generating day {day_number}: {e}")
+            return None
+
+        itinerary = []
+        for next_done in asyncio.as_completed([generate_day(n) for n in range(1, days + 1)]):
+            day = await next_done
+            if day:
+                itinerary.append(day)
+                if on_day:
+                    await on_day(day)
+
+        return sorted(itinerary, key=lambda d: d.day_number)
+
+    def _itinerary_prompt(self, hotel_location: str, user_interests: str, days: int, day_number: int = None) -> str:
+        scope = f"Create a {days}-day travel itinerary"
+        if day_number:
+            scope = f"Create ONLY day {day_number} of a {days}-day travel itinerary"
+
+        return (
+            f"{scope} for a trip staying at {hotel_location}. "
+            f"User Interests: {user_interests}. "
+            f"Strict Rules: \n"
+            f"1. Lunch MUST be at 1:00 PM every day. \n"
+            f"2. Activities MUST end by 10:00 PM (Sleep time). \n"
+            f"3. Include travel time between places. \n"
+            f"Return ONLY raw JSON list of objects matching this schema: \n"
+            f"[{{'day_number': {day_number or 1}, 'activities': [{{'time': '...','description': '...'}}]}}]"
+        )
+
+    def _build_day(self, day_data: dict):
+        try:
+            activities = [ItineraryActivity(**a) for a in day_data['activities']]
+            return ItineraryDay(day_number=day_data['day_number'], activities=activities)
+        except Exception as e:
+            print(f"Error parsing itinerary day: {e}")
+            return None
+
+
+class ItineraryStreamParser:
+    """
+    Incremental parser for a streamed JSON list of day objects.
+    feed() returns every top-level object that has been closed since the previous call.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.in_list = False
+        self.depth = 0
+        self.quote = None
+        self.escaped = False
+        self.obj_start = None
+
+    def feed(self, text: str) -> list[dict]:
+        self.buffer += text
+        completed = []
+
+        while self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+
+            if self.quote:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == self.quote:
+                    self.quote = None
+            elif not self.in_list:
+                if ch == "[":
+                    self.in_list = True
+            elif ch in "\"'" and self.depth > 0:
+                self.quote = ch
+            elif ch == "{":
+                if self.depth == 0:
+                    self.obj_start = self.pos
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    obj = self._load(self.buffer[self.obj_start:self.pos + 1])
+                    if obj is not None:
+                        completed.append(obj)
+                    self.obj_start = None
+
+            self.pos += 1
+
+        # Drop consumed text so long streams don't keep growing the buffer
+        if self.obj_start is None:
+            self.buffer = ""
+            self.pos = 0
+
+        return completed
+
+    def _load(self, raw: str):
+        try:
+            return json.loads(raw)
+        except json.JSONDecodeError:
+            # The prompt shows single-quoted keys, so the model sometimes echoes Python-style dicts
+            try:
+                import ast
+                return ast.literal_eval(raw)
+            except Exception:
+                print(f"[Warn] Could not parse itinerary day: {raw[:80]}...")
+                return None
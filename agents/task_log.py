@@ -0,0 +1,41 @@
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional
+
+# Set by server.run_agent_task for the duration of a task. asyncio copies context into
+# child tasks, so anything an agent awaits (hedged runs included) logs to the right task.
+TASK_LOG: ContextVar[Optional[Callable[[str], Awaitable[None]]]] = ContextVar("task_log", default=None)
+
+
+def bind_task_log(sink: Callable[[str], Awaitable[None]]):
+    """Routes task_log() calls in the current context to `sink`. Returns a token for TASK_LOG.reset()."""
+    return TASK_LOG.set(sink)
+
+
+async def task_log(message: str):
+    """Sends a progress line to the running task's log stream, or stdout when there is no task."""
+    sink = TASK_LOG.get()
+    if sink is None:
+        print(message)
+        return
+    try:
+        await sink(message)
+    except Exception as e:
+        print(f"[TaskLog] Could not deliver '{message[:40]}': {e}")
+
+
+# Structured per-step records (see agents/droid_runner.py), bound alongside TASK_LOG
+TASK_STEPS: ContextVar[Optional[Callable[[dict], Awaitable[None]]]] = ContextVar("task_steps", default=None)
+
+
+def bind_task_steps(sink: Callable[[dict], Awaitable[None]]):
+    return TASK_STEPS.set(sink)
+
+
+async def task_step(record: dict):
+    sink = TASK_STEPS.get()
+    if sink is None:
+        return
+    try:
+        await sink(record)
+    except Exception as e:
+        print(f"[TaskLog] Could not deliver step record: {e}")
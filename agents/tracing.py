@@ -0,0 +1,144 @@
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds: ADB calls sit at the low end, whole agent runs at the top
+BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+# Spans kept per task record; the histograms still see every span
+MAX_SPANS_PER_TASK = 500
+
+# {"persona": str, "spans": list} for the task running in this context
+TASK_TRACE: ContextVar[Optional[Dict[str, Any]]] = ContextVar("task_trace", default=None)
+
+
+def bind_trace(persona: str, spans: List[Dict[str, Any]]):
+    """Attach spans created in this context to `spans` (the task record's list) and label them with `persona`."""
+    return TASK_TRACE.set({"persona": persona, "spans": spans})
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+# (span, persona, app) -> Histogram
+HISTOGRAMS: Dict[Tuple[str, str, str], Histogram] = {}
+
+
+class span:
+    """
+    Timed span usable as `with span(...)` or `async with span(...)`.
+    Records into the per-(span, persona, app) histogram and, inside a task, onto the task record.
+    per_task=False keeps high-volume spans (e.g. websocket broadcasts) out of the capped task trace.
+    """
+
+    def __init__(self, name: str, app: str = "", per_task: bool = True, **attrs):
+        self.name = name
+        self.app = app
+        self.per_task = per_task
+        self.attrs = attrs
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._finish(exc_type)
+        return False
+
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+    def _finish(self, exc_type):
+        duration = time.perf_counter() - self.started
+        trace = TASK_TRACE.get()
+        persona = trace["persona"] if trace else ""
+
+        key = (self.name, persona, self.app)
+        if key not in HISTOGRAMS:
+            HISTOGRAMS[key] = Histogram()
+        HISTOGRAMS[key].observe(duration)
+
+        if self.per_task and trace is not None and len(trace["spans"]) < MAX_SPANS_PER_TASK:
+            status = "ok"
+            if exc_type is asyncio.CancelledError:
+                status = "cancelled"
+            elif exc_type:
+                status = "error"
+            record = {"span": self.name, "duration_ms": round(duration * 1000, 1), "status": status}
+            if self.app:
+                record["app"] = self.app
+            record.update(self.attrs)
+            trace["spans"].append(record)
+
+
+def traced(name: str):
+    """Decorator form of span() for sync and async functions."""
+    def wrap(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_inner(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_inner
+
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+async def traced_sleep(seconds: float):
+    """asyncio.sleep that shows up in traces, so fixed waits are visible next to real work."""
+    with span("sleep", seconds=seconds):
+        await asyncio.sleep(seconds)
+
+
+def _labels(**labels) -> str:
+    parts = []
+    for k, v in labels.items():
+        v = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+        parts.append(f'{k}="{v}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def render_prometheus(gauges: Optional[Dict[str, float]] = None, counters: Optional[Dict[str, float]] = None) -> str:
+    """Prometheus text exposition (format 0.0.4) of all span histograms plus optional gauges and counters."""
+    lines = [
+        "# HELP droid_span_duration_seconds Time spent in traced hot-path operations.",
+        "# TYPE droid_span_duration_seconds histogram",
+    ]
+    for (name, persona, app), hist in sorted(HISTOGRAMS.items()):
+        for bound, count in zip(BUCKETS, hist.counts):
+            lines.append(f"droid_span_duration_seconds_bucket{_labels(span=name, persona=persona, app=app, le=bound)} {count}")
+        lines.append(f"droid_span_duration_seconds_bucket{_labels(span=name, persona=persona, app=app, le='+Inf')} {hist.total}")
+        lines.append(f"droid_span_duration_seconds_sum{_labels(span=name, persona=persona, app=app)} {hist.sum:.6f}")
+        lines.append(f"droid_span_duration_seconds_count{_labels(span=name, persona=persona, app=app)} {hist.total}")
+
+    for name, value in (gauges or {}).items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+
+    # Cumulative totals; names end in _total
+    for name, value in (counters or {}).items():
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -15,19 +15,26 @@ except ImportError:
     load_llm = None
     AdbTools = None
 
+from agents.deep_links import DEEP_LINKS
+from agents.droid_runner import run_droid_agent
+from agents.llm_limiter import limited_llm
+from agents.tracing import span
 from schemas import FlightDetails, CabDetails
 
 class TransitManager:
-    def __init__(self, provider="gemini", model="models/gemini-2.5-flash"):
+    def __init__(self, provider="gemini", model="models/gemini-2.5-flash", timeout=1000):
         self.provider = provider
         self.model = model
+        self.timeout = timeout
         self.api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
 
     async def _run_agent(self, goal: str) -> dict:
         """Helper to run DroidAgent."""
         # Config setup
         provider_name = "GoogleGenAI" if self.provider == "gemini" else self.provider
-        llm = load_llm(provider_name=provider_name, model=self.model, api_key=self.api_key)
+        with span("load_llm"):
+            llm = limited_llm(load_llm(provider_name=provider_name, model=self.model, api_key=self.api_key),
+                              self.api_key, self.model)
         
         tools = await AdbTools.create()
 
@@ -43,7 +50,7 @@ class TransitManager:
         
         try:
             print(f"      🧠 TransitAgent Analyzing...")
-            result = await agent.run()
+            result = await run_droid_agent(agent, "TransitAgent")
             
             # Robust Parsing (based on EventCoordinator logic)
             raw_text = str(result.reason) if hasattr(result, 'reason') else str(result)
@@ -73,24 +80,36 @@ class TransitManager:
 
     async def find_best_flight(self, source: str, dest: str, date: str) -> FlightDetails:
         print(f"✈️ Searching Flight: {source} to {dest} on {date}")
-        
+
+        landed = await DEEP_LINKS.open("MakeMyTrip", "flights", source=source, dest=dest, date=date)
+        if landed:
+            goal = (
+                f"1. 'MakeMyTrip' is already showing {landed}. "
+                f"2. Wait 10 seconds for results to fully load. "
+                f"3. **SCROLL DOWN** slowly to ensure flight cards are rendered. "
+                f"4. Identify the FIRST flight card in the list. "
+                f"5. Extract directly from the card: Airline Name, Flight Number (if visible, else 'N/A'), Price, and ARRIVAL Time. "
+                f"6. Return strict JSON: {{'airline': '...', 'flight_number': '...', 'price': '...', 'arrival_time': 'YYYY-MM-DD HH:MM:SS'}}."
+            )
+            return self._flight_details(await self._run_agent(goal))
+
         goal = (
             f"1. Open 'MakeMyTrip'. "
-            f"2. Handle any Ads/Popups if they appear (Click 'X' or 'Skip'). "
-            f"3. Click on 'Flights'. "
-            f"4. Select 'One Way'. "
-            f"5. Enter From: '{source}' and To: '{dest}'. "
-            f"6. Select Date: '{date}'. "
-            f"7. Click 'Search Flights'. "
-            f"8. Wait 10 seconds for results to fully load. "
-            f"9. **SCROLL DOWN** slowly to ensure flight cards are rendered. "
-            f"10. Identify the FIRST flight card in the list. "
-            f"11. Extract directly from the card: Airline Name, Flight Number (if visible, else 'N/A'), Price, and ARRIVAL Time. "
-            f"12. Return strict JSON: {{'airline': '...', 'flight_number': '...', 'price': '...', 'arrival_time': 'YYYY-MM-DD HH:MM:SS'}}."
+            f"2. Click on 'Flights'. "
+            f"3. Select 'One Way'. "
+            f"4. Enter From: '{source}' and To: '{dest}'. "
+            f"5. Select Date: '{date}'. "
+            f"6. Click 'Search Flights'. "
+            f"7. Wait 10 seconds for results to fully load. "
+            f"8. **SCROLL DOWN** slowly to ensure flight cards are rendered. "
+            f"9. Identify the FIRST flight card in the list. "
+            f"10. Extract directly from the card: Airline Name, Flight Number (if visible, else 'N/A'), Price, and ARRIVAL Time. "
+            f"11. Return strict JSON: {{'airline': '...', 'flight_number': '...', 'price': '...', 'arrival_time': 'YYYY-MM-DD HH:MM:SS'}}."
         )
         
-        result = await self._run_agent(goal)
-        
+        return self._flight_details(await self._run_agent(goal))
+
+    def _flight_details(self, result: dict) -> FlightDetails:
         # Fallback/Validation logic could go here
         try:
              # Basic validation of return format
@@ -0,0 +1,197 @@
+import re
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, List, Optional
+
+from agents.adb_utils import adb_shell
+from agents.tracing import span
+
+# Below this many labelled actionable nodes the screen is probably drawn on a canvas/WebView
+MIN_LABELLED_NODES = 3
+# Cap on nodes sent to the planner; menus with hundreds of rows are cut, the LLM can scroll
+MAX_NODES = 80
+
+_BOUNDS = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+_OPAQUE = ("WebView", "SurfaceView", "TextureView", "GLSurfaceView", "ComposeView")
+# Containers that are a dialog or overlay drawn inside an app's own window
+_OVERLAY_CLASS = re.compile(r"Dialog|BottomSheet|PopupWindow")
+_OVERLAY_ID = re.compile(r"dialog|bottom_?sheet|popup|modal|overlay|interstitial", re.IGNORECASE)
+
+
+class UINode:
+    def __init__(self, index: int, cls: str, text: str, desc: str, resource_id: str, bounds: List[int],
+                 clickable: bool, editable: bool, scrollable: bool, checkable: bool, checked: bool):
+        self.index = index
+        self.cls = cls
+        self.text = text
+        self.desc = desc
+        self.resource_id = resource_id
+        self.bounds = bounds
+        self.clickable = clickable
+        self.editable = editable
+        self.scrollable = scrollable
+        self.checkable = checkable
+        self.checked = checked
+
+    @property
+    def label(self) -> str:
+        return self.text or self.desc
+
+    @property
+    def actionable(self) -> bool:
+        return self.clickable or self.editable or self.scrollable or self.checkable
+
+    def center(self):
+        x1, y1, x2, y2 = self.bounds
+        return (x1 + x2) // 2, (y1 + y2) // 2
+
+    def role(self) -> str:
+        if self.editable:
+            return "input"
+        if self.checkable:
+            return "toggle"
+        if self.scrollable and not self.clickable:
+            return "list"
+        if self.clickable:
+            return "button"
+        return "text"
+
+    def describe(self) -> str:
+        parts = [f"[{self.index}] {self.role()}"]
+        if self.label:
+            parts.append(f'"{self.label[:60]}"')
+        if self.resource_id:
+            parts.append(f"id={self.resource_id.split('/')[-1]}")
+        if self.checkable:
+            parts.append("on" if self.checked else "off")
+        return " ".join(parts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in ("index", "cls", "text", "desc", "resource_id", "bounds", "clickable",
+                                              "editable", "scrollable", "checkable", "checked")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UINode":
+        return cls(**data)
+
+
+async def dump_ui(serial: Optional[str] = None) -> Optional[str]:
+    """Raw uiautomator XML of the current screen, or None (secure screens, animations, no device)."""
+    with span("ui_dump"):
+        # /dev/tty streams the XML straight back and skips the write + cat round trip
+        output = await adb_shell("uiautomator", "dump", "/dev/tty", serial=serial, timeout=10)
+        if "<hierarchy" not in output:
+            output = await adb_shell("uiautomator dump /sdcard/neuro_ui.xml >/dev/null && cat /sdcard/neuro_ui.xml",
+                                     serial=serial, timeout=10)
+    start, end = output.find("<hierarchy"), output.rfind("</hierarchy>")
+    if start < 0 or end < 0:
+        return None
+    return output[start:end + len("</hierarchy>")]
+
+
+def parse_nodes(xml: str, width: int = 0, height: int = 0) -> List[UINode]:
+    """
+    Pruned list of nodes worth showing the planner: anything actionable, plus standalone text.
+    Text of non-clickable children is folded into the clickable parent so a card reads as one button.
+    """
+    try:
+        root = ET.fromstring(xml)
+    except ET.ParseError:
+        return []
+
+    nodes: List[UINode] = []
+    seen = set()
+
+    def bounds_of(el) -> Optional[List[int]]:
+        m = _BOUNDS.match(el.get("bounds", ""))
+        if not m:
+            return None
+        x1, y1, x2, y2 = map(int, m.groups())
+        if x2 - x1 <= 1 or y2 - y1 <= 1:
+            return None
+        if width and height and (x2 <= 0 or y2 <= 0 or x1 >= width or y1 >= height):
+            return None
+        return [x1, y1, x2, y2]
+
+    def child_text(el) -> str:
+        texts = []
+        for child in el.iter():
+            if child is el:
+                continue
+            label = child.get("text") or child.get("content-desc") or ""
+            if label and label not in texts:
+                texts.append(label)
+        return " | ".join(texts)[:80]
+
+    def visit(el, inside_clickable: bool):
+        if el.tag == "node" and el.get("enabled", "true") == "true":
+            bounds = bounds_of(el)
+            cls = el.get("class", "").split(".")[-1]
+            clickable = el.get("clickable") == "true" or el.get("long-clickable") == "true"
+            editable = "EditText" in cls
+            scrollable = el.get("scrollable") == "true"
+            checkable = el.get("checkable") == "true"
+            text, desc = el.get("text", ""), el.get("content-desc", "")
+
+            actionable = clickable or editable or scrollable or checkable
+            if bounds and (actionable or ((text or desc) and not inside_clickable)):
+                if clickable and not (text or desc):
+                    text = child_text(el)
+                key = (tuple(bounds), text, desc)
+                if key not in seen:
+                    seen.add(key)
+                    nodes.append(UINode(len(nodes), cls, text, desc, el.get("resource-id", ""), bounds,
+                                        clickable, editable, scrollable, checkable, el.get("checked") == "true"))
+            inside_clickable = inside_clickable or clickable
+        for child in el:
+            visit(child, inside_clickable)
+
+    visit(root, False)
+    return nodes[:MAX_NODES]
+
+
+def tree_sufficient(nodes: List[UINode], xml: str = "") -> bool:
+    """
+    False when the hierarchy can't describe the screen: too few labelled controls, or
+    a WebView/SurfaceView-style surface with nothing exposed inside it.
+    """
+    labelled = [n for n in nodes if n.actionable and n.label]
+    if len(labelled) < MIN_LABELLED_NODES:
+        return False
+    if xml and any(f".{name}\"" in xml for name in _OPAQUE) and len(labelled) < MIN_LABELLED_NODES * 2:
+        return False
+    return True
+
+
+def overlay_bounds(xml: str) -> Optional[List[int]]:
+    """
+    Bounds of the dialog/overlay on the dumped screen, or None for a plain full-screen window.
+    A window that doesn't start at the top-left corner is a dialog window; inside a full-screen
+    window, the outermost container whose class or id says dialog/bottom sheet/popup/modal counts.
+    """
+    try:
+        root = ET.fromstring(xml)
+    except ET.ParseError:
+        return None
+    window = root.find("node")
+    if window is None:
+        return None
+    m = _BOUNDS.match(window.get("bounds", ""))
+    if m and (int(m.group(1)) > 0 or int(m.group(2)) > 0):
+        return list(map(int, m.groups()))
+    for el in window.iter("node"):
+        cls = el.get("class", "").split(".")[-1]
+        rid = el.get("resource-id", "").split("/")[-1]
+        m = _BOUNDS.match(el.get("bounds", ""))
+        if m and (_OVERLAY_CLASS.search(cls) or _OVERLAY_ID.search(rid)):
+            return list(map(int, m.groups()))
+    return None
+
+
+def compact(nodes: List[UINode]) -> str:
+    return "\n".join(n.describe() for n in nodes)
+
+
+def screen_package(xml: str) -> Optional[str]:
+    """Package that owns the dumped window (uiautomator tags every node with it)."""
+    m = re.search(r'<node [^>]*package="([^"]+)"', xml)
+    return m.group(1) if m else None
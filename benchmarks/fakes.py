@@ -0,0 +1,182 @@
+"""
+Scripted stand-ins for the phone and the LLM, used by the benchmark harness.
+Nothing here talks to a device or to Gemini; latencies come from a seeded random generator.
+"""
+import asyncio
+import json
+import math
+import random
+from typing import Any, Dict, List, Optional
+
+
+class FakeLLM:
+    """Deterministic latency source. Latency per call is lognormal around `median_ms`."""
+
+    def __init__(self, median_ms: float = 800, sigma: float = 0.4, seed: int = 7):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.rng = random.Random(seed)
+        self.calls = 0
+
+    def latency(self) -> float:
+        self.calls += 1
+        return self.median_ms / 1000 * math.exp(self.rng.gauss(0, self.sigma))
+
+    async def think(self):
+        await asyncio.sleep(self.latency())
+
+
+# Event classes named like DroidRun's so agents/droid_runner.py maps them the same way
+class ManagerPlanEvent:
+    def __init__(self, plan: List[str]):
+        self.plan = plan
+
+
+class ScreenshotEvent:
+    pass
+
+
+class ExecutorActionEvent:
+    def __init__(self, description: str):
+        self.description = description
+
+
+class FakeResult:
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.success = True
+
+
+def scripted_reply(goal: str, rng: random.Random) -> Dict[str, Any]:
+    """A plausible final JSON answer for each goal template the agents use."""
+    price = f"₹{rng.randint(80, 900)}"
+
+    if "'Flights'" in goal:
+        return {"airline": "IndiGo", "flight_number": "6E 203", "price": price, "arrival_time": "2026-11-01 10:30:00"}
+    if "Airport Cabs" in goal:
+        return {"provider": "MakeMyTrip Cabs", "pickup_time": "2026-11-01 11:15:00", "estimated_price": price}
+    if "'Hotels'" in goal:
+        return {"name": "Bench Residency", "address": "MG Road", "price_per_night": price}
+    if "Input Pickup" in goal and "Confirm Booking" in goal:
+        return {"status": "success", "driver_details": "Ravi", "cab_details": "KA01 AB 1234", "price": price, "eta": "4 min"}
+    if "Input Pickup" in goal:
+        return {"app": "Uber", "ride_type": "Uber Go", "price": price, "eta": "5 min"}
+    if "'medicine'" in goal:
+        return {"app": "Apollo 24|7", "medicine": "Paracetamol", "price": price, "details": "Strip of 10"}
+    if "Send button" in goal:
+        return {"status": "success"}
+    if "Read the LAST message" in goal:
+        return {"status": "new_reply", "items": ["Pizza"]}
+    if "Home" in goal and "press" in goal.lower():
+        return {"status": "success"}
+    if "Place Order" in goal:
+        return {"status": "success", "order_id": f"FAKE{rng.randint(1000, 9999)}", "final_price": price}
+    return {"title": "Bench Item", "price": price, "rating": "4.2", "restaurant": "Bench Kitchen"}
+
+
+class FakeHandler:
+    """Mimics DroidRun's workflow handler: awaitable, with stream_events()."""
+
+    def __init__(self, agent: "FakeDroidAgent"):
+        self.agent = agent
+        self.result: Optional[FakeResult] = None
+
+    async def stream_events(self):
+        llm = self.agent.llm
+        yield ManagerPlanEvent([f"step {i + 1}" for i in range(self.agent.steps)])
+        for i in range(self.agent.steps):
+            await llm.think()
+            yield ScreenshotEvent()
+            yield ExecutorActionEvent(f"scripted action {i + 1}")
+        reply = scripted_reply(self.agent.goal, llm.rng)
+        self.result = FakeResult(json.dumps(reply))
+
+    def __await__(self):
+        async def finish():
+            if self.result is None:
+                async for _ in self.stream_events():
+                    pass
+            return self.result
+        return finish().__await__()
+
+
+class FakeDroidAgent:
+    """Accepts every constructor style the agents use (llm=/llms=, config=, tools=...)."""
+
+    steps = 4
+
+    def __init__(self, goal: str, llm: Any = None, llms: Any = None, **kwargs):
+        self.goal = goal
+        self.llm = llm or llms
+
+    def run(self) -> FakeHandler:
+        return FakeHandler(self)
+
+
+class FakeAdbTools:
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        return cls()
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeStream:
+    """Async iterator of chunks, like generate_content_async(stream=True)."""
+
+    def __init__(self, text: str, llm: FakeLLM, chunk_size: int = 40):
+        self.chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self.llm = llm
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        # Time to first token, then a steady trickle
+        await self.llm.think()
+        for chunk in self.chunks:
+            await asyncio.sleep(0.005)
+            yield FakeResponse(chunk)
+
+
+def fake_itinerary(days: int = 3) -> str:
+    return json.dumps([
+        {"day_number": d, "activities": [
+            {"time": "9:00 AM", "description": f"Day {d} sightseeing"},
+            {"time": "1:00 PM", "description": "Lunch"},
+            {"time": "7:00 PM", "description": "Dinner walk"},
+        ]}
+        for d in range(1, days + 1)
+    ])
+
+
+class FakeGenerativeModel:
+    """Replacement for google.generativeai.GenerativeModel in StayManager / GeneralAgent."""
+
+    llm: FakeLLM = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def generate_content_async(self, prompt, stream: bool = False, **kwargs):
+        text = fake_itinerary()
+        if stream:
+            return FakeStream(text, self.llm)
+        await self.llm.think()
+        return FakeResponse(json.dumps(json.loads(text)[0]))
+
+    def generate_content(self, *args, **kwargs):
+        return FakeResponse('{"status": "done", "action": {"type": "done", "data": {}}}')
+
+    def start_chat(self, history=None):
+        return self
+
+    def send_message(self, message):
+        return FakeResponse("Hello! How can I help?")
+
+    async def send_message_async(self, message):
+        await self.llm.think()
+        return self.send_message(message)
@@ -0,0 +1,93 @@
+"""
+Replays a recorded NeuroOrchestrator trace with no phone attached.
+
+    NeuroOrchestrator(api_key, record_to="swiggy.zip")            # record a real mission (or set NEURO_TRACE_PATH)
+    python -m benchmarks.replay_mission swiggy.zip --runs 5         # replay it
+    python -m benchmarks.replay_mission swiggy.zip --planner live   # re-plan on the recorded frames
+
+With --planner recorded (default) every run is deterministic, so timing differences come from our own code
+(frame decode/preprocessing, history handling, caching) rather than from the phone or Gemini.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List
+
+from agents.model_cascade import CASCADE
+from agents.tracing import bind_trace
+from neurorun.replay import ReplayOrchestrator
+
+
+async def replay_once(trace_path: str, planner: str) -> Dict[str, Any]:
+    orchestrator = ReplayOrchestrator(
+        trace_path,
+        api_key=os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY") or "replay",
+        planner=planner,
+    )
+    spans: List[Dict[str, Any]] = []
+    bind_trace("replay", spans)
+
+    started = time.perf_counter()
+    result = await orchestrator.run_mission(orchestrator.trace.meta.get("goal", ""))
+    wall = time.perf_counter() - started
+
+    per_span: Dict[str, float] = {}
+    for s in spans:
+        per_span[s["span"]] = per_span.get(s["span"], 0.0) + s["duration_ms"]
+    # Which model planned each step ("recorded" replays keep whatever the original run used)
+    models: Dict[str, int] = {}
+    for h in orchestrator.history:
+        name = h.get("model") or "cache"
+        models[name] = models.get(name, 0) + 1
+
+    return {
+        "status": result.get("status"),
+        "steps": orchestrator.cursor,
+        "divergences": orchestrator.divergences,
+        "wall_ms": round(wall * 1000, 1),
+        "span_ms": {k: round(v, 1) for k, v in per_span.items()},
+        "models": models,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Deterministic replay of a recorded NeuroOrchestrator mission")
+    parser.add_argument("trace", help="Trace zip written by TraceRecorder")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--planner", choices=["recorded", "live"], default="recorded")
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        # Each run gets its own context so spans don't bleed between runs
+        run = await asyncio.create_task(replay_once(args.trace, args.planner))
+        runs.append(run)
+        print(f"run {i + 1}: {run['status']} steps={run['steps']} divergences={run['divergences']} "
+              f"wall={run['wall_ms']:.1f}ms {run['span_ms']}")
+
+    walls = [r["wall_ms"] for r in runs]
+    summary = {
+        "trace": args.trace,
+        "planner": args.planner,
+        "median_wall_ms": round(statistics.median(walls), 1),
+        "min_wall_ms": min(walls),
+        "max_wall_ms": max(walls),
+    }
+    print(f"median={summary['median_wall_ms']}ms min={summary['min_wall_ms']}ms max={summary['max_wall_ms']}ms")
+
+    if args.planner == "live":
+        summary["cascade"] = CASCADE.stats()["personas"].get("replay")
+        print(f"cascade: {summary['cascade']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"summary": summary, "runs": runs}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+"""
+End-to-end benchmark for server.run_agent_task with a fake device and a fake LLM.
+
+    python -m benchmarks.run_benchmark --concurrency 1,4,8 --tasks 16 --json bench.json
+
+Runs fully offline. Given the same --seed and settings, the latency draws are identical run to run.
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+import uuid
+import tracemalloc
+from typing import Any, Dict, List
+
+from benchmarks.fakes import FakeAdbTools, FakeDroidAgent, FakeGenerativeModel, FakeLLM
+
+PERSONA_PAYLOADS = {
+    "shopper": {"persona": "shopper", "product": "iPhone 16"},
+    "rider": {"persona": "rider", "pickup": "Koramangala", "drop": "Airport", "preference": "cab"},
+    "patient": {"persona": "patient", "medicine": ["Paracetamol", "Cetirizine"]},
+    "foodie": {"persona": "foodie", "food_item": "Fried Rice", "action": "search"},
+    "coordinator": {"persona": "coordinator", "event_name": "Diwali Party", "guest_list": ["Asha", "Ravi"]},
+    "traveller": {"persona": "traveller", "source": "Bengaluru", "destination": "Goa", "date": "2026-11-01", "user_interests": "beaches"},
+    "universal": {"persona": "universal", "instruction": "Open WhatsApp and check unread messages"},
+}
+
+
+def install_fakes(llm: FakeLLM, sleep_scale: float):
+    """Points every agent module at the fakes. Fixed waits between steps are scaled by `sleep_scale`."""
+    import commerce_agent
+    import ride_comparison_agent
+    import pharmacy_agent
+    import event_coordinator_agent
+    import server
+    import droidrun.agent.utils.llm_picker as llm_picker
+    from agents import agent_factory, deep_links, popup_handler, stay_agent, transit_agent
+    from agents.backend_router import ROUTER
+    from agents.tracing import traced_sleep
+
+    def fake_load_llm(*args, **kwargs):
+        return llm
+
+    async def scaled_sleep(seconds: float):
+        await traced_sleep(seconds * sleep_scale)
+
+    async def one_device():
+        return 1
+
+    async def no_op(*args, **kwargs):
+        return None
+
+    async def pressed(*args, **kwargs):
+        return True
+
+    FakeGenerativeModel.llm = llm
+    llm_picker.load_llm = fake_load_llm
+
+    for module in (commerce_agent, ride_comparison_agent, pharmacy_agent, event_coordinator_agent,
+                   agent_factory, stay_agent, transit_agent):
+        if hasattr(module, "DroidAgent"):
+            module.DroidAgent = FakeDroidAgent
+        if hasattr(module, "load_llm"):
+            module.load_llm = fake_load_llm
+        if hasattr(module, "AdbTools"):
+            module.AdbTools = FakeAdbTools
+        if hasattr(module, "traced_sleep"):
+            module.traced_sleep = scaled_sleep
+
+    stay_agent.genai.GenerativeModel = FakeGenerativeModel
+    server.traced_sleep = scaled_sleep
+    server.return_to_home = no_op
+    event_coordinator_agent.press_key = pressed
+    # Goals keep their full "open the app and navigate" form, so step counts match the real thing without links
+    deep_links.DEEP_LINKS_ENABLED = False
+    popup_handler.POPUP_WATCH = False
+    ROUTER.local_devices = one_device
+    return server
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # Nearest-rank percentile
+    rank = max(0, min(len(ordered) - 1, math.ceil(p * len(ordered)) - 1))
+    return ordered[rank]
+
+
+async def run_level(server, persona: str, concurrency: int, tasks: int) -> Dict[str, Any]:
+    gate = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    statuses: List[str] = []
+
+    async def one():
+        async with gate:
+            payload = server.TaskPayload(**PERSONA_PAYLOADS[persona])
+            task_id = str(uuid.uuid4())
+            started = time.perf_counter()
+            await server.run_agent_task(payload, task_id)
+            latencies.append(time.perf_counter() - started)
+            statuses.append(server.get_task_record(task_id)["status"])
+
+    tracemalloc.reset_peak()
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(asyncio.create_task(one()) for _ in range(tasks)))
+    wall = time.perf_counter() - wall_start
+    _, peak = tracemalloc.get_traced_memory()
+
+    # The harness keeps every record in memory; don't let earlier levels skew later ones
+    server.task_history.clear()
+
+    return {
+        "persona": persona,
+        "concurrency": concurrency,
+        "tasks": tasks,
+        "succeeded": statuses.count("success"),
+        "p50_seconds": round(percentile(latencies, 0.50), 3),
+        "p95_seconds": round(percentile(latencies, 0.95), 3),
+        "p99_seconds": round(percentile(latencies, 0.99), 3),
+        "tasks_per_minute": round(tasks / wall * 60, 1) if wall else 0.0,
+        "peak_memory_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline latency/throughput benchmark for run_agent_task")
+    parser.add_argument("--personas", default=",".join(PERSONA_PAYLOADS), help="Comma separated personas")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="Comma separated concurrency levels")
+    parser.add_argument("--tasks", type=int, default=8, help="Tasks per persona per concurrency level")
+    parser.add_argument("--llm-median-ms", type=float, default=300, help="Median fake LLM latency")
+    parser.add_argument("--llm-sigma", type=float, default=0.4, help="Lognormal spread of fake LLM latency")
+    parser.add_argument("--steps", type=int, default=4, help="Fake DroidAgent steps per run")
+    parser.add_argument("--sleep-scale", type=float, default=0.01, help="Multiplier for fixed sleeps in agents")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Write results to this file")
+    args = parser.parse_args()
+
+    llm = FakeLLM(median_ms=args.llm_median_ms, sigma=args.llm_sigma, seed=args.seed)
+    FakeDroidAgent.steps = args.steps
+    server = install_fakes(llm, args.sleep_scale)
+
+    tracemalloc.start()
+    rows = []
+    for persona in [p.strip() for p in args.personas.split(",") if p.strip()]:
+        for level in [int(c) for c in args.concurrency.split(",")]:
+            row = await run_level(server, persona, level, args.tasks)
+            rows.append(row)
+            print(f"{row['persona']:<12} c={row['concurrency']:<3} ok={row['succeeded']}/{row['tasks']:<4} "
+                  f"p50={row['p50_seconds']:.2f}s p95={row['p95_seconds']:.2f}s p99={row['p99_seconds']:.2f}s "
+                  f"{row['tasks_per_minute']:.1f} tasks/min peak={row['peak_memory_mb']:.1f}MB")
+    tracemalloc.stop()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "fake_llm_calls": llm.calls, "results": rows}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
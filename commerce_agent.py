@@ -10,6 +10,12 @@ import asyncio.subprocess
 from droidrun.agent.droid.droid_agent import DroidAgent
 from droidrun import AdbTools
 
+from agents.deep_links import DEEP_LINKS
+from agents.device_registry import DEVICES
+from agents.droid_runner import run_droid_agent
+from agents.llm_limiter import limited_llm
+from agents.tracing import span, traced_sleep
+
 load_dotenv()
 
 class CommerceAgent:
@@ -38,6 +44,12 @@ class CommerceAgent:
     async def execute_task(self, app_name: str, query: Optional[str] = None, item_type: str = "product", action: str = "search", target_item: Optional[str] = None, url: Optional[str] = None) -> dict:
         print(f"\n[CommerceAgent] Initializing Task for: {app_name} (Action: {action})")
         
+        # Land on the search results directly where the app supports it
+        landed = None
+        if query and not url and action in ("search", "order"):
+            landed = await DEEP_LINKS.open(app_name, "search", query=query)
+        opening = f"'{app_name}' is already showing {landed}." if landed else f"Open '{app_name}'. Search for '{query}'."
+
         goal_templates = {
             "url": (
                 f"Open the app '{app_name}'. Navigate directly to the URL: '{url}'. "
@@ -47,7 +59,7 @@ class CommerceAgent:
                 f"If unavailable, return status='failed'."
             ),
             "order": (
-                f"Open '{app_name}'. Search for '{query}'. Wait for results. "
+                f"{opening} Wait for results. "
                 f"Visually SCAN and select the item '{target_item}' or the first relevant one. "
                 f"Add to Cart. Go to View Cart. Proceed to Pay/Checkout. "
                 f"Select 'Cash on Delivery' or 'Pay on Delivery'. "
@@ -55,7 +67,7 @@ class CommerceAgent:
                 f"Return JSON keys: 'status' (success/failed), 'order_id', 'final_price'."
             ),
             "search": (
-                f"Open '{app_name}'. Search for '{query}'. Wait for load. "
+                f"{opening} Wait for load. "
                 f"Visually SCAN results. Identify multiple items matching '{query}'. "
                 f"COMPARE prices. Select the CHEAPEST option. "
                 f"Extract: 1. Title, 2. Price, 3. Rating, 4. Restaurant. "
@@ -74,11 +86,12 @@ class CommerceAgent:
         from droidrun.agent.utils.llm_picker import load_llm
 
         key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        llm = load_llm(
-            provider_name="GoogleGenAI",
-            model=self.model,
-            api_key=key
-        )
+        with span("load_llm"):
+            llm = limited_llm(load_llm(
+                provider_name="GoogleGenAI",
+                model=self.model,
+                api_key=key
+            ), key, self.model)
 
         try:
              from droidrun.config_manager import DroidrunConfig, AgentConfig, ManagerConfig, ExecutorConfig, TelemetryConfig
@@ -98,7 +111,7 @@ class CommerceAgent:
         
         try:
             print(f"[CommerceAgent] 🧠 Running Agent Logic...")
-            raw_result = await agent.run()
+            raw_result = await run_droid_agent(agent, "CommerceAgent", app=app_name)
             
             if raw_result:
                 text_res = str(getattr(raw_result, 'reason', raw_result)).strip()
@@ -134,12 +147,12 @@ class CommerceAgent:
     async def auto_order_cheapest(self, query):
         print(f"\n[CommerceAgent] 🤖 Autonomous Ordering Sequence Initiated for: '{query}'")
         
-        platforms = ["Zomato", "Swiggy"]
+        platforms = await DEVICES.installed(["Zomato", "Swiggy"])
         search_results = {}
         
         for p in platforms:
             search_results[p.lower()] = await self.execute_task(p, query, "food item", action="search")
-            await asyncio.sleep(2)
+            await traced_sleep(2)
 
         valid_results = [
             (p, res) for p, res in search_results.items() 
@@ -187,7 +200,7 @@ async def main():
         for p in target_platforms:
             res = await bot.execute_task(p, args.query, "product" if args.task == "shopping" else "food item", action=args.action)
             final_res[p.lower()] = res
-            await asyncio.sleep(2)
+            await traced_sleep(2)
             
         print("\n--- Final Results ---")
         print(json.dumps(final_res, indent=2))
@@ -15,6 +15,11 @@ except ImportError:
     print("CRITICAL ERROR: 'droidrun' library not found.")
     sys.exit(1)
 
+from agents.device_primitives import press_key
+from agents.droid_runner import run_droid_agent
+from agents.llm_limiter import limited_llm
+from agents.tracing import span, traced_sleep
+
 try:
     from commerce_agent import CommerceAgent
 except ImportError:
@@ -38,7 +43,8 @@ class EventCoordinatorAgent:
         api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         provider_name = "GoogleGenAI" if self.provider == "gemini" else self.provider
         
-        llm = load_llm(provider_name=provider_name, model=self.model, api_key=api_key)
+        with span("load_llm"):
+            llm = limited_llm(load_llm(provider_name=provider_name, model=self.model, api_key=api_key), api_key, self.model)
         
         tools = await AdbTools.create()
         
@@ -52,7 +58,7 @@ class EventCoordinatorAgent:
         
         try:
             print(f"      🧠 Analyzing...")
-            result = await agent.run()
+            result = await run_droid_agent(agent, "CoordinatorAgent")
             
             raw_text = str(result.reason) if hasattr(result, 'reason') else str(result)
             import re
@@ -121,6 +127,11 @@ class EventCoordinatorAgent:
     
     async def go_home(self) -> dict:
         print("   🏠 Navigating to Home Screen...")
+        try:
+            if await press_key("home"):
+                return {"status": "success"}
+        except Exception as e:
+            print(f"   ⚠️ Home keyevent failed ({e}), asking the agent instead")
         goal = "Press the System Home Button immediately. Do NOT swipe. Do NOT look for keyboard. Just press 'Home'."
         return await self._run_agent(goal)
 
@@ -131,7 +142,7 @@ class EventCoordinatorAgent:
         
         for p in platforms:
              await self.go_home()
-             await asyncio.sleep(2)
+             await traced_sleep(2)
              
              print(f"      👉 Checking {p}...")
              res = await self.commerce_bot.execute_task(p, item, "food item", action="search")
@@ -141,7 +152,7 @@ class EventCoordinatorAgent:
              price = res.get('data', {}).get('price', 'N/A')
              print(f"         [{p}] Status: {status} | Price: {price}")
              
-             await asyncio.sleep(2)
+             await traced_sleep(2)
              
         z_data = results.get('zomato', {}).get('data', {})
         s_data = results.get('swiggy', {}).get('data', {})
@@ -196,7 +207,7 @@ class EventCoordinatorAgent:
         
         for contact in contacts:
             await self.send_invite(contact, invite_msg)
-            await asyncio.sleep(2)
+            await traced_sleep(2)
         print("✅ Phase 1 Complete: All invites sent.\n")
 
         print(f"=== 👂 PHASE 2: POLLING & RESEARCH (Loop) ===")
@@ -238,11 +249,11 @@ class EventCoordinatorAgent:
                 else:
                      print(f"   ⏳ {contact} hasn't replied yet.")
                 
-                await asyncio.sleep(2)
+                await traced_sleep(2)
             
             print("   💤 Entering Dormant State... Waking up in 10s...")
             await self.go_home()
-            await asyncio.sleep(10)
+            await traced_sleep(10)
 
         print(f"\n=== 🚀 PHASE 3: BULK ORDER EXECUTION ===")
         
@@ -270,7 +281,7 @@ class EventCoordinatorAgent:
                 target_item=order['exact_title']
             )
             print("✅ Order Placed.")
-            await asyncio.sleep(5)
+            await traced_sleep(5)
             
         print("\n=== 🎉 EVENT COORDINATION COMPLETE ===")
 
@@ -0,0 +1,241 @@
+import asyncio
+import io
+import os
+import time
+from typing import Any, Dict, Optional
+
+from PIL import Image, ImageChops, ImageStat
+
+from agents.adb_utils import adb_bytes
+from agents.tracing import span
+
+try:
+    import av  # PyAV, only needed for the frame stream
+except ImportError:
+    av = None
+
+# Opt-in: keep a screenrecord H.264 stream open and plan from its latest decoded frame
+NEURO_FRAME_STREAM = os.getenv("NEURO_FRAME_STREAM", "False").lower() == "true"
+FRAME_STREAM_BITRATE = os.getenv("FRAME_STREAM_BITRATE", "6M")
+# Long edge of the streamed frames; the planner works in 0-1000 coordinates so full resolution is not needed
+FRAME_STREAM_MAX_EDGE = int(os.getenv("FRAME_STREAM_MAX_EDGE", "1280"))
+# Re-check a streamed frame against screencap every N captures (0 = only once, at startup)
+FRAME_STREAM_VALIDATE_EVERY = int(os.getenv("FRAME_STREAM_VALIDATE_EVERY", "20"))
+# Mean per-pixel difference (0-255, on a small grayscale thumbnail) above which the stream is not trusted
+FRAME_STREAM_MAX_DIFF = float(os.getenv("FRAME_STREAM_MAX_DIFF", "12"))
+# How long capture() waits for the first frame after the stream starts
+FIRST_FRAME_TIMEOUT = 5.0
+# How long capture() waits for a frame newer than the last action before falling back to screencap.
+# screenrecord only emits on change, so a screen the action didn't change never produces one.
+FRESH_FRAME_TIMEOUT = float(os.getenv("FRAME_STREAM_FRESH_TIMEOUT", "0.5"))
+READ_CHUNK = 64 * 1024
+
+# Totals across all streams, for /router/stats
+STATS: Dict[str, Any] = {
+    "streams_started": 0,
+    "restarts": 0,
+    "frames_decoded": 0,
+    "captures_streamed": 0,
+    "captures_fallback": 0,
+    "stale_fallbacks": 0,
+    "validations": 0,
+    "validation_failures": 0,
+    "last_diff": None,
+}
+
+
+async def screencap_image(serial: Optional[str] = None) -> Optional[Image.Image]:
+    """Full-resolution screenshot straight from `exec-out`, no file on the device or host."""
+    with span("screencap"):
+        data = await adb_bytes("exec-out", "screencap", "-p", serial=serial, timeout=10)
+    if not data.startswith(b"\x89PNG"):
+        return None
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img.convert("RGB")
+
+
+def frame_diff(a: Image.Image, b: Image.Image) -> float:
+    """Mean absolute difference of two frames on a 64x128 grayscale thumbnail (0 = identical)."""
+    size = (64, 128) if a.height >= a.width else (128, 64)
+    ta = a.convert("L").resize(size)
+    tb = b.convert("L").resize(size)
+    return ImageStat.Stat(ImageChops.difference(ta, tb)).mean[0]
+
+
+class FrameStream:
+    """
+    Keeps `screenrecord` streaming raw H.264 over `adb exec-out` and decodes it in a background task,
+    so the latest screen is always in memory and capture costs nothing on the device.
+
+    screenrecord only emits frames when the screen changes, so a quiet screen simply keeps the last frame.
+    It also exits after its time limit (3 minutes on most builds); the reader restarts it.
+    capture() only hands out a frame decoded after the last mark_action(); otherwise the caller screencaps.
+    Streamed frames are compared with screencap at startup and every FRAME_STREAM_VALIDATE_EVERY captures;
+    a mismatch (wrong orientation, stuck decoder, secure surface) disables the stream for this mission.
+    """
+
+    def __init__(self, serial: Optional[str], width: int, height: int):
+        self.serial = serial
+        self.width = width
+        self.height = height
+        self.latest: Optional[Image.Image] = None
+        self.latest_at = 0.0
+        self.action_at = 0.0
+        self.enabled = av is not None
+        self.captures = 0
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._task: Optional[asyncio.Task] = None
+        self._first_frame = asyncio.Event()
+        self._new_frame = asyncio.Event()
+        if av is None:
+            print("[FrameStream] PyAV not installed, using screencap")
+
+    def _size(self) -> str:
+        scale = min(1.0, FRAME_STREAM_MAX_EDGE / max(self.width, self.height))
+        # The encoder wants even dimensions
+        w = int(self.width * scale) // 2 * 2
+        h = int(self.height * scale) // 2 * 2
+        return f"{w}x{h}"
+
+    async def start(self):
+        if not self.enabled or self._task:
+            return
+        STATS["streams_started"] += 1
+        self._task = asyncio.create_task(self._run())
+
+    async def _spawn(self):
+        cmd = ["adb"]
+        if self.serial:
+            cmd += ["-s", self.serial]
+        cmd += ["exec-out", "screenrecord", "--output-format=h264",
+                "--bit-rate", FRAME_STREAM_BITRATE, "--size", self._size(), "-"]
+        self._proc = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        )
+
+    async def _run(self):
+        while self.enabled:
+            await self._spawn()
+            codec = av.CodecContext.create("h264", "r")
+            # Hand each frame out as soon as it is decoded: frame threading and reordering hold frames back
+            codec.thread_type = "SLICE"
+            codec.options = {"flags": "low_delay"}
+            got_frames = False
+            try:
+                while True:
+                    chunk = await self._proc.stdout.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    # Decoding is CPU-bound; keep it off the event loop
+                    frame = await asyncio.to_thread(self._decode, codec, chunk)
+                    if frame is not None:
+                        got_frames = True
+                        self.latest = frame
+                        self.latest_at = time.monotonic()
+                        self._first_frame.set()
+                        self._new_frame.set()
+            except asyncio.CancelledError:
+                self._kill()
+                raise
+            except Exception as e:
+                print(f"[FrameStream] Decoder error: {e}")
+            self._kill()
+
+            if not got_frames:
+                # screenrecord unsupported or refused (secure display, emulator without encoder)
+                print("[FrameStream] No frames from screenrecord, using screencap")
+                self.enabled = False
+                self._first_frame.set()
+                return
+            STATS["restarts"] += 1
+
+    @staticmethod
+    def _decode(codec, chunk: bytes) -> Optional[Image.Image]:
+        newest = None
+        for packet in codec.parse(chunk):
+            for frame in codec.decode(packet):
+                newest = frame
+                STATS["frames_decoded"] += 1
+        return newest.to_image() if newest is not None else None
+
+    def _kill(self):
+        if self._proc and self._proc.returncode is None:
+            self._proc.kill()
+        self._proc = None
+
+    async def capture(self) -> Optional[Image.Image]:
+        """Latest streamed frame, or None when the caller should take a screencap instead."""
+        if not self.enabled:
+            return None
+        await self.start()
+        try:
+            await asyncio.wait_for(self._first_frame.wait(), timeout=FIRST_FRAME_TIMEOUT)
+        except asyncio.TimeoutError:
+            return None
+        if self.latest is None:
+            return None
+        if not await self._fresh():
+            STATS["stale_fallbacks"] += 1
+            return None
+
+        self.captures += 1
+        due = self.captures == 1 or (FRAME_STREAM_VALIDATE_EVERY and self.captures % FRAME_STREAM_VALIDATE_EVERY == 0)
+        if due and not await self.validate():
+            return None
+        STATS["captures_streamed"] += 1
+        return self.latest.copy()
+
+    def mark_action(self):
+        """Called after input is sent; frames decoded before this may show the screen from before it."""
+        self.action_at = time.monotonic()
+
+    async def _fresh(self) -> bool:
+        """Waits up to FRESH_FRAME_TIMEOUT for a frame decoded after the last action."""
+        deadline = time.monotonic() + FRESH_FRAME_TIMEOUT
+        while self.latest_at <= self.action_at:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._new_frame.clear()
+            try:
+                await asyncio.wait_for(self._new_frame.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    async def validate(self) -> bool:
+        """Compares the latest streamed frame with a fresh screencap; disables the stream on a mismatch."""
+        reference = await screencap_image(self.serial)
+        if reference is None or self.latest is None:
+            return True
+        diff = frame_diff(self.latest, reference)
+        STATS["validations"] += 1
+        STATS["last_diff"] = round(diff, 2)
+        if diff > FRAME_STREAM_MAX_DIFF:
+            STATS["validation_failures"] += 1
+            print(f"[FrameStream] Stream differs from screencap (diff {diff:.1f}), using screencap")
+            await self.stop()
+            return False
+        return True
+
+    async def stop(self):
+        self.enabled = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        self._kill()
+
+
+def stats() -> Dict[str, Any]:
+    captures = STATS["captures_streamed"] + STATS["captures_fallback"]
+    return {
+        "enabled": NEURO_FRAME_STREAM,
+        "decoder": "pyav" if av is not None else None,
+        **STATS,
+        "stream_share": round(STATS["captures_streamed"] / captures, 3) if captures else 0.0,
+    }
@@ -0,0 +1,129 @@
+import os
+import shlex
+from typing import Dict, List, Optional, Tuple
+
+from agents.adb_utils import adb_shell
+from agents.tracing import span
+from neurorun.text_input import TextInput
+
+# Most actions the planner may chain into one batch; 1 keeps planning to one action per step
+GESTURE_BATCH_MAX = int(os.getenv("GESTURE_BATCH_MAX", "4"))
+
+# Pause after each kind of action before the next one in the same batch (seconds).
+# Taps usually open something (keyboard, sheet) that the next action depends on.
+GAP_AFTER = {"tap": 0.4, "swipe": 0.3, "key": 0.2, "text": 0.3}
+SWIPE_MS = 300
+
+
+class GestureBatch:
+    """
+    Several taps, swipes, keyevents and text entries compiled into one shell script and run in a
+    single `adb shell` round-trip, with the intended delays executed on the device.
+
+        batch = GestureBatch(serial, text_input)
+        batch.tap(540, 300)
+        await batch.text("Fried Rice")
+        batch.key(66)
+        batch.swipe_direction("down", 1080, 2400)
+        await batch.run()
+    """
+
+    def __init__(self, serial: Optional[str] = None, text_input: Optional[TextInput] = None):
+        self.serial = serial
+        self.text_input = text_input or TextInput(serial)
+        self.commands: List[str] = []
+        self.kinds: List[str] = []
+        # (backend, text) per text entry, so the caller can check what reached the field
+        self.typed: List[Tuple[str, str]] = []
+
+    def _add(self, kind: str, command: str, gap: Optional[float] = None):
+        if self.kinds:
+            pause = gap if gap is not None else GAP_AFTER.get(self.kinds[-1], 0.2)
+            if pause > 0:
+                self.commands.append(f"sleep {pause:g}")
+        self.commands.append(command)
+        self.kinds.append(kind)
+
+    def tap(self, x: int, y: int, gap: Optional[float] = None):
+        self._add("tap", f"input tap {int(x)} {int(y)}", gap)
+
+    def swipe(self, x1: int, y1: int, x2: int, y2: int, duration_ms: int = SWIPE_MS, gap: Optional[float] = None):
+        self._add("swipe", f"input swipe {int(x1)} {int(y1)} {int(x2)} {int(y2)} {int(duration_ms)}", gap)
+
+    def swipe_direction(self, direction: str, width: int, height: int, gap: Optional[float] = None):
+        """Content direction, like scrolling: "down" reveals what is below (finger moves up)."""
+        cx, cy = width // 2, height // 2
+        dx, dy = width // 3, height // 4
+        moves = {
+            "down": (cx, cy + dy, cx, cy - dy),
+            "up": (cx, cy - dy, cx, cy + dy),
+            "right": (cx + dx, cy, cx - dx, cy),
+            "left": (cx - dx, cy, cx + dx, cy),
+        }
+        self.swipe(*moves.get(direction, moves["down"]), gap=gap)
+
+    def key(self, code, gap: Optional[float] = None):
+        self._add("key", f"input keyevent {shlex.quote(str(code))}", gap)
+
+    async def text(self, text: str, gap: Optional[float] = None) -> str:
+        backend, command = await self.text_input.shell_command(text)
+        self._add("text", command, gap)
+        self.typed.append((backend, text))
+        return backend
+
+    def sleep(self, seconds: float):
+        if seconds > 0:
+            self.commands.append(f"sleep {seconds:g}")
+
+    def script(self) -> str:
+        return "; ".join(self.commands)
+
+    async def run(self, timeout: float = 30) -> str:
+        if not self.commands:
+            return ""
+        with span("gesture_batch", actions=len(self.kinds)):
+            return await adb_shell(self.script(), serial=self.serial, timeout=timeout)
+
+
+async def add_action(batch: GestureBatch, action: Dict, width: int, height: int) -> str:
+    """
+    Appends one planner action (the same dict execute_action_direct takes) to `batch`.
+    Returns a short description, or "" for actions a batch can't express.
+    """
+    kind = action.get("type")
+    delay = action.get("delay_ms")
+    gap = delay / 1000 if isinstance(delay, (int, float)) else None
+
+    if kind == "tap":
+        box = action.get("bq_box")
+        if not box:
+            return ""
+        ymin, xmin, ymax, xmax = box
+        batch.tap((xmin + xmax) / 2 / 1000 * width, (ymin + ymax) / 2 / 1000 * height, gap)
+        return "Tapped"
+    if kind == "type":
+        text = action.get("text", "")
+        if action.get("bq_box"):
+            # Focus the field first
+            ymin, xmin, ymax, xmax = action["bq_box"]
+            batch.tap((xmin + xmax) / 2 / 1000 * width, (ymin + ymax) / 2 / 1000 * height)
+        backend = await batch.text(text, gap)
+        if action.get("submit", True):
+            batch.key(66)
+        return f"Typed {text} ({backend})"
+    if kind in ("swipe", "scroll"):
+        batch.swipe_direction(action.get("direction", "down"), width, height, gap)
+        return f"Swiped {action.get('direction', 'down')}"
+    if kind == "key":
+        batch.key(action.get("keycode", ""), gap)
+        return f"Key {action.get('keycode', '')}"
+    if kind == "back":
+        batch.key(4, gap)
+        return "Back"
+    if kind == "home":
+        batch.key(3, gap)
+        return "Home"
+    if kind == "wait":
+        batch.sleep(2)
+        return "Waited"
+    return ""
@@ -17,22 +17,52 @@ except ImportError:
     print("Critical: DroidRun SDK not found.")
     raise
 
+from agents.device_registry import DEVICES
+from agents.droid_runner import run_droid_agent
+from agents.llm_limiter import TASK, limited_llm
+from agents.model_cascade import CASCADE, CASCADE_MIN_CONFIDENCE
+from agents.tracing import span, traced, traced_sleep
+from agents.locator_cache import LOCATORS, goal_values
+from agents.popup_handler import POPUP_MAX_IN_A_ROW, POPUPS
+from agents.ui_tree import UINode, compact, dump_ui, overlay_bounds, parse_nodes, screen_package, tree_sufficient
+from agents.adb_utils import adb_shell
+from neurorun import frame_stream
+from neurorun.frame_stream import FrameStream, screencap_image
+from neurorun.gestures import GESTURE_BATCH_MAX, GestureBatch, add_action
+from neurorun.text_input import TextInput
+from neurorun.trace import TraceRecorder
+
 class NeuroOrchestrator:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, record_to: Optional[str] = None, grounding: Optional[str] = None):
         self.api_key = api_key
         if not api_key:
             raise ValueError("API Key required for NeuroOrchestrator")
         
-        # Configure Gemini for Vision/Planning
+        # Configure Gemini for Vision/Planning; models come from the cascade (cheap first, see agents/model_cascade.py)
         genai.configure(api_key=self.api_key)
-        self.planner_model = genai.GenerativeModel('gemini-2.0-flash-exp') # Use flash for speed, or pro for reasoning
         
         self.device_serial = None
         self.tools = None
+        self.text_input: Optional[TextInput] = None
+        self.frame_stream: Optional[FrameStream] = None
         self.width = 1080 
         self.height = 2400
         self.step_limit = 15
+        self.settle_delay = 2
         self.history: List[Dict] = []
+        # Path of a trace zip to record missions into (see neurorun/trace.py)
+        self.record_to = record_to or os.getenv("NEURO_TRACE_PATH")
+        # "hybrid": plan from the accessibility tree, screenshot only when the tree can't describe the screen
+        # "vision": screenshot every step
+        self.grounding = grounding or os.getenv("NEURO_GROUNDING", "hybrid")
+        # App on screen at the last UI dump, for the locator cache
+        self.current_package: Optional[str] = None
+        self.current_version = "unknown"
+        # Every parsed node of the last dump, including screens too sparse to plan from (dialogs)
+        self.screen_nodes: List[UINode] = []
+        self.screen_overlay: Optional[List[int]] = None
+        # What the screen looked like when the last step was planned, to spot actions that changed nothing
+        self.last_screen: Optional[tuple] = None
 
     async def connect(self):
         """Connect to device and initialize tools"""
@@ -45,43 +75,218 @@ class NeuroOrchestrator:
             self.device_serial = devices[0].serial
             print(f"NeuroOrchestrator: Connected to {self.device_serial}")
             self.tools = AdbTools(serial=self.device_serial)
+            self.text_input = TextInput(self.device_serial)
             
-            # Get Resolution
-            try:
-                # Direct ADB call to get size
-                stream = os.popen(f"adb -s {self.device_serial} shell wm size")
-                out = stream.read().strip() # e.g., Physical size: 1080x2400
-                if "size:" in out:
-                    res = out.split("size:")[1].strip().split("x")
-                    self.width = int(res[0])
-                    self.height = int(res[1])
-                    print(f"Detected Resolution: {self.width}x{self.height}")
-                else:
-                     self.width = 1080
-                     self.height = 2400
-            except:
-                self.width = 1080
-                self.height = 2400
+            # Resolution from the registry: probed once per device, not once per mission
+            profile = await DEVICES.profile(self.device_serial)
+            if profile and profile.width:
+                await DEVICES.orientation(self.device_serial)
+                self.width, self.height = profile.screen_size()
+                print(f"Detected Resolution: {self.width}x{self.height}")
+            else:
+                print(f"Resolution unknown, assuming {self.width}x{self.height}")
+
+            if frame_stream.NEURO_FRAME_STREAM:
+                # Started now so a decoded frame is waiting by the time the planner first needs one
+                self.frame_stream = FrameStream(self.device_serial, self.width, self.height)
+                await self.frame_stream.start()
             return True
         except Exception as e:
             print(f"NeuroOrchestrator Connection Error: {e}")
             return False
 
+    @traced("capture_state_image")
     async def capture_state_image(self) -> Optional[Image.Image]:
         try:
-            path = f"neuro_state_{int(time.time())}.png"
-            os.system(f"adb -s {self.device_serial} shell screencap -p /sdcard/neuro_cap.png")
-            os.system(f"adb -s {self.device_serial} pull /sdcard/neuro_cap.png {path}")
-            
-            if os.path.exists(path):
-                img = Image.open(path)
-                return img
-            return None
+            if self.frame_stream:
+                img = await self.frame_stream.capture()
+                if img is not None:
+                    return img
+                frame_stream.STATS["captures_fallback"] += 1
+            return await screencap_image(self.device_serial)
         except Exception as e:
             print(f"Screenshot failed: {e}")
             return None
 
-    def plan_next_step(self, main_goal: str, current_image: Image.Image, step_count: int) -> Dict:
+    async def capture_ui_nodes(self) -> Optional[List[UINode]]:
+        """Pruned UI hierarchy, or None when it is missing or not enough to plan from."""
+        try:
+            xml = await dump_ui(self.device_serial)
+            if not xml:
+                return None
+            self.current_package = screen_package(xml)
+            if self.current_package:
+                self.current_version = await LOCATORS.app_version(self.current_package, self.device_serial)
+            nodes = parse_nodes(xml, self.width, self.height)
+            self.screen_nodes = nodes
+            self.screen_overlay = overlay_bounds(xml)
+            return nodes if tree_sufficient(nodes, xml) else None
+        except Exception as e:
+            print(f"UI dump failed: {e}")
+            return None
+
+    async def plan_from_tree(self, main_goal: str, nodes: List[UINode], step_count: int,
+                             start_tier: int = 0) -> Optional[Dict]:
+        """
+        Text-only planning over the numbered node list. Taps reference a node and are resolved to its bounds.
+        Returns None if the planner asks for a screenshot or the reply is unusable.
+        """
+        prompt = f"""
+        You are an advanced Android Automation Brain.
+        Main Goal: {main_goal}
+        Step: {step_count}/{self.step_limit}
+        History: {self._history_summary()}
+
+        The current screen, as a numbered list of on-screen elements:
+        {compact(nodes)}
+
+        Identify the NEXT single action.
+        - To tap or type into an element, give its number as "node".
+        - If the list does not show what you need (images, maps, canvas content), reply with status "need_vision".
+{self._batch_hint()}
+        
+        Output valid JSON only:
+        {{
+            "analysis": "Thinking process...",
+            "confidence": 0.0-1.0 (how sure you are this is the right next action),
+            "status": "continue" | "done" | "failed" | "need_vision",
+            "action": {{
+                "type": "tap" | "type" | "swipe" | "key" | "wait" | "back" | "home" | "done",
+                "node": 0 (REQUIRED for 'tap', OPTIONAL for 'type'),
+                "target": "short generic name of that element, e.g. 'search field', 'add to cart'",
+                "text": "..." (REQUIRED for 'type'),
+                "direction": "up" | "down" | "left" | "right" (REQUIRED for 'swipe', the way the content should move),
+                "keycode": "..." (OPTIONAL for 'key'),
+                "data": {{...}} (REQUIRED if status='done', extracted info)
+            }}
+        }}
+        """
+
+        try:
+            plan, record = await CASCADE.run(
+                lambda model: CASCADE.model(model).generate_content_async(prompt),
+                self._judge_plan, api_key=self.api_key, priority=TASK, persona="neuro",
+                start_tier=start_tier, start_reason="no_screen_change" if start_tier else "",
+                prompt_chars=len(prompt), grounding="tree",
+            )
+            plan.update(model=record["model"], cost_usd=record["cost_usd"])
+        except Exception as e:
+            print(f"Tree Planning Error: {e}")
+            return None
+
+        if plan.get("status") == "need_vision":
+            return None
+
+        actions = plan.get("actions") if isinstance(plan.get("actions"), list) else []
+        for action in [plan.get("action", {})] + [a for a in actions if isinstance(a, dict)]:
+            if not self._resolve_node(action, nodes):
+                return None
+        return plan
+
+    def _resolve_node(self, action: Dict, nodes: List[UINode]) -> bool:
+        """Replaces a tree plan's "node" index with its box (and learns the locator). False if the index is bad."""
+        if "node" not in action:
+            return True
+        index = action.pop("node")
+        node = nodes[index] if isinstance(index, int) and 0 <= index < len(nodes) else None
+        if node is None:
+            return False
+        action["bq_box"] = self._node_box(node)
+        action["target"] = action.get("target") or node.label or node.resource_id
+        if self.current_package:
+            LOCATORS.learn(self.current_package, self.current_version, action["target"], node)
+        return True
+
+    @staticmethod
+    def _judge_plan(response) -> tuple:
+        """Cascade judge for planner replies: escalate on unparseable JSON or low self-reported confidence."""
+        try:
+            text = response.text.strip()
+            if "```json" in text:
+                text = text.split("```json")[1].split("```")[0]
+            elif "```" in text:
+                text = text.split("```")[1].split("```")[0]
+            plan = json.loads(text)
+        except Exception:
+            return None, "parse_failure"
+        if not isinstance(plan, dict) or "status" not in plan:
+            return None, "parse_failure"
+        confidence = plan.get("confidence")
+        if isinstance(confidence, (int, float)) and confidence < CASCADE_MIN_CONFIDENCE and plan["status"] != "need_vision":
+            return plan, "low_confidence"
+        return plan, None
+
+    def _unchanged(self, nodes: Optional[List[UINode]] = None, img: Optional[Image.Image] = None) -> bool:
+        """
+        True when the screen is the same as when the previous step was planned, i.e. its action did nothing.
+        The next plan then starts on the stronger model.
+        """
+        if nodes:
+            screen = ("nodes", compact(nodes))
+            same = self.last_screen is not None and self.last_screen == screen
+        elif img is not None:
+            screen = ("image", img.convert("L").resize((36, 80)))
+            same = (self.last_screen is not None and self.last_screen[0] == "image"
+                    and frame_stream.frame_diff(self.last_screen[1], screen[1]) < 1.0)
+        else:
+            return False
+        self.last_screen = screen
+        last_action = self.history[-1]["action"].get("type") if self.history else "wait"
+        return same and last_action != "wait"
+
+    def _batch_hint(self) -> str:
+        if GESTURE_BATCH_MAX <= 1:
+            return ""
+        return (f'        - If you are sure of the next few actions on THIS screen (e.g. tap search field, type, swipe down), '
+                f'you may also return them in order as "actions": [...] (max {GESTURE_BATCH_MAX}, same format as "action"; '
+                f'"action" is then the first of them). Never chain past a screen you have not seen.')
+
+    def _node_box(self, node: UINode) -> List[int]:
+        # Same 0-1000 box the vision planner produces, so execution and traces don't care where it came from
+        x1, y1, x2, y2 = node.bounds
+        return [y1 * 1000 // self.height, x1 * 1000 // self.width, y2 * 1000 // self.height, x2 * 1000 // self.width]
+
+    def plan_from_cache(self, goal: str, trajectory: List[Dict], index: int, nodes: List[UINode]) -> Optional[Dict]:
+        """
+        Next step of a previously successful trajectory, if its target is on screen right now.
+        None on any miss; the caller then plans with the LLM for the rest of the mission.
+        """
+        if index >= len(trajectory):
+            return None
+        step = trajectory[index]
+        action = {k: v for k, v in step.items() if k in ("type", "keycode", "target")}
+
+        if step["type"] == "tap":
+            node = LOCATORS.resolve(self.current_package, self.current_version, step.get("target"), nodes)
+            if node is None:
+                return None
+            action["bq_box"] = self._node_box(node)
+        elif step["type"] == "type":
+            text = step.get("text", "")
+            for i, value in enumerate(goal_values(goal)):
+                text = text.replace("{q%d}" % i, value)
+            action["text"] = text
+
+        return {"status": "continue", "analysis": f"Cached step {index + 1}: {step['type']} {step.get('target', '')}",
+                "action": action, "cached": True}
+
+    def _history_summary(self) -> List[Dict]:
+        """Past actions for the prompt, with the error attached to the ones that failed."""
+        return [dict(h["action"], error=h["error"]) if h.get("error") else h["action"] for h in self.history]
+
+    def _remember_trajectory(self, package: str, goal: str):
+        """Keeps the replayable prefix: taps need a learned target, everything else is positional."""
+        steps = []
+        for h in self.history:
+            action = h["action"]
+            if h.get("error") or (action.get("type") == "tap" and not action.get("target")):
+                break
+            steps.append({k: v for k, v in action.items() if k in ("type", "target", "text", "keycode")})
+        if steps:
+            LOCATORS.remember_trajectory(package, goal, steps)
+
+    async def plan_next_step(self, main_goal: str, current_image: Image.Image, step_count: int,
+                             start_tier: int = 0) -> Dict:
         """
         Uses Vision to output exact COORDINATES or TEXT args.
         """
@@ -89,50 +294,43 @@ class NeuroOrchestrator:
         You are an advanced Android Automation Brain.
         Main Goal: {main_goal}
         Step: {step_count}/{self.step_limit}
-        History: {[h['action'] for h in self.history]}
+        History: {self._history_summary()}
 
         Analyze the screenshot. The device resolution is implied 1000x1000 relative for coordinates.
         Identify the NEXT single action.
         - If the keyboard is open and blocking the view, use "back" to close it ONLY if you are NOT currently typing/searching.
         - If you are searching, DO NOT use "back" as it might exit the search. Instead, proceed to tap the result IF VISIBLE.
         - If the desired item (like 'Fries' image) is ALREADY visible, prefer 'tap' over 'type'.
+{self._batch_hint()}
         
         Output valid JSON only:
         {{
             "analysis": "Thinking process...",
+            "confidence": 0.0-1.0 (how sure you are this is the right next action),
             "status": "continue" | "done" | "failed",
             "action": {{
-                "type": "tap" | "type" | "key" | "wait" | "back" | "home" | "done",
+                "type": "tap" | "type" | "swipe" | "key" | "wait" | "back" | "home" | "done",
                 "bq_box": [ymin, xmin, ymax, xmax] (0-1000 scale) - REQUIRED for 'tap', OPTIONAL for 'type' (to tap first),
                 "text": "..." (REQUIRED for 'type'),
+                "direction": "up" | "down" | "left" | "right" (REQUIRED for 'swipe', the way the content should move),
                 "keycode": "..." (OPTIONAL for 'key'),
                 "data": {{...}} (REQUIRED if status='done', extracted info)
             }}
         }}
         """
         
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # Add delay to respect rate limits
-                if attempt > 0:
-                    time.sleep(2) 
-                
-                response = self.planner_model.generate_content([prompt, current_image])
-                text = response.text.strip()
-                if "```json" in text:
-                    text = text.split("```json")[1].split("```")[0]
-                elif "```" in text:
-                    text = text.split("```")[1].split("```")[0]
-                return json.loads(text)
-            except Exception as e:
-                print(f"Planning Error (Attempt {attempt+1}): {e}")
-                if "429" in str(e) or "ResourceExhausted" in str(e) or "quota" in str(e).lower():
-                    wait_time = (attempt + 1) * 5
-                    print(f"Quota hit. Waiting {wait_time}s...")
-                    time.sleep(wait_time)
-                else:
-                    break
+        try:
+            # Rate limiting and 429/5xx retries are shared with every other Gemini caller
+            plan, record = await CASCADE.run(
+                lambda model: CASCADE.model(model).generate_content_async([prompt, current_image]),
+                self._judge_plan, api_key=self.api_key, priority=TASK, persona="neuro",
+                start_tier=start_tier, start_reason="no_screen_change" if start_tier else "",
+                prompt_chars=len(prompt), grounding="vision",
+            )
+            plan.update(model=record["model"], cost_usd=record["cost_usd"])
+            return plan
+        except Exception as e:
+            print(f"Planning Error: {e}")
         
         return {"status": "failed", "analysis": "Failed after retries", "action": {"type": "wait"}}
 
@@ -140,51 +338,44 @@ class NeuroOrchestrator:
         """
         Executes action directly via ADB.
         """
-        tipo = action.get('type')
-        print(f"  [Act] Executing: {tipo} | {action}")
-        
-        if tipo == 'tap':
-            box = action.get('bq_box')
-            if box:
-                # box is [ymin, xmin, ymax, xmax] 0-1000
-                ymin, xmin, ymax, xmax = box
-                cx = (xmin + xmax) / 2 / 1000 * self.width
-                cy = (ymin + ymax) / 2 / 1000 * self.height
-                cmd = f"adb -s {self.device_serial} shell input tap {int(cx)} {int(cy)}"
-                os.system(cmd)
-                return "Tapped"
-                
-        elif tipo == 'type':
-            text = action.get('text', '')
-            
-            # Standard input text is most compatible with standard keyboards
-            # We escape spaces
-            clean_text = text.replace(" ", "%s")
-            os.system(f"adb -s {self.device_serial} shell input text {clean_text}")
-            
-            # Hit Enter to search
-            time.sleep(1.5)
-            os.system(f"adb -s {self.device_serial} shell input keyevent 66")
-            return f"Typed {text}"
-            
-        elif tipo == 'key':
-            code = action.get('keycode', '')
-            os.system(f"adb -s {self.device_serial} shell input keyevent {code}")
-            return f"Key {code}"
-            
-        elif tipo == 'back':
-            os.system(f"adb -s {self.device_serial} shell input keyevent 4")
-            return "Back (Close Keyboard/Nav)"
-            
-        elif tipo == 'home':
-            os.system(f"adb -s {self.device_serial} shell input keyevent 3")
-            return "Home"
-            
-        elif tipo == 'wait':
-            time.sleep(2)
-            return "Waited"
-            
-        return "Unknown Action"
+        results = await self.execute_actions([action])
+        return results[0]
+
+    @traced("execute_actions")
+    async def execute_actions(self, actions: List[Dict]) -> List[str]:
+        """
+        Runs one or more actions as a single gesture batch: one `adb shell` round-trip,
+        with the delays between actions executed on the device.
+        """
+        batch = GestureBatch(self.device_serial, self.text_input)
+        results = []
+        for action in actions:
+            print(f"  [Act] Executing: {action.get('type')} | {action}")
+            try:
+                result = await add_action(batch, action, self.width, self.height)
+            except ValueError as e:
+                # e.g. non-ASCII text and no broadcast IME: a failed step the planner can react to
+                print(f"  [Act] Cannot execute: {e}")
+                result = f"Failed: {e}"
+            results.append(result or "Unknown Action")
+
+        output = await batch.run()
+        if self.frame_stream:
+            self.frame_stream.mark_action()
+        if "am broadcast" in batch.script() and "Broadcast completed" not in output:
+            print(f"[TextInput] Broadcast not confirmed in batch output: {output.strip()[:80]}")
+        for backend, text in batch.typed:
+            if backend == "ime" and not await batch.text_input.confirm(text):
+                results = [f"Failed: '{text}' did not reach the field" if r.startswith(f"Typed {text} ") else r
+                           for r in results]
+        return results
+
+    def _plan_actions(self, plan: Dict) -> List[Dict]:
+        """The plan's "actions" sequence when it has one, else its single "action"."""
+        actions = plan.get("actions")
+        if isinstance(actions, list) and actions:
+            return [a for a in actions if isinstance(a, dict)][:GESTURE_BATCH_MAX]
+        return [plan.get("action", {})]
 
     async def execute_subtask(self, instruction: str):
         """
@@ -193,11 +384,12 @@ class NeuroOrchestrator:
         print(f"  [Executor] Running: {instruction}")
         
         # Load LLM for the agent (Executor)
-        llm = load_llm(
-            provider_name="GoogleGenAI", 
-            model="models/gemini-2.0-flash", 
-            api_key=self.api_key
-        )
+        with span("load_llm"):
+            llm = limited_llm(load_llm(
+                provider_name="GoogleGenAI", 
+                model="models/gemini-2.0-flash", 
+                api_key=self.api_key
+            ), self.api_key, "models/gemini-2.0-flash")
         
         # We use a short max_steps because this is a sub-task
         agent = DroidAgent(
@@ -209,41 +401,92 @@ class NeuroOrchestrator:
             vision=False 
         )
         
-        handler = agent.run()
-        if hasattr(handler, "stream_events"):
-            async for event in handler.stream_events():
-                pass
-        result = await handler
-        return result
+        return await run_droid_agent(agent, "Executor")
 
     async def run_mission(self, goal: str):
         print(f"NeuroOrchestrator Mission (Direct Mode): {goal}")
         if not await self.connect():
             return {"status": "failed", "error": "Connection Failed"}
 
-        for i in range(1, self.step_limit + 1):
+        recorder = TraceRecorder(self.record_to, goal) if self.record_to else None
+        try:
+            return await self._run_steps(goal, recorder)
+        finally:
+            if recorder:
+                try:
+                    recorder.save(self.width, self.height)
+                except Exception as e:
+                    print(f"[Trace] Failed to save trace: {e}")
+            LOCATORS.save()
+            if self.text_input:
+                await self.text_input.restore()
+            if self.frame_stream:
+                await self.frame_stream.stop()
+                self.frame_stream = None
+
+    async def _run_steps(self, goal: str, recorder: Optional[TraceRecorder]):
+        trajectory = None
+        mission_package = None
+        i = 0
+        dismissed = 0
+        while i < self.step_limit:
+            self.screen_nodes = []
+            nodes = await self.capture_ui_nodes() if self.grounding == "hybrid" else None
+            # Dismissals don't use up mission steps; a popup that keeps coming back goes to the planner
+            if dismissed < POPUP_MAX_IN_A_ROW and self.screen_nodes and await POPUPS.check(
+                    self.device_serial, self.screen_nodes, self.current_package, self.screen_overlay):
+                dismissed += 1
+                await traced_sleep(1)
+                continue
+            dismissed = 0
+            i += 1
             print(f"\n--- Step {i}/{self.step_limit} ---")
-            
-            img = await self.capture_state_image()
-            if not img:
-                return {"status": "failed", "error": "Vision Lost"}
-                
-            plan = self.plan_next_step(goal, img, i)
-            print(f"Brain: {plan.get('analysis', '...')}")
+
+            plan = None
+            if nodes and self.current_package:
+                if trajectory is None:
+                    mission_package = self.current_package
+                    trajectory = LOCATORS.trajectory(mission_package, goal)
+                # Only while every earlier step came from the cache; after the first miss the LLM drives
+                if all(h.get("cached") for h in self.history):
+                    plan = self.plan_from_cache(goal, trajectory, len(self.history), nodes)
+            stuck = self._unchanged(nodes=self.screen_nodes) if self.screen_nodes else None
+            if plan is None and nodes:
+                plan = await self.plan_from_tree(goal, nodes, i, start_tier=int(bool(stuck)))
+
+            img = None
+            if plan is None:
+                img = await self.capture_state_image()
+                if not img:
+                    return {"status": "failed", "error": "Vision Lost"}
+                if stuck is None:
+                    stuck = self._unchanged(img=img)
+                plan = await self.plan_next_step(goal, img, i, start_tier=int(bool(stuck)))
+
+            print(f"Brain ({'tree' if img is None else 'vision'}, {plan.get('model', 'cache')}): {plan.get('analysis', '...')}")
+            if recorder:
+                recorder.record(img, plan, nodes)
             
             action = plan.get('action', {})
             status = plan.get('status', 'continue')
             
             if status == 'done':
                 print("Mission Success!")
+                if mission_package:
+                    self._remember_trajectory(mission_package, goal)
                 return {"status": "success", "data": action.get("data", {})}
             if status == 'failed':
                 return {"status": "failed", "error": plan.get("analysis")}
             
-            # Act Direct
-            await self.execute_action_direct(action)
-            
-            self.history.append({"action": action})
-            time.sleep(2) # Stabilize UI
+            # Act Direct: every action of the step in one device round-trip
+            actions = self._plan_actions(plan)
+            results = await self.execute_actions(actions)
+
+            for a, result in zip(actions, results):
+                entry = {"action": a, "cached": bool(plan.get("cached")), "model": plan.get("model")}
+                if result.startswith("Failed"):
+                    entry["error"] = result
+                self.history.append(entry)
+            await traced_sleep(self.settle_delay) # Stabilize UI
 
         return {"status": "timeout", "error": "Limit reached"}
@@ -0,0 +1,75 @@
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+from agents.ui_tree import UINode
+from neurorun.orchestrator import NeuroOrchestrator
+from neurorun.trace import Trace
+
+
+class ReplayOrchestrator(NeuroOrchestrator):
+    """
+    NeuroOrchestrator against a recorded trace instead of a phone.
+    - capture_state_image returns the recorded frame for the current step.
+    - execute_actions advances to the recorded result frame (and counts steps whose actions differ).
+    - planner="recorded" replays the recorded planner responses; planner="live" calls Gemini on the recorded frames.
+    """
+
+    def __init__(self, trace_path: str, api_key: str = "replay", planner: str = "recorded"):
+        super().__init__(api_key=api_key)
+        self.trace = Trace(trace_path)
+        self.planner_mode = planner
+        self.cursor = 0
+        self.divergences = 0
+        self.settle_delay = 0
+        self.record_to = None
+        self.step_limit = max(self.step_limit, len(self.trace.steps))
+
+    async def connect(self):
+        self.device_serial = "replay"
+        self.width = self.trace.meta.get("width", self.width)
+        self.height = self.trace.meta.get("height", self.height)
+        self.cursor = 0
+        self.history = []
+        self.last_screen = None
+        return True
+
+    def _current(self) -> Optional[Dict[str, Any]]:
+        if self.cursor < len(self.trace.steps):
+            return self.trace.steps[self.cursor]
+        return None
+
+    async def capture_ui_nodes(self) -> Optional[List[UINode]]:
+        step = self._current()
+        if step is None or not step.get("ui"):
+            return None
+        return [UINode.from_dict(n) for n in step["ui"]]
+
+    async def capture_state_image(self) -> Optional[Image.Image]:
+        step = self._current()
+        if step is None or not step.get("frame"):
+            return None
+        return self.trace.frame(step["frame"])
+
+    async def plan_from_tree(self, main_goal: str, nodes: List[UINode], step_count: int,
+                             start_tier: int = 0) -> Optional[Dict]:
+        step = self._current()
+        if self.planner_mode == "recorded" and step is not None:
+            return step["plan"] if step.get("frame") is None else None
+        return await super().plan_from_tree(main_goal, nodes, step_count, start_tier)
+
+    async def plan_next_step(self, main_goal: str, current_image: Image.Image, step_count: int,
+                             start_tier: int = 0) -> Dict:
+        step = self._current()
+        if self.planner_mode == "recorded" and step is not None:
+            return step["plan"]
+        return await super().plan_next_step(main_goal, current_image, step_count, start_tier)
+
+    async def execute_actions(self, actions: List[Dict]) -> List[str]:
+        step = self._current()
+        if step is None:
+            return ["Trace exhausted"] * len(actions)
+        if actions != self._plan_actions(step["plan"]):
+            self.divergences += 1
+        self.cursor += 1
+        return [f"Replayed {a.get('type')}" for a in actions]
@@ -0,0 +1,185 @@
+import asyncio
+import base64
+import os
+import re
+from typing import Optional, Tuple
+
+from agents.adb_utils import adb_shell
+from agents.tracing import span
+from agents.ui_tree import dump_ui
+
+# Broadcast-driven keyboards we know how to drive: IME id -> broadcast action taking a base64 "msg" extra
+BROADCAST_IMES = [
+    ("com.android.adbkeyboard/.AdbIME", "ADB_INPUT_B64"),
+    ("com.droidrun.portal/.DroidrunKeyboardIME", "com.droidrun.portal.DROIDRUN_INPUT_B64"),
+]
+# Set to False to always use `input text`
+TEXT_INPUT_IME = os.getenv("TEXT_INPUT_IME", "True").lower() == "true"
+
+# `ime set` returns before the switch is applied: poll default_input_method this often, this many times
+IME_SWITCH_POLL = 0.2
+IME_SWITCH_TRIES = 10
+# Then give the new IME time to bind to the focused field; a broadcast before that is dropped
+IME_BIND_SETTLE = 0.3
+
+_FOCUSED = re.compile(r'<node [^>]*focused="true"[^>]*>')
+_TEXT_ATTR = re.compile(r'\btext="([^"]*)"')
+
+# Characters the device shell would interpret inside `input text ...`
+_SHELL_SPECIAL = set("\\'\"`$&|;<>()[]{}*?!~#")
+
+
+def escape_input_text(text: str) -> Optional[str]:
+    """
+    Argument for `adb shell input text`, or None when it can't carry the string
+    (`input text` only injects ASCII; Hindi, emoji etc. need the IME).
+    """
+    if not text.isascii():
+        return None
+    out = []
+    for ch in text:
+        if ch == " ":
+            out.append("%s")
+        elif ch in _SHELL_SPECIAL:
+            out.append("\\" + ch)
+        elif ch == "\n":
+            continue
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+class TextInput:
+    """
+    Types whole strings in one call through a broadcast IME when one is installed, so entry time
+    does not grow with string length and any Unicode text works. Falls back to escaped `input text`.
+    """
+
+    def __init__(self, serial: Optional[str] = None):
+        self.serial = serial
+        self.ime: Optional[Tuple[str, str]] = None
+        self.previous_ime: Optional[str] = None
+        self.detected = False
+        # Set when we just switched keyboards: the next entry is checked against the field
+        self.switched = False
+
+    async def detect(self) -> Optional[str]:
+        """Picks the first known broadcast IME that is installed. Returns its id."""
+        self.detected = True
+        if not TEXT_INPUT_IME:
+            return None
+        try:
+            installed = await adb_shell("ime", "list", "-a", "-s", serial=self.serial, timeout=5)
+        except Exception as e:
+            print(f"[TextInput] IME detection failed: {e}")
+            return None
+        for ime_id, action in BROADCAST_IMES:
+            if ime_id in installed.split():
+                self.ime = (ime_id, action)
+                print(f"[TextInput] Using broadcast IME {ime_id}")
+                return ime_id
+        print("[TextInput] No broadcast IME installed, using `input text`")
+        return None
+
+    async def _activate(self):
+        ime_id = self.ime[0]
+        current = (await adb_shell("settings", "get", "secure", "default_input_method", serial=self.serial, timeout=5)).strip()
+        if current == ime_id:
+            return
+        if self.previous_ime is None:
+            self.previous_ime = current
+        await adb_shell("ime", "enable", ime_id, serial=self.serial, timeout=5)
+        await adb_shell("ime", "set", ime_id, serial=self.serial, timeout=5)
+        for _ in range(IME_SWITCH_TRIES):
+            await asyncio.sleep(IME_SWITCH_POLL)
+            current = (await adb_shell("settings", "get", "secure", "default_input_method",
+                                       serial=self.serial, timeout=5)).strip()
+            if current == ime_id:
+                break
+        else:
+            raise RuntimeError(f"IME still {current} after `ime set`")
+        await asyncio.sleep(IME_BIND_SETTLE)
+        self.switched = True
+
+    async def field_contains(self, text: str) -> Optional[bool]:
+        """
+        Whether the focused field now shows `text`, read from a fresh UI dump.
+        None when it can't be told (no dump, nothing focused, password fields).
+        """
+        xml = await dump_ui(self.serial)
+        m = _FOCUSED.search(xml or "")
+        if not m or 'password="true"' in m.group(0):
+            return None
+        shown = _TEXT_ATTR.search(m.group(0))
+        if shown is None:
+            return None
+        unescaped = shown.group(1).replace("&quot;", '"').replace("&apos;", "'").replace("&lt;", "<") \
+            .replace("&gt;", ">").replace("&amp;", "&")
+        return text.strip() in unescaped
+
+    async def confirm(self, text: str) -> bool:
+        """
+        After the first entry on a freshly switched IME, checks that the text reached the field
+        ("Broadcast completed" only means the broadcast was sent). True when it did or can't be told.
+        """
+        if not self.switched:
+            return True
+        self.switched = False
+        try:
+            found = await self.field_contains(text)
+        except Exception as e:
+            print(f"[TextInput] Could not verify entry: {e}")
+            return True
+        if found is False:
+            print("[TextInput] Text did not reach the field after the IME switch")
+        return found is not False
+
+    async def shell_command(self, text: str) -> Tuple[str, str]:
+        """
+        (backend, device shell command) that types `text` into the focused field, switching to the
+        broadcast IME first if we have one. Used directly and by gesture batches.
+        """
+        if not self.detected:
+            await self.detect()
+
+        if self.ime:
+            try:
+                await self._activate()
+                payload = base64.b64encode(text.encode("utf-8")).decode("ascii")
+                return "ime", f"am broadcast -a {self.ime[1]} --es msg {payload}"
+            except Exception as e:
+                print(f"[TextInput] IME activation failed ({e}), falling back")
+
+        escaped = escape_input_text(text)
+        if escaped is None:
+            raise ValueError(f"Cannot type non-ASCII text without a broadcast IME: {text!r}")
+        return "input_text", f"input text {escaped}"
+
+    async def type_text(self, text: str) -> str:
+        """Types into the focused field. Returns the backend used ("ime" or "input_text")."""
+        backend, command = await self.shell_command(text)
+        with span("text_input", backend=backend, chars=len(text)):
+            # One string so the device shell sees our escaping, not adb's argument joining
+            out = await adb_shell(command, serial=self.serial, timeout=15)
+        if backend == "ime" and "Broadcast completed" in out and not await self.confirm(text):
+            # The IME is bound by now; one more broadcast
+            out = await adb_shell(command, serial=self.serial, timeout=15)
+            if await self.field_contains(text) is False:
+                out = ""
+        if backend == "ime" and "Broadcast completed" not in out:
+            print(f"[TextInput] Broadcast not delivered ({out.strip()[:80]}), falling back")
+            escaped = escape_input_text(text)
+            if escaped is None:
+                raise ValueError(f"Broadcast IME failed and text is not ASCII: {text!r}")
+            await adb_shell(f"input text {escaped}", serial=self.serial, timeout=15)
+            return "input_text"
+        return backend
+
+    async def restore(self):
+        """Puts the user's keyboard back if we switched it."""
+        if self.previous_ime:
+            try:
+                await adb_shell("ime", "set", self.previous_ime, serial=self.serial, timeout=5)
+            except Exception as e:
+                print(f"[TextInput] Could not restore IME {self.previous_ime}: {e}")
+            self.previous_ime = None
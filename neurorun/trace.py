@@ -0,0 +1,82 @@
+import hashlib
+import io
+import json
+import time
+import zipfile
+from typing import Any, Dict, List, Optional
+
+from PIL import Image
+
+# Trace file layout (a single zip):
+#   meta.json          {"goal", "recorded_at", "width", "height", "steps"}
+#   steps.jsonl        one line per step: {"step", "frame", "plan", "action", "result_frame", "ui"}
+#   frames/<sha1>.png  each distinct frame once, referenced by hash from steps.jsonl
+
+
+def _frame_bytes(img: Image.Image) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
+
+
+class TraceRecorder:
+    """Collects (frame, planner response, action, resulting frame) for each step of a real mission."""
+
+    def __init__(self, path: str, goal: str):
+        self.path = path
+        self.goal = goal
+        self.frames: Dict[str, bytes] = {}
+        self.steps: List[Dict[str, Any]] = []
+
+    def _store(self, img: Image.Image) -> str:
+        data = _frame_bytes(img)
+        digest = hashlib.sha1(data).hexdigest()
+        # Identical screens (waits, no-op taps) are stored once
+        self.frames.setdefault(digest, data)
+        return digest
+
+    def record(self, img: Optional[Image.Image], plan: Dict[str, Any], nodes: Optional[List[Any]] = None):
+        # Tree-grounded steps have no screenshot; the pruned node list is kept instead
+        frame = self._store(img) if img is not None else None
+        # The frame we see now is the result of the previous step's action
+        if self.steps:
+            self.steps[-1]["result_frame"] = frame
+        self.steps.append({
+            "step": len(self.steps) + 1,
+            "frame": frame,
+            "plan": plan,
+            "action": plan.get("action", {}),
+            "result_frame": None,
+            "ui": [n.to_dict() for n in nodes] if nodes else None,
+        })
+
+    def save(self, width: int, height: int):
+        meta = {
+            "goal": self.goal,
+            "recorded_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "width": width,
+            "height": height,
+            "steps": len(self.steps),
+        }
+        with zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("meta.json", json.dumps(meta, indent=2))
+            zf.writestr("steps.jsonl", "\n".join(json.dumps(s) for s in self.steps))
+            for digest, data in self.frames.items():
+                zf.writestr(f"frames/{digest}.png", data)
+        print(f"[Trace] Saved {len(self.steps)} steps / {len(self.frames)} unique frames to {self.path}")
+
+
+class Trace:
+    def __init__(self, path: str):
+        with zipfile.ZipFile(path) as zf:
+            self.meta = json.loads(zf.read("meta.json"))
+            raw_steps = zf.read("steps.jsonl").decode()
+            self.steps = [json.loads(line) for line in raw_steps.splitlines() if line.strip()]
+            self.frames = {
+                name[len("frames/"):-len(".png")]: zf.read(name)
+                for name in zf.namelist() if name.startswith("frames/")
+            }
+
+    def frame(self, digest: str) -> Image.Image:
+        # Decoded fresh each time so preprocessing changes are measured on real decode work
+        return Image.open(io.BytesIO(self.frames[digest]))
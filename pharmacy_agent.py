@@ -10,6 +10,11 @@ from droidrun.agent.droid.droid_agent import DroidAgent
 from droidrun.agent.utils.llm_picker import load_llm
 from droidrun import AdbTools
 
+from agents.device_registry import DEVICES
+from agents.droid_runner import run_droid_agent
+from agents.llm_limiter import limited_llm
+from agents.tracing import span, traced_sleep
+
 load_dotenv()
 
 class PharmacyAgent:
@@ -46,7 +51,7 @@ class PharmacyAgent:
         )
         
         goal = (
-            f"Open '{app_name}'. Handle permissions. "
+            f"Open '{app_name}'. "
             f"Click Search. {instr_search} "
             f"Visually identify best result. Extract Price (numeric). "
             f"Return JSON: 'app', 'medicine', 'price', 'details'. Strict JSON."
@@ -55,7 +60,8 @@ class PharmacyAgent:
         k = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         prov = "GoogleGenAI" if self.provider == "gemini" else self.provider
 
-        llm = load_llm(provider_name=prov, model=self.model, api_key=k)
+        with span("load_llm"):
+            llm = limited_llm(load_llm(provider_name=prov, model=self.model, api_key=k), k, self.model)
         tool_set = await AdbTools.create()
 
         agent = DroidAgent(
@@ -70,7 +76,7 @@ class PharmacyAgent:
 
         try:
             print(f"[PharmaAgent] 🧠 Running Agent on {app_name} for {medicine}...")
-            res_obj = await agent.run()
+            res_obj = await run_droid_agent(agent, "PharmaAgent", app=app_name)
             
             if res_obj:
                 txt = str(getattr(res_obj, 'reason', getattr(res_obj, 'message', res_obj))).strip()
@@ -111,6 +117,7 @@ class PharmacyAgent:
                 found for requested in apps_filter 
                 if (found := next((a for a in default_apps if requested.lower() in a.lower()), None))
             ] or default_apps
+        target_apps = await DEVICES.installed(target_apps)
 
         med_list = []
         if isinstance(meds_input, list):
@@ -149,10 +156,10 @@ class PharmacyAgent:
                     complete = False
                     break 
                 
-                await asyncio.sleep(2)
+                await traced_sleep(2)
 
             basket_results[app] = {"total_cost": total, "items": items} if complete else {"status": "incomplete"}
-            await asyncio.sleep(3)
+            await traced_sleep(3)
 
         print(f"\n--- Final Aggregated Basket Results ---")
         
@@ -164,12 +171,18 @@ class PharmacyAgent:
             else:
                 print(f"{app}: Incomplete Basket")
 
+        best = None
         if valid_baskets:
             best = min(valid_baskets, key=lambda x: x["total"])
             print(f"\n🏆 Best Basket Deal: {best['app']} - ₹{best['total']:.2f}")
         else:
             print("\n❌ Could not determine best basket option.")
 
+        result = {"baskets": basket_results}
+        if best:
+            result["best_option"] = {"status": "success", **best}
+        return result
+
 async def main():
     p = argparse.ArgumentParser()
     p.add_argument("--meds", required=True)
@@ -10,6 +10,12 @@ from droidrun.agent.droid.droid_agent import DroidAgent
 from droidrun.agent.utils.llm_picker import load_llm
 from droidrun import AdbTools
 
+from agents.deep_links import DEEP_LINKS
+from agents.device_registry import DEVICES
+from agents.droid_runner import run_droid_agent
+from agents.llm_limiter import limited_llm
+from agents.tracing import span, traced_sleep
+
 load_dotenv()
 
 class RideComparisonAgent:
@@ -46,18 +52,24 @@ class RideComparisonAgent:
         app_key = app_name.lower()
         ride_keywords = kw_map.get(app_key, {}).get(preference, "Standard Ride")
 
+        landed = await DEEP_LINKS.open(app_name, "ride", pickup=pickup, drop=drop)
+        if landed:
+            opening = (f"'{app_name}' is already showing {landed}. "
+                       f"If pickup or drop is empty, enter Pickup: '{pickup}', Drop: '{drop}'. ")
+        else:
+            opening = f"Open '{app_name}'. " \
+                      f"Click 'Ride'/Search. Input Pickup: '{pickup}'. Input Drop: '{drop}'. "
+
         goals = {
             "book": (
-                f"Open '{app_name}'. Handle permissions if needed ('Allow'). "
-                f"Click 'Ride'/Search. Input Pickup: '{pickup}'. Input Drop: '{drop}'. "
+                f"{opening}"
                 f"Wait for options. Select CHEAPEST ride matching '{preference}' (Keywords: {ride_keywords}). "
                 f"Click Book/Confirm. Ensure Payment is 'Cash'. Confirm Booking. "
                 f"Wait for Driver Screen. Extract: Driver Name, Vehicle No, OTP. "
                 f"Return JSON: 'status', 'driver_details', 'cab_details', 'price', 'eta'."
             ),
             "compare": (
-                f"Open '{app_name}'. Handle permissions. "
-                f"Click 'Ride'/Search. Input Pickup: '{pickup}'. Input Drop: '{drop}'. "
+                f"{opening}"
                 f"Wait for list. SCAN for rides matching '{preference}' (Keywords: {ride_keywords}). "
                 f"Extract ride type, price, and ETA. "
                 f"Return JSON: 'app', 'ride_type', 'price', 'eta'. Strict JSON."
@@ -69,7 +81,8 @@ class RideComparisonAgent:
         key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
         p_name = "GoogleGenAI" if self.provider == "gemini" else self.provider
 
-        llm = load_llm(provider_name=p_name, model=self.model, api_key=key)
+        with span("load_llm"):
+            llm = limited_llm(load_llm(provider_name=p_name, model=self.model, api_key=key), key, self.model)
 
         try:
              from droidrun.config_manager import DroidrunConfig, AgentConfig, ManagerConfig, ExecutorConfig, TelemetryConfig
@@ -89,7 +102,7 @@ class RideComparisonAgent:
 
         try:
             print(f"[RideAgent] 🧠 Running Agent on {app_name}...")
-            resp = await agent.run()
+            resp = await run_droid_agent(agent, "RideAgent", app=app_name)
             
             if resp:
                 raw_json = str(getattr(resp, 'reason', resp)).strip()
@@ -123,12 +136,12 @@ class RideComparisonAgent:
             return res_payload
 
     async def compare_rides(self, pickup, drop, preference="cab"):
-        targets = ["Uber", "Ola"]
+        targets = await DEVICES.installed(["Uber", "Ola"])
         agg_results = {}
 
         for t in targets:
             agg_results[t] = await self.execute_task(t, pickup, drop, preference, action="compare")
-            await asyncio.sleep(3)
+            await traced_sleep(3)
 
         print("\n--- Final Aggregated Results ---")
         
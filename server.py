@@ -5,11 +5,11 @@ import uuid
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, PlainTextResponse
 
 from commerce_agent import CommerceAgent
 from ride_comparison_agent import RideComparisonAgent
@@ -23,6 +23,20 @@ from trip_visualizer import TripVisualizer
 from schemas import FullTripPlan
 
 from agents.agent_factory import AgentFactory
+from agents.backend_router import ROUTER
+from agents.cloud_client import BREAKER, close_client
+from agents.llm_limiter import LIMITER
+from agents.app_index import APPS
+from agents.deep_links import DEEP_LINKS
+from agents.device_registry import DEVICES
+from agents.locator_cache import LOCATORS
+from agents.model_cascade import CASCADE
+from agents.popup_handler import POPUPS
+from agents.task_log import bind_task_log, bind_task_steps
+from agents.tracing import bind_trace, render_prometheus, span, traced_sleep
+from agents.adb_utils import return_to_home
+from task_scheduler import TaskScheduler, QueueFullError
+from task_coalescer import TaskCoalescer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("DroidServer")
@@ -41,19 +55,27 @@ app.add_middleware(
 
 task_history: List[Dict[str, Any]] = []
 
-def add_task_record(task_id: str, persona: str, payload: Any):
+def add_task_record(task_id: str, persona: str, payload: Any, status: str = "running"):
     record = {
         "id": task_id,
         "persona": persona,
-        "status": "running",
+        "status": status,
         "created_at": datetime.now().isoformat(),
         "logs": [],
+        "steps": [],
+        "spans": [],
         "result": None,
         "payload": payload.dict()
     }
     task_history.insert(0, record)
     return record
 
+def get_task_record(task_id: str) -> Optional[Dict[str, Any]]:
+    for task in task_history:
+        if task["id"] == task_id:
+            return task
+    return None
+
 def update_task_status(task_id: str, status: str, result: Any = None):
     for task in task_history:
         if task["id"] == task_id:
@@ -82,19 +104,21 @@ class ConnectionManager:
         self.active_connections.remove(websocket)
 
     async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                pass
+        with span("ws.broadcast", per_task=False):
+            for connection in self.active_connections:
+                try:
+                    await connection.send_text(message)
+                except Exception:
+                    pass
 
     async def broadcast_json(self, data: Dict[str, Any]):
         message = json.dumps(data, default=str)
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                pass
+        with span("ws.broadcast", per_task=False):
+            for connection in self.active_connections:
+                try:
+                    await connection.send_text(message)
+                except Exception:
+                    pass
 
 manager = ConnectionManager()
 
@@ -122,6 +146,11 @@ class TaskPayload(BaseModel):
     user_interests: str = None
     end_date: Optional[str] = None
 
+    # Seconds before the task is cancelled. Defaults to a per-persona deadline.
+    timeout: Optional[int] = None
+    # Race cloud and local execution for latency-critical universal commands
+    hedge: bool = False
+
 class ChatPayload(BaseModel):
     session_id: str
     message: str
@@ -149,6 +178,26 @@ async def get_task_details(task_id: str):
             return task
     return {"error": "Task not found"}
 
+@app.delete("/tasks/{task_id}")
+async def cancel_task(task_id: str):
+    task = get_task_record(task_id)
+    if not task:
+        return {"error": "Task not found"}
+    if task["status"] not in ("queued", "running"):
+        return {"id": task_id, "status": task["status"], "message": "Task already finished"}
+
+    if task.get("coalesced_with"):
+        # Only stop listening; the shared execution keeps running for the other callers
+        coalescer.detach(task_id)
+        await finish_task(task_id, "cancelled", None)
+        return {"id": task_id, "status": "cancelled"}
+
+    state = scheduler.cancel(task_id)
+    if state == "cancelled":
+        # Never started, so there is no running coroutine to report completion
+        await finish_task(task_id, "cancelled", None)
+    return {"id": task_id, "status": state or task["status"]}
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
@@ -159,16 +208,58 @@ async def websocket_endpoint(websocket: WebSocket):
         manager.disconnect(websocket)
 
 async def log_and_broadcast(task_id: str, message: str):
-    append_task_log(task_id, message)
-    await manager.broadcast_json({
-        "type": "log",
-        "task_id": task_id,
-        "message": message
-    })
-
-async def run_agent_task(payload: TaskPayload):
-    task_id = str(uuid.uuid4())
-    add_task_record(task_id, payload.persona, payload)
+    # Coalesced duplicates see the leader's logs as their own
+    for tid in [task_id] + coalescer.followers_of(task_id):
+        append_task_log(tid, message)
+        await manager.broadcast_json({
+            "type": "log",
+            "task_id": tid,
+            "message": message
+        })
+
+async def record_step(task_id: str, step: Dict[str, Any]):
+    """Stores a structured agent step (kind, detail, timing) and streams it to the dashboard."""
+    for tid in [task_id] + coalescer.followers_of(task_id):
+        task = get_task_record(tid)
+        if task:
+            task["steps"].append(step)
+        await manager.broadcast_json({
+            "type": "step",
+            "task_id": tid,
+            "step": step
+        })
+
+async def finish_task(task_id: str, status: str, result: Any):
+    """Records the outcome and pushes it to the task and every coalesced duplicate."""
+    for tid in [task_id] + coalescer.finish(task_id, status, result):
+        update_task_status(tid, status, result)
+        await manager.broadcast_json({
+            "type": "complete",
+            "task_id": tid,
+            "status": status,
+            "result": result
+        })
+
+def trip_days(start: Optional[str], end: Optional[str], default: int = 3) -> int:
+    """Nights between the outbound and return dates (YYYY-MM-DD), or `default` when either is missing."""
+    try:
+        days = (datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")).days
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(days, 14))
+
+async def run_agent_task(payload: TaskPayload, task_id: Optional[str] = None):
+    task_id = task_id or str(uuid.uuid4())
+    if get_task_record(task_id):
+        for tid in [task_id] + coalescer.followers_of(task_id):
+            update_task_status(tid, "running")
+    else:
+        add_task_record(task_id, payload.persona, payload)
+
+    # Agents deep in the call stack (cloud job events, step streams) log to this task
+    bind_task_log(lambda message: log_and_broadcast(task_id, message))
+    bind_task_steps(lambda step: record_step(task_id, step))
+    bind_trace(payload.persona, get_task_record(task_id)["spans"])
     
     await manager.broadcast_json({
         "type": "start",
@@ -276,7 +367,7 @@ async def run_agent_task(payload: TaskPayload):
                       await log_and_broadcast(task_id, f"Checking {p}...")
                       res = await agent.execute_task(p, payload.food_item, "food item", action="search")
                       results[p.lower()] = res
-                      await asyncio.sleep(1)
+                      await traced_sleep(1)
                  
                  z_price = results.get('zomato', {}).get('data', {}).get('price', 'N/A')
                  s_price = results.get('swiggy', {}).get('data', {}).get('price', 'N/A')
@@ -336,7 +427,16 @@ async def run_agent_task(payload: TaskPayload):
             await log_and_broadcast(task_id, f"✅ Hotel Found: {hotel.name} ({hotel.price_per_night})")
             
             await log_and_broadcast(task_id, f"Generating itinerary based on: {payload.user_interests}...")
-            itinerary = await stay_agent.generate_itinerary(hotel.name, payload.user_interests)
+            async def push_day(day):
+                await log_and_broadcast(task_id, f"📅 Day {day.day_number} ready ({len(day.activities)} activities)")
+                await manager.broadcast_json({
+                    "type": "itinerary_day",
+                    "task_id": task_id,
+                    "day": day.dict()
+                })
+
+            days = trip_days(payload.date, payload.end_date)
+            itinerary = await stay_agent.generate_itinerary(hotel.name, payload.user_interests, days=days, on_day=push_day)
             await log_and_broadcast(task_id, f"✅ Itinerary Generated for {len(itinerary)} days.")
             
             full_plan = FullTripPlan(
@@ -364,7 +464,8 @@ async def run_agent_task(payload: TaskPayload):
             res = await AgentFactory.run_task(
                 app_identifier="Universal", 
                 instruction=payload.instruction,
-                provider="gemini"
+                provider="gemini",
+                hedge=payload.hedge
             )
             
             if res.get("status") == "failed":
@@ -391,18 +492,107 @@ async def run_agent_task(payload: TaskPayload):
         result = {"error": str(e)}
         await log_and_broadcast(task_id, f"🔥 Error: {str(e)}")
 
-    update_task_status(task_id, status, result)
-    await manager.broadcast_json({
-        "type": "complete",
-        "task_id": task_id,
-        "status": status,
-        "result": result
-    })
+    except asyncio.CancelledError:
+        # Either DELETE /tasks/{id} or the scheduler deadline. Leave the phone usable for the next task.
+        status = scheduler.cancel_reason(task_id) or "cancelled"
+        result = {"status": status, "error": "Task was stopped before completion"}
+        await log_and_broadcast(task_id, "⏱️ Deadline exceeded, task stopped." if status == "timeout" else "🛑 Task cancelled.")
+        await return_to_home()
+        await finish_task(task_id, status, result)
+        raise
+
+    await finish_task(task_id, status, result)
+
+async def finish_cancelled(task_id: str, reason: str):
+    """Scheduler hook: a task cancelled before its first await never reached run_agent_task's handler."""
+    task = get_task_record(task_id)
+    if task and task["status"] in ("queued", "running"):
+        await finish_task(task_id, reason, {"status": reason, "error": "Task was stopped before completion"})
+
+scheduler = TaskScheduler(runner=lambda task_id, payload: run_agent_task(payload, task_id),
+                          on_cancelled=finish_cancelled)
+coalescer = TaskCoalescer()
+
+@app.on_event("startup")
+async def start_scheduler():
+    scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await scheduler.stop()
+    await close_client()
 
 @app.post("/task")
 async def create_task(payload: TaskPayload):
-    asyncio.create_task(run_agent_task(payload))
-    return {"status": "accepted", "message": "Task queued"}
+    task_id = str(uuid.uuid4())
+    key = coalescer.key_for(payload)
+    shareable = coalescer.shareable(payload)
+
+    recent = coalescer.find_recent(key) if shareable else None
+    if recent:
+        record = add_task_record(task_id, payload.persona, payload, status=recent["status"])
+        record["result"] = recent["result"]
+        record["reused_from"] = recent["task_id"]
+        source = get_task_record(recent["task_id"])
+        if source:
+            record["steps"] = list(source["steps"])
+        append_task_log(task_id, f"♻️ Reused result of identical task {recent['task_id']}")
+        return {"status": "completed", "message": "Reused recent result", "task_id": task_id, "reused_from": recent["task_id"], "result": recent["result"]}
+
+    leader_id = coalescer.join(key, task_id) if shareable else None
+    if leader_id:
+        leader = get_task_record(leader_id)
+        record = add_task_record(task_id, payload.persona, payload, status=leader["status"])
+        record["coalesced_with"] = leader_id
+        record["logs"] = list(leader["logs"])
+        record["steps"] = list(leader["steps"])
+        return {"status": "accepted", "message": "Attached to identical running task", "task_id": task_id, "coalesced_with": leader_id}
+
+    record = add_task_record(task_id, payload.persona, payload, status="queued")
+    try:
+        position = scheduler.submit(task_id, payload.persona, payload, deadline=payload.timeout)
+    except QueueFullError as e:
+        task_history.remove(record)
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    if shareable:
+        coalescer.lead(key, task_id)
+    return {"status": "accepted", "message": "Task queued", "task_id": task_id, "queue_position": position}
+
+@app.get("/scheduler/stats")
+async def scheduler_stats():
+    stats = scheduler.stats()
+    stats["coalescing"] = coalescer.stats()
+    return stats
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    queue = scheduler.stats()
+    return render_prometheus({
+        "droid_task_queue_depth": queue["queue_depth"],
+        "droid_tasks_running": queue["running"],
+        "droid_task_wait_seconds_avg": queue["avg_wait_seconds"],
+        "droid_cloud_breaker_open": 1 if BREAKER.stats()["state"] == "open" else 0,
+    }, counters={
+        "droid_tasks_rejected_total": queue["rejected"],
+    })
+
+@app.get("/router/stats")
+async def router_stats():
+    stats = ROUTER.stats()
+    stats["cloud_breaker"] = BREAKER.stats()
+    stats["llm_limiter"] = LIMITER.stats()
+    stats["intent_fast_path"] = general_agent.intent_matcher.stats()
+    stats["deep_links"] = DEEP_LINKS.stats()
+    stats["locator_cache"] = LOCATORS.stats()
+    stats["popups"] = POPUPS.stats()
+    stats["devices"] = DEVICES.stats()
+    stats["app_index"] = APPS.stats()
+    stats["model_cascade"] = CASCADE.stats()
+    return stats
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+# Seconds a finished task's result is served to identical new requests. 0 disables reuse.
+TASK_REUSE_WINDOW = float(os.getenv("TASK_REUSE_WINDOW", "30"))
+
+# Payload fields that don't change what the agent does on the device
+IGNORED_FIELDS = {"timeout"}
+
+# Only searches, comparisons and itineraries are shared. Bookings, orders, event invites and free-form
+# universal commands change something in the world, so an identical repeat must run again.
+READ_ONLY_PERSONAS = {"shopper", "patient", "traveller", "rider", "foodie"}
+SIDE_EFFECT_ACTIONS = {
+    "rider": {"book"},
+    "foodie": {"order"},
+}
+
+
+class TaskCoalescer:
+    """
+    Single-flight for /task.
+    Identical payloads that arrive while one is queued or running attach to it as followers
+    and receive its logs and result. Successful results are reused for a short window.
+    Only read-only tasks take part (see shareable()).
+    """
+
+    def __init__(self, reuse_window: float = TASK_REUSE_WINDOW):
+        self.reuse_window = reuse_window
+        self.inflight: Dict[str, str] = {}          # key -> leader task_id
+        self.leader_keys: Dict[str, str] = {}       # leader task_id -> key
+        self.followers: Dict[str, List[str]] = {}   # leader task_id -> follower task_ids
+        self.recent: Dict[str, Dict[str, Any]] = {} # key -> finished result
+
+        self.coalesced = 0
+        self.reused = 0
+
+    @staticmethod
+    def shareable(payload: Any) -> bool:
+        """True when the payload only reads (search/compare/itinerary), so its outcome can be shared."""
+        persona = getattr(payload, "persona", None)
+        action = getattr(payload, "action", None)
+        return persona in READ_ONLY_PERSONAS and action not in SIDE_EFFECT_ACTIONS.get(persona, set())
+
+    @staticmethod
+    def key_for(payload: Any) -> str:
+        """Hash of the payload with empty fields dropped and strings normalised."""
+        data = payload.dict() if hasattr(payload, "dict") else dict(payload)
+
+        def normalise(value):
+            if isinstance(value, str):
+                return " ".join(value.lower().split())
+            if isinstance(value, list):
+                return [normalise(v) for v in value]
+            if isinstance(value, dict):
+                return {k: normalise(v) for k, v in value.items()}
+            return value
+
+        clean = {
+            k: normalise(v) for k, v in data.items()
+            if k not in IGNORED_FIELDS and v not in (None, "", [], {})
+        }
+        raw = json.dumps(clean, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def find_recent(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.recent.get(key)
+        if not entry:
+            return None
+        if time.monotonic() - entry["finished_at"] > self.reuse_window:
+            self.recent.pop(key, None)
+            return None
+        self.reused += 1
+        return entry
+
+    def join(self, key: str, task_id: str) -> Optional[str]:
+        """Attaches task_id to an identical in-flight task. Returns the leader id, or None."""
+        leader = self.inflight.get(key)
+        if not leader:
+            return None
+        self.followers.setdefault(leader, []).append(task_id)
+        self.coalesced += 1
+        return leader
+
+    def lead(self, key: str, task_id: str):
+        self.inflight[key] = task_id
+        self.leader_keys[task_id] = key
+
+    def detach(self, task_id: str):
+        """Removes a follower from whatever it was attached to (e.g. it was cancelled)."""
+        for followers in self.followers.values():
+            if task_id in followers:
+                followers.remove(task_id)
+
+    def followers_of(self, leader_id: str) -> List[str]:
+        return list(self.followers.get(leader_id, []))
+
+    def finish(self, leader_id: str, status: str, result: Any) -> List[str]:
+        """Ends the single-flight for leader_id. Returns the followers that should share its outcome."""
+        now = time.monotonic()
+        for stale in [k for k, v in self.recent.items() if now - v["finished_at"] > self.reuse_window]:
+            self.recent.pop(stale, None)
+
+        key = self.leader_keys.pop(leader_id, None)
+        if key and self.inflight.get(key) == leader_id:
+            self.inflight.pop(key, None)
+            if status == "success" and self.reuse_window > 0:
+                self.recent[key] = {
+                    "task_id": leader_id,
+                    "status": status,
+                    "result": result,
+                    "finished_at": now,
+                }
+        return self.followers.pop(leader_id, [])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "inflight": len(self.inflight),
+            "followers_waiting": sum(len(f) for f in self.followers.values()),
+            "coalesced": self.coalesced,
+            "reused": self.reused,
+            "reuse_window_seconds": self.reuse_window,
+        }
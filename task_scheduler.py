@@ -0,0 +1,247 @@
+import asyncio
+import bisect
+import itertools
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Lower number runs first. Voice commands are interactive, event orchestration is batch work.
+PERSONA_PRIORITY = {
+    "universal": 0,
+    "rider": 1,
+    "foodie": 1,
+    "shopper": 2,
+    "patient": 2,
+    "traveller": 3,
+    "coordinator": 4,
+}
+DEFAULT_PRIORITY = 2
+
+# How many tasks of one persona may run at the same time
+PERSONA_LIMITS = {
+    "coordinator": 1,
+    "traveller": 1,
+}
+
+# Seconds a task may run before it is cancelled. A hung agent must not block the queue.
+PERSONA_DEADLINES = {
+    "universal": 300,
+    "rider": 900,
+    "foodie": 900,
+    "shopper": 600,
+    "patient": 900,
+    "traveller": 1800,
+    "coordinator": 3600,
+}
+DEFAULT_DEADLINE = int(os.getenv("TASK_DEFAULT_DEADLINE", "900"))
+
+# All agents drive the same phone, so by default only one task runs at a time
+TASK_WORKERS = int(os.getenv("TASK_WORKERS", "1"))
+TASK_QUEUE_SIZE = int(os.getenv("TASK_QUEUE_SIZE", "20"))
+PERSONA_DEFAULT_LIMIT = int(os.getenv("TASK_PERSONA_LIMIT", "1"))
+
+
+class QueueFullError(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Task queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TaskScheduler:
+    """
+    Bounded priority queue in front of run_agent_task.
+    - submit() never blocks: it either enqueues or raises QueueFullError.
+    - A fixed number of workers drain the queue. A worker only takes the highest-priority task whose
+      persona has a free slot, so a busy persona never holds up the tasks queued behind it.
+    - Keeps a reference to every running asyncio.Task.
+    - on_cancelled(task_id, reason) runs for every started task that ended cancelled, including ones
+      cancelled before their first await that never got to record it themselves.
+    """
+
+    def __init__(self, runner: Callable[[str, Any], Awaitable[Any]], workers: int = TASK_WORKERS,
+                 max_queue: int = TASK_QUEUE_SIZE, persona_limits: Optional[Dict[str, int]] = None,
+                 on_cancelled: Optional[Callable[[str, str], Awaitable[Any]]] = None):
+        self.runner = runner
+        self.on_cancelled = on_cancelled
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.persona_limits = dict(PERSONA_LIMITS if persona_limits is None else persona_limits)
+
+        # Sorted (priority, seq, task_id, persona, payload, enqueued_at) entries
+        self.pending: List[tuple] = []
+        self._changed: Optional[asyncio.Condition] = None
+        self.active: Dict[str, int] = {}
+        self.worker_tasks: List[asyncio.Task] = []
+        self.running: Dict[str, asyncio.Task] = {}
+        self.running_personas: Dict[str, str] = {}
+        self.deadlines: Dict[str, float] = {}
+        self.cancelled: Dict[str, str] = {}
+        self.seq = itertools.count()
+
+        # Monitoring counters
+        self.accepted = 0
+        self.rejected = 0
+        self.started = 0
+        self.completed = 0
+        self.cancelled_count = 0
+        self.timed_out = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def start(self):
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        while len(self.worker_tasks) < self.workers:
+            self.worker_tasks.append(asyncio.create_task(self._worker(len(self.worker_tasks))))
+        print(f"[Scheduler] Started {self.workers} worker(s), queue size {self.max_queue}")
+
+    async def stop(self):
+        for w in self.worker_tasks:
+            w.cancel()
+        for t in list(self.running.values()):
+            t.cancel()
+        await asyncio.gather(*self.worker_tasks, *self.running.values(), return_exceptions=True)
+        self.worker_tasks = []
+
+    def submit(self, task_id: str, persona: str, payload: Any, deadline: Optional[float] = None) -> int:
+        """
+        Enqueue a task. Returns its priority-aware position in the queue (1 = next up) at submit time;
+        tasks submitted later with a higher priority can still overtake it.
+        """
+        if self._changed is None:
+            self.start()
+
+        if len(self.pending) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self.retry_after())
+
+        self.deadlines[task_id] = deadline or PERSONA_DEADLINES.get(persona, DEFAULT_DEADLINE)
+        priority = PERSONA_PRIORITY.get(persona, DEFAULT_PRIORITY)
+        entry = (priority, next(self.seq), task_id, persona, payload, time.monotonic())
+        bisect.insort(self.pending, entry)
+        self._notify()
+
+        self.accepted += 1
+        return self.pending.index(entry) + 1
+
+    def _notify(self):
+        async def wake():
+            async with self._changed:
+                self._changed.notify_all()
+        asyncio.ensure_future(wake())
+
+    def cancel(self, task_id: str, reason: str = "cancelled") -> Optional[str]:
+        """
+        Cancels a queued or running task. Returns its new state, or None if the scheduler doesn't know it.
+        Running tasks get CancelledError raised at their current await point.
+        """
+        if task_id in self.running:
+            self.cancelled[task_id] = reason
+            self.running[task_id].cancel()
+            return "cancelling"
+
+        for entry in self.pending:
+            if entry[2] == task_id:
+                # Still queued: drop it so no worker can pick it up
+                self.pending.remove(entry)
+                self.cancelled_count += 1
+                self._forget(task_id)
+                return "cancelled"
+
+        return None
+
+    def cancel_reason(self, task_id: str) -> Optional[str]:
+        return self.cancelled.get(task_id)
+
+    def _expire(self, task_id: str):
+        if task_id in self.running:
+            print(f"[Scheduler] Task {task_id} exceeded its deadline, cancelling.")
+            self.timed_out += 1
+            self.cancel(task_id, reason="timeout")
+
+    def retry_after(self) -> int:
+        """Rough estimate of seconds until a queue slot frees up (one running task finishing)."""
+        avg_run = self.total_run / self.completed if self.completed else 30.0
+        return max(1, int(avg_run / self.workers) + 1)
+
+    def _limit(self, persona: str) -> int:
+        return self.persona_limits.get(persona, PERSONA_DEFAULT_LIMIT)
+
+    def _take(self) -> Optional[tuple]:
+        """Removes and returns the highest-priority entry whose persona is below its limit."""
+        for i, entry in enumerate(self.pending):
+            persona = entry[3]
+            if self.active.get(persona, 0) < self._limit(persona):
+                return self.pending.pop(i)
+        return None
+
+    async def _worker(self, index: int):
+        while True:
+            async with self._changed:
+                entry = self._take()
+                while entry is None:
+                    await self._changed.wait()
+                    entry = self._take()
+                priority, _, task_id, persona, payload, enqueued_at = entry
+                # Taken and started without an await in between, so a cancel can't slip through
+                self.active[persona] = self.active.get(persona, 0) + 1
+
+            self.started += 1
+            wait = time.monotonic() - enqueued_at
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+            started = time.monotonic()
+            task = asyncio.create_task(self.runner(task_id, payload))
+            self.running[task_id] = task
+            self.running_personas[task_id] = persona
+            timer = asyncio.get_running_loop().call_later(self.deadlines[task_id], self._expire, task_id)
+            try:
+                # wait() instead of await: a cancelled task must not take the worker down with it
+                await asyncio.wait({task})
+                if task.cancelled():
+                    self.cancelled_count += 1
+                    if self.on_cancelled:
+                        try:
+                            await self.on_cancelled(task_id, self.cancelled.get(task_id, "cancelled"))
+                        except Exception as e:
+                            print(f"[Scheduler] Worker {index}: could not record cancel of {task_id}: {e}")
+                else:
+                    self.completed += 1
+                    self.total_run += time.monotonic() - started
+                    if task.exception():
+                        print(f"[Scheduler] Worker {index}: task {task_id} crashed: {task.exception()}")
+            finally:
+                timer.cancel()
+                self.running.pop(task_id, None)
+                self.running_personas.pop(task_id, None)
+                self._forget(task_id)
+                self.active[persona] -= 1
+                # A persona slot freed up: tasks skipped for it may run now
+                self._notify()
+
+    def _forget(self, task_id: str):
+        self.deadlines.pop(task_id, None)
+        self.cancelled.pop(task_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        running_by_persona: Dict[str, int] = {}
+        for persona in self.running_personas.values():
+            running_by_persona[persona] = running_by_persona.get(persona, 0) + 1
+
+        return {
+            "workers": self.workers,
+            "queue_depth": len(self.pending),
+            "queue_capacity": self.max_queue,
+            "running": len(self.running),
+            "running_by_persona": running_by_persona,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "cancelled": self.cancelled_count,
+            "timed_out": self.timed_out,
+            "avg_wait_seconds": round(self.total_wait / self.started, 3) if self.started else 0.0,
+            "max_wait_seconds": round(self.max_wait, 3),
+            "avg_run_seconds": round(self.total_run / self.completed, 3) if self.completed else 0.0,
+        }
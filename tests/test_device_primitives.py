@@ -0,0 +1,45 @@
+import asyncio
+
+from agents import device_primitives
+from agents.app_index import APPS
+from agents.device_primitives import UNIVERSAL, match_primitive, run_primitive, spoken_app
+
+
+def test_universal_open_resolves_app_from_instruction():
+    plan = match_primitive(UNIVERSAL, UNIVERSAL, "Open WhatsApp")
+    assert plan == {"kind": "launch", "package": "com.whatsapp", "app": "WhatsApp"}
+
+
+def test_universal_open_needs_a_known_app_and_a_bare_instruction():
+    assert match_primitive(UNIVERSAL, UNIVERSAL, "Open Qwertyuiop") is None
+    assert match_primitive(UNIVERSAL, UNIVERSAL, "Open WhatsApp and message Ravi") is None
+
+
+def test_named_app_still_has_to_match_the_identifier():
+    assert match_primitive("Uber", "com.ubercab", "Open Uber")["package"] == "com.ubercab"
+    assert match_primitive("Uber", "com.ubercab", "Open WhatsApp") is None
+
+
+def test_spoken_app_takes_the_app_a_task_starts_in():
+    assert spoken_app("Open WhatsApp and check unread messages") == "WhatsApp"
+    assert spoken_app("open the YouTube Music app and play lofi") == "YouTube Music"
+    assert spoken_app("Launch Spotify, play jazz") == "Spotify"
+    assert spoken_app("Send a message to Ravi") is None
+
+
+def test_universal_open_launches_directly(monkeypatch):
+    launched = []
+
+    async def launch_app(package, serial=None):
+        launched.append(package)
+        return True
+
+    async def refresh(serial=None, force=False):
+        return None
+
+    monkeypatch.setattr(device_primitives, "launch_app", launch_app)
+    monkeypatch.setattr(APPS, "refresh", refresh)
+
+    result = asyncio.run(run_primitive(UNIVERSAL, UNIVERSAL, "open whatsapp"))
+    assert launched == ["com.whatsapp"]
+    assert result == {"status": "success", "message": "Opened WhatsApp", "primitive": "launch"}